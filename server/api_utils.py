@@ -1,7 +1,21 @@
 import os
+import re
+import base64
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from typing import Optional, Dict
 from fastapi import Request, HTTPException
-from bson import ObjectId
+from fastapi.responses import Response
+from bson import ObjectId, json_util
+
+from json_response import dumps
+
+# Número máximo de IDs que se pueden pedir en una consulta por lotes
+MAX_BATCH_IDS = 1000
+# Política de caché HTTP por defecto de las respuestas con validadores: el cliente puede
+# guardarlas, pero debe revalidarlas (If-None-Match / If-Modified-Since) antes de usarlas
+DEFAULT_CACHE_CONTROL = "no-cache"
 
 class APIUtils:
     _is_docker = os.path.exists('/.dockerenv')
@@ -64,11 +78,37 @@ class APIUtils:
         if not cls.is_valid_objectid(id):
             raise HTTPException(status_code=400, detail="El ID proporcionado no es válido.")
 
+    @classmethod
+    def parse_ids(cls, ids) -> Optional[list]:
+        """Validar una lista de IDs (o una cadena separada por comas) y quitar los repetidos."""
+        if not ids:
+            return None
+        if isinstance(ids, str):
+            ids = ids.split(',')
+        ids = [id.strip().lower() for id in ids if id.strip()]
+        if len(ids) > MAX_BATCH_IDS:
+            raise HTTPException(status_code=400, detail=f"No se pueden pedir más de {MAX_BATCH_IDS} IDs a la vez.")
+        invalid = [id for id in ids if not cls.is_valid_objectid(id)]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Los IDs proporcionados no son válidos: {', '.join(invalid)}")
+        return list(dict.fromkeys(ids))
+
+    @classmethod
+    def batch_headers(cls, documents: list, missing: list) -> Dict[str, str]:
+        """Construir las cabeceras de una consulta por lotes, indicando los IDs no encontrados."""
+        headers = {"Content-Type": "application/json", "X-Total-Count": str(len(documents))}
+        if missing:
+            headers["X-Missing-Ids"] = ",".join(missing)
+        return headers
+
     @classmethod
     def add_regex(cls, query: Dict[str, Dict], field: str, value: Optional[str]):
-        """Agregar un filtro regex a la consulta si el valor no es None."""
+        """Agregar un filtro 'contiene' (sin distinguir mayúsculas) a la consulta si el valor no es None.
+
+        El valor se escapa: se busca como texto literal y nunca se interpreta como expresión regular.
+        """
         if value:
-            query[field] = {"$regex": value, "$options": 'i'}
+            query[field] = {"$regex": re.escape(value), "$options": 'i'}
 
     @classmethod
     def build_projection(cls, fields: Optional[str]) -> Optional[dict]:
@@ -84,6 +124,122 @@ class APIUtils:
             return [(field, 1) for field in sort.split(',')]
         return None
 
+    @classmethod
+    def encode_cursor(cls, sort_criteria: Optional[list], last_key: list) -> str:
+        """Codificar la clave del último documento de una página en un cursor opaco."""
+        payload = {"sort": [list(criterion) for criterion in (sort_criteria or [])], "key": last_key}
+        return base64.urlsafe_b64encode(json_util.dumps(payload).encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode_cursor(cls, cursor: str, sort_criteria: Optional[list]) -> list:
+        """Decodificar un cursor opaco y comprobar que corresponde a la misma ordenación."""
+        try:
+            padding = "=" * (-len(cursor) % 4)
+            payload = json_util.loads(base64.urlsafe_b64decode(cursor + padding))
+            key = payload["key"]
+            same_sort = payload["sort"] == [list(criterion) for criterion in (sort_criteria or [])]
+        except Exception:
+            raise HTTPException(status_code=400, detail="El cursor proporcionado no es válido.")
+        if not same_sort:
+            raise HTTPException(status_code=400, detail="El cursor no corresponde a la ordenación pedida.")
+        return key
+
+    @classmethod
+    def check_cursor(cls, cursor: Optional[str], sort: Optional[str], offset: int) -> Optional[list]:
+        """Validar el parámetro 'cursor' y devolver la clave a partir de la que empieza la página."""
+        if not cursor:
+            return None
+        if offset > 0:
+            raise HTTPException(status_code=400, detail="Usa 'cursor' u 'offset', pero no ambos a la vez")
+        return cls.decode_cursor(cursor, cls.build_sort_criteria(sort))
+
+    @classmethod
+    def next_page_headers(cls, request: Request, sort_criteria: Optional[list], last_key: Optional[list]) -> Dict[str, str]:
+        """Construir las cabeceras X-Next-Cursor y Link para la siguiente página, si existe."""
+        if last_key is None:
+            return {}
+        cursor = cls.encode_cursor(sort_criteria, last_key)
+        next_url = request.url.remove_query_params("offset").include_query_params(cursor=cursor)
+        return {"X-Next-Cursor": cursor, "Link": f'<{next_url}>; rel="next"'}
+
+    @classmethod
+    def total_count_headers(cls, total: Optional[int]) -> Dict[str, str]:
+        """Cabecera X-Total-Count con el total de la query (ninguna si no se ha contado)."""
+        return {} if total is None else {"X-Total-Count": str(total)}
+
+    @classmethod
+    def make_etag(cls, *parts) -> str:
+        """Construir un ETag fuerte a partir de los valores que identifican una versión del recurso."""
+        digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+        return f'"{digest}"'
+
+    @classmethod
+    def etag_matches(cls, request: Request, etag: str) -> bool:
+        """Devuelve True si la cabecera If-None-Match contiene el ETag (o '*')."""
+        header = request.headers.get("If-None-Match")
+        if not header:
+            return False
+        candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+        return "*" in candidates or etag in candidates
+
+    @classmethod
+    def http_date(cls, value: datetime) -> str:
+        """Formatear una fecha como fecha HTTP (cabecera Last-Modified). Las fechas sin zona se toman como UTC."""
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+    @classmethod
+    def is_not_modified(cls, request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+        """
+        Devuelve True si el cliente ya tiene la versión actual del recurso.
+
+        If-None-Match tiene prioridad; If-Modified-Since solo se evalúa si no se envía
+        If-None-Match y se conoce la fecha de la última modificación (con precisión de segundos).
+        """
+        if request.headers.get("If-None-Match"):
+            return cls.etag_matches(request, etag)
+        since = request.headers.get("If-Modified-Since")
+        if not since or last_modified is None:
+            return False
+        try:
+            since = parsedate_to_datetime(since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+
+    @classmethod
+    def conditional_response(cls, request: Request, content, headers: Optional[Dict[str, str]] = None,
+                             etag: Optional[str] = None, last_modified: Optional[datetime] = None,
+                             media_type: str = "application/json") -> Response:
+        """
+        Construir una respuesta 200 con ETag (y Last-Modified), o 304 si el cliente ya la tiene.
+
+        Si no se indica etag se calcula con el hash del cuerpo serializado, que se serializa
+        una sola vez y se reutiliza como cuerpo. Si se indica (p. ej. a partir de la fecha de
+        modificación del documento), una respuesta 304 no llega a serializar el contenido.
+        """
+        headers = dict(headers or {})
+        body = None
+        if etag is None:
+            body = dumps(content)
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        headers["ETag"] = etag
+        headers.setdefault("Cache-Control", DEFAULT_CACHE_CONTROL)
+        if last_modified is not None:
+            headers["Last-Modified"] = cls.http_date(last_modified)
+
+        if cls.is_not_modified(request, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+
+        if body is None:
+            body = dumps(content)
+        return Response(content=body, status_code=200, headers=headers, media_type=media_type)
+
     @classmethod
     async def get(cls, client, url):
         response = await client.get(url, headers={"Accept" : "application/json"})
@@ -1,13 +1,33 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 
 from marcadores_v1 import router as marcadores_v1_router
-from visitas_v1 import router as visitas_v1_router
+from visitas_v1 import router as visitas_v1_router, flush_visit_buffer
 from multimedia_v1 import router as multimedia_v1_router
 from users_v1 import router as users_v1_router
+from db_connection import DatabaseConnection
+from indexes import IndexUtils
+from storage import get_storage, LocalStorage
+from upload_utils import UploadUtils
+from image_utils import ImageUtils
+from metrics import setup_metrics
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Crear en segundo plano los índices que falten al arrancar; al apagar, terminar las derivadas y
+    # subidas en curso, escribir las visitas pendientes y cerrar el cliente asíncrono de MongoDB
+    IndexUtils.start_background()
+    yield
+    await IndexUtils.stop_background()
+    await ImageUtils.shutdown()
+    await UploadUtils.shutdown()
+    await flush_visit_buffer()
+    await DatabaseConnection.close_connection()
+
+app = FastAPI(lifespan=lifespan)
 app.title = "MiMapa"
 app.version = "1.0.0"
 app.add_middleware(GZipMiddleware, minimum_size=1000)
@@ -19,8 +39,15 @@ app.add_middleware(
     allow_methods=["*"],  # Permitir todos los métodos HTTP (GET, POST, etc.)
     allow_headers=["*"],  # Permitir todos los encabezados
 )
+# Métricas de Prometheus en /metrics (el middleware más externo mide también la compresión)
+setup_metrics(app)
 
 app.include_router(marcadores_v1_router, prefix="/api/v1")
 app.include_router(visitas_v1_router, prefix="/api/v1")
 app.include_router(multimedia_v1_router, prefix="/api/v1")
-app.include_router(users_v1_router, prefix="/api/v1")
\ No newline at end of file
+app.include_router(users_v1_router, prefix="/api/v1")
+
+# Con el almacenamiento local, la propia API sirve las imágenes subidas
+storage = get_storage()
+if isinstance(storage, LocalStorage):
+    app.mount(storage.base_url, StaticFiles(directory=storage.root), name="media-files")
\ No newline at end of file
@@ -0,0 +1,32 @@
+"""
+Rellenar el campo GeoJSON 'location' de los marcadores que todavía no lo tienen
+y crear el índice 2dsphere que usan los filtros 'bbox' y 'near'.
+
+Uso: python backfill_location.py
+"""
+import asyncio
+
+from db_connection import DatabaseConnection
+from indexes import IndexUtils
+
+async def backfill_location():
+    # Solo se rellenan los marcadores con coordenadas numéricas dentro de rango,
+    # ya que el índice 2dsphere rechaza puntos inválidos
+    query = {
+        "location": {"$exists": False},
+        "lat": {"$type": "number", "$gte": -90, "$lte": 90},
+        "lon": {"$type": "number", "$gte": -180, "$lte": 180}
+    }
+    # Actualización con pipeline: el punto se calcula en el servidor en una sola operación
+    update = [{"$set": {"location": {"type": "Point", "coordinates": ["$lon", "$lat"]}}}]
+
+    try:
+        modified = await DatabaseConnection.update_many("marcador", query, update)
+        print(f"Marcadores actualizados: {modified}")
+        report = await IndexUtils.ensure_indexes(["marcador"])
+        print(f"Índices de los marcadores: {report['marcador']}")
+    finally:
+        await DatabaseConnection.close_connection()
+
+if __name__ == '__main__':
+    asyncio.run(backfill_location())
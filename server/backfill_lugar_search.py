@@ -0,0 +1,38 @@
+"""
+Rellenar el campo 'lugar_search' (términos normalizados del lugar para el autocompletado)
+de los marcadores que todavía no lo tienen y crear los índices de búsqueda.
+
+Uso: python backfill_lugar_search.py
+"""
+import asyncio
+
+from db_connection import DatabaseConnection
+from indexes import IndexUtils
+from search_utils import SearchUtils
+
+# Marcadores que se actualizan en cada bulk_write
+BATCH_SIZE = 500
+
+async def backfill_lugar_search():
+    # La normalización (tildes, mayúsculas) se hace en Python, así que se recorren los
+    # marcadores con un cursor y se actualizan por lotes
+    query = {"lugar_search": {"$exists": False}}
+    updated = 0
+    batch = []
+
+    try:
+        async for marcador in DatabaseConnection.stream_documents("marcador", query, {"lugar": 1}):
+            batch.append(({"_id": marcador["_id"]}, {"$set": {"lugar_search": SearchUtils.search_terms(marcador.get("lugar"))}}))
+            if len(batch) >= BATCH_SIZE:
+                updated += await DatabaseConnection.bulk_update("marcador", batch)
+                batch = []
+        updated += await DatabaseConnection.bulk_update("marcador", batch)
+        print(f"Marcadores actualizados: {updated}")
+
+        report = await IndexUtils.ensure_indexes(["marcador"])
+        print(f"Índices de los marcadores: {report['marcador']}")
+    finally:
+        await DatabaseConnection.close_connection()
+
+if __name__ == '__main__':
+    asyncio.run(backfill_lugar_search())
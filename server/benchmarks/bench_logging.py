@@ -0,0 +1,90 @@
+"""
+Benchmark del coste de los logs de consultas en el hilo que atiende la petición.
+
+Compara, para 'records' registros como los de cada consulta de DatabaseConnection:
+- antes: WARNING con f-string y StreamHandler síncrono con el formato de basicConfig;
+- cola: el mismo registro a través de BackgroundQueueHandler y el QueueListener en JSON;
+- cola con muestreo: además, el SampledLogger del logger de consultas.
+
+La salida se escribe en un fichero temporal (no en la terminal) para no medir la consola.
+Se mide el tiempo del hilo que registra hasta que vuelve la llamada; el hilo de escritura
+sigue trabajando después.
+
+Uso (desde server/): python -m benchmarks.bench_logging [--records 100000] [--sample-rate 0.01] [--max-per-second 5]
+"""
+import argparse
+import json
+import logging
+import queue
+import sys
+import tempfile
+import time
+from logging.handlers import QueueListener
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from logging_config import BackgroundQueueHandler, JsonFormatter, SampledLogger
+
+QUERY = {"creador": "user42@example.com", "_id": {"$gt": "6ad4bb1773e5e0ad5950e996"}}
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f"bench.{name}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+def time_records(log, records: int) -> float:
+    """Segundos por registro en el hilo que llama."""
+    start = time.perf_counter()
+    for n in range(records):
+        log(n)
+    return (time.perf_counter() - start) / records
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    parser.add_argument("--max-per-second", type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = {name: open(Path(directory) / f"{name}.log", "w") for name in ("before", "queue", "sampled")}
+
+        before = logging.StreamHandler(files["before"])
+        before.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        before_logger = make_logger("before", before)
+
+        listeners, loggers = [], {}
+        for name in ("queue", "sampled"):
+            output = logging.StreamHandler(files[name])
+            output.setFormatter(JsonFormatter())
+            log_queue = queue.SimpleQueue()
+            listeners.append(QueueListener(log_queue, output))
+            loggers[name] = make_logger(name, BackgroundQueueHandler(log_queue))
+        loggers["sampled"] = SampledLogger("bench.sampled", args.sample_rate, args.max_per_second)
+        for listener in listeners:
+            listener.start()
+
+        results = {
+            "before_us": time_records(
+                lambda n: before_logger.warning(f"Query para la colección 'marcador': {QUERY}"), args.records),
+            "queue_us": time_records(
+                lambda n: loggers["queue"].info("Query para la colección '%s': %s", "marcador", QUERY), args.records),
+            "sampled_us": time_records(
+                lambda n: loggers["sampled"].info("Query para la colección '%s': %s", "marcador", QUERY), args.records)
+        }
+        for listener in listeners:
+            listener.stop()
+        for file in files.values():
+            file.close()
+        lines = {name: sum(1 for _ in open(Path(directory) / f"{name}.log")) for name in files}
+
+    print(json.dumps({
+        **{key: round(value * 1e6, 3) for key, value in results.items()},
+        "lines_written": lines
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
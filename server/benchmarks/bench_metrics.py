@@ -0,0 +1,115 @@
+"""
+Benchmark del coste de las métricas de Prometheus.
+
+Mide por separado, sin red ni base de datos:
+- el middleware: peticiones a una ruta mínima de FastAPI (ASGI directo) con y sin MetricsMiddleware;
+- el listener de MongoDB: un par de eventos started/succeeded por comando;
+- la exportación: generar el texto de /metrics con las series creadas.
+
+La diferencia por petición se compara con la latencia de las rutas reales (bench_routes) para
+decidir si las métricas pueden quedarse activas con carga.
+
+Uso (desde server/): python -m benchmarks.bench_metrics [--requests 20000] [--commands 200000]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import APIRouter, FastAPI
+from prometheus_client import REGISTRY, generate_latest
+
+from metrics import MetricsMiddleware, MongoMetricsListener
+
+class CommandEvent:
+    """Evento de comando con los atributos que usa el listener."""
+
+    def __init__(self, request_id: int, command_name: str, collection: str):
+        self.connection_id = ("localhost", 27017)
+        self.request_id = request_id
+        self.command_name = command_name
+        self.command = {command_name: collection}
+        self.duration_micros = 800
+
+def build_app(with_metrics: bool) -> FastAPI:
+    router = APIRouter()
+
+    @router.get("/marcadores/{id}")
+    async def get_marcador(id: str):
+        return {"_id": id}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1")
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+async def time_requests(app, requests: int) -> float:
+    """Segundos por petición llamando a la aplicación ASGI directamente."""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    def scope(n):
+        path = f"/api/v1/marcadores/{n}"
+        return {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+                "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80)}
+
+    for n in range(200):
+        await app(scope(n), receive, send)
+    start = time.perf_counter()
+    for n in range(requests):
+        await app(scope(n), receive, send)
+    return (time.perf_counter() - start) / requests
+
+def time_listener(commands: int) -> float:
+    """Segundos por comando (started + succeeded) en el listener de MongoDB."""
+    listener = MongoMetricsListener()
+    names = [("find", "marcador"), ("insert", "visita"), ("aggregate", "user"), ("findAndModify", "user")]
+    events = [CommandEvent(n, *names[n % len(names)]) for n in range(commands)]
+    start = time.perf_counter()
+    for event in events:
+        listener.started(event)
+        listener.succeeded(event)
+    return (time.perf_counter() - start) / commands
+
+def time_export(repeat: int = 200) -> tuple:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        output = generate_latest(REGISTRY)
+    return (time.perf_counter() - start) / repeat, len(output)
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--commands", type=int, default=200000)
+    args = parser.parse_args()
+
+    # Varias rondas alternas para que el calentamiento no favorezca a ninguna variante
+    without, with_ = [], []
+    for _ in range(3):
+        without.append(await time_requests(build_app(False), args.requests))
+        with_.append(await time_requests(build_app(True), args.requests))
+    base, instrumented = min(without), min(with_)
+    listener = time_listener(args.commands)
+    export, export_bytes = time_export()
+
+    print(json.dumps({
+        "request_us_without_metrics": round(base * 1e6, 2),
+        "request_us_with_metrics": round(instrumented * 1e6, 2),
+        "middleware_overhead_us": round((instrumented - base) * 1e6, 2),
+        "middleware_overhead_pct": round(100 * (instrumented - base) / base, 1),
+        "mongo_listener_us_per_command": round(listener * 1e6, 2),
+        "export_ms": round(export * 1000, 3),
+        "export_bytes": export_bytes
+    }, indent=2))
+
+if __name__ == '__main__':
+    asyncio.run(main())
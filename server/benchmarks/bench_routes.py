@@ -0,0 +1,342 @@
+"""
+Benchmark de carga de todas las rutas de la API.
+
+Arranca app.py con uvicorn en un proceso aparte contra una base de datos de pruebas (por
+defecto 'mi-mapa-bench' en un mongod local), con el almacenamiento local de imágenes en un
+directorio temporal en lugar de Cloudinary. Siembra la base de datos con seed_data.py a la
+escala indicada y lanza 'requests' peticiones a cada ruta de marcadores, visitas, usuarios y multimedia con
+'concurrency' peticiones a la vez. El resultado es un JSON con, por ruta, el rendimiento
+(peticiones por segundo), los códigos de respuesta y la latencia p50/p95/p99.
+
+Con --baseline se compara con un resultado anterior: se muestra la variación de p95 y del
+rendimiento por ruta y el proceso termina con código 1 si alguna ruta empeora su p95 más
+de --threshold por ciento.
+
+La base de datos de pruebas se borra al terminar (salvo con --keep); nunca se usa 'mi-mapa'.
+
+Uso (desde server/): python -m benchmarks.bench_routes [--uri mongodb://localhost:27017] [--db mi-mapa-bench]
+                     [--users 200] [--marcadores 5000] [--visitas 20000] [--images 200]
+                     [--requests 200] [--concurrency 16] [--routes marcadores] [--output result.json]
+                     [--baseline previous.json] [--threshold 20] [--keep]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from itertools import count
+from pathlib import Path
+
+import httpx
+from PIL import Image as PILImage
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR))
+
+import seed_data
+from seed_data import PLACES
+
+API = "/api/v1"
+# Rectángulo en el que se buscan y crean marcadores (la península)
+BOUNDS = (-9.0, 36.0, 3.0, 43.5)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=os.getenv("BENCH_URI", "mongodb://localhost:27017"), help="URI del mongod de pruebas")
+    parser.add_argument("--db", default="mi-mapa-bench", help="Base de datos de pruebas (se borra al terminar)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--marcadores", type=int, default=5000)
+    parser.add_argument("--visitas", type=int, default=20000)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por ruta")
+    parser.add_argument("--concurrency", type=int, default=16, help="Peticiones simultáneas")
+    parser.add_argument("--warmup", type=int, default=10, help="Peticiones por ruta que no se miden")
+    parser.add_argument("--routes", default=None, help="Medir solo las rutas cuyo nombre contenga este texto")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla de los datos (seed_data) y de las peticiones")
+    parser.add_argument("--output", default=None, help="Fichero en el que guardar el resultado")
+    parser.add_argument("--baseline", default=None, help="Resultado anterior con el que comparar")
+    parser.add_argument("--threshold", type=float, default=20, help="Empeoramiento de p95 (%%) que se considera regresión")
+    parser.add_argument("--keep", action="store_true", help="No borrar la base de datos de pruebas al terminar")
+    args = parser.parse_args()
+    if args.db == "mi-mapa":
+        parser.error("El benchmark borra la base de datos: usa una distinta de 'mi-mapa'")
+    return args
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def make_png(n: int, size: int = 64) -> bytes:
+    """Imagen PNG distinta para cada n (la deduplicación por contenido devolvería la existente)."""
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (size, size), (n % 256, (n // 256) % 256, (n // 65536) % 256)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+# Siembra de datos
+
+async def drop_database(name: str):
+    from db_connection import DatabaseConnection
+
+    await DatabaseConnection.get_collection("user").database.client.drop_database(name)
+
+async def seed(args) -> dict:
+    """Sembrar la base de datos de pruebas con seed_data y devolver los IDs que usan las peticiones."""
+    from db_connection import DatabaseConnection
+
+    await drop_database(args.db)
+
+    # Cada ruta DELETE borra documentos propios, sembrados a continuación de los demás
+    spare = args.requests + args.warmup
+    counts = {"user": args.users + spare, "marcador": args.marcadores + spare,
+              "visita": args.visitas + spare, "image": args.images}
+    # El resultado en JSON sale por la salida estándar: el progreso de la siembra va a la de errores
+    with contextlib.redirect_stdout(sys.stderr):
+        await seed_data.seed_database(counts, args.seed)
+    await DatabaseConnection.close_connection()
+
+    ids = lambda collection_name, start, stop: [seed_data.object_id(collection_name, i).binary.hex() for i in range(start, stop)]
+    return {
+        "users": ids("user", 0, args.users), "spare_users": ids("user", args.users, args.users + spare),
+        "marcadores": ids("marcador", 0, args.marcadores),
+        "spare_marcadores": ids("marcador", args.marcadores, args.marcadores + spare),
+        "visitas": ids("visita", 0, args.visitas), "spare_visitas": ids("visita", args.visitas, args.visitas + spare),
+        "images": ids("image", 0, args.images)
+    }
+
+# Rutas
+
+def build_routes(args, rng: random.Random, ids: dict) -> dict:
+    """
+    Peticiones de cada ruta: nombre -> función que devuelve (método, URL, argumentos de httpx).
+    Las funciones reciben el número de petición, para que las escrituras no choquen entre sí.
+    """
+    email = lambda: f"user{rng.randrange(args.users)}@example.com"
+    user = lambda: rng.choice(ids["users"])
+    marcador = lambda: rng.choice(ids["marcadores"])
+    visita = lambda: rng.choice(ids["visitas"])
+    image = lambda: rng.choice(ids["images"])
+    spare = {name: iter(ids[f"spare_{name}"]) for name in ("users", "marcadores", "visitas")}
+
+    def bbox(width=1.0):
+        lon, lat = rng.uniform(BOUNDS[0], BOUNDS[2] - width), rng.uniform(BOUNDS[1], BOUNDS[3] - width)
+        return f"{lon},{lat},{lon + width},{lat + width}"
+
+    def tile(z=8):
+        # Teselas de la península a zoom 8
+        return f"{z}/{rng.randrange(121, 131)}/{rng.randrange(94, 103)}"
+
+    def new_marcador(n):
+        return {"lugar": f"{rng.choice(PLACES)} nuevo {n}", "lat": rng.uniform(BOUNDS[1], BOUNDS[3]),
+                "lon": rng.uniform(BOUNDS[0], BOUNDS[2]), "creador": email(), "imagen": "https://example.com/foto.png"}
+
+    def new_visita(n):
+        return {"usuarioVisitado": email(), "usuarioVisitante": email(), "oauthToken": "token"}
+
+    def new_user(n):
+        return {"email": f"nuevo{n}@example.com", "name": "Nuevo", "surname": "Usuario", "description": "",
+                "userName": f"nuevo{n}", "oauthId": f"nuevo{n}", "oauthProvider": "google",
+                "oauthToken": "token", "profilePicture": "https://example.com/profile.jpg"}
+
+    def user_update(n):
+        # UserUpdate exige todos los campos editables
+        return {"email": email(), "name": "Editado", "surname": "Usuario", "description": f"Editado {n}",
+                "profilePicture": "https://example.com/profile.jpg"}
+
+    def ndjson(rows):
+        return "\n".join(json.dumps(row) for row in rows)
+
+    json_headers = {"Accept": "application/json"}
+    return {
+        # Marcadores
+        "GET /marcadores": lambda n: ("GET", f"{API}/marcadores", {"params": {"limit": 20}}),
+        "GET /marcadores?creador": lambda n: ("GET", f"{API}/marcadores", {"params": {"creador": email()}}),
+        "GET /marcadores?q": lambda n: ("GET", f"{API}/marcadores", {"params": {"q": rng.choice(PLACES).split()[0]}}),
+        "GET /marcadores?bbox": lambda n: ("GET", f"{API}/marcadores", {"params": {"bbox": bbox(), "limit": 100}}),
+        "GET /marcadores?near": lambda n: ("GET", f"{API}/marcadores", {"params": {
+            "near": f"{rng.uniform(BOUNDS[1], BOUNDS[3])},{rng.uniform(BOUNDS[0], BOUNDS[2])}", "radius": 50000}}),
+        "POST /marcadores/batch": lambda n: ("POST", f"{API}/marcadores/batch",
+                                             {"json": {"ids": [marcador() for _ in range(20)]}}),
+        "GET /marcadores/export": lambda n: ("GET", f"{API}/marcadores/export", {}),
+        "GET /marcadores/autocomplete": lambda n: ("GET", f"{API}/marcadores/autocomplete",
+                                                   {"params": {"prefix": rng.choice(PLACES)[:3]}}),
+        "GET /marcadores/clusters": lambda n: ("GET", f"{API}/marcadores/clusters", {"params": {"bbox": bbox(4.0), "zoom": 6}}),
+        "GET /marcadores/tiles/{z}/{x}/{y}": lambda n: ("GET", f"{API}/marcadores/tiles/{tile()}", {}),
+        "GET /marcadores/{id}": lambda n: ("GET", f"{API}/marcadores/{marcador()}", {}),
+        "GET /marcadores/email/{email}": lambda n: ("GET", f"{API}/marcadores/email/{email()}", {}),
+        "POST /marcadores": lambda n: ("POST", f"{API}/marcadores", {"json": new_marcador(n)}),
+        "POST /marcadores:bulk": lambda n: ("POST", f"{API}/marcadores:bulk", {
+            "content": ndjson(new_marcador(n * 100 + i) for i in range(100)),
+            "headers": {"Content-Type": "application/x-ndjson"}}),
+        "PUT /marcadores/{id}": lambda n: ("PUT", f"{API}/marcadores/{marcador()}", {"json": {"lugar": f"Editado {n}"}}),
+        "DELETE /marcadores/{id}": lambda n: ("DELETE", f"{API}/marcadores/{next(spare['marcadores'])}", {}),
+        # Visitas
+        "GET /visitas": lambda n: ("GET", f"{API}/visitas", {"params": {"limit": 20}}),
+        "GET /visitas?usuarioVisitado": lambda n: ("GET", f"{API}/visitas", {"params": {"usuarioVisitado": email()}}),
+        "GET /visitas/email/{email}": lambda n: ("GET", f"{API}/visitas/email/{email()}", {}),
+        "GET /visitas/stats": lambda n: ("GET", f"{API}/visitas/stats", {"params": {
+            "usuarioVisitado": email(), "to": seed_data.REFERENCE_DATE.isoformat()}}),
+        "GET /visitas/export": lambda n: ("GET", f"{API}/visitas/export", {}),
+        "POST /visitas": lambda n: ("POST", f"{API}/visitas", {"json": new_visita(n)}),
+        "POST /visitas:bulk": lambda n: ("POST", f"{API}/visitas:bulk", {
+            "content": ndjson(new_visita(n) for _ in range(100)), "headers": {"Content-Type": "application/x-ndjson"}}),
+        "PUT /visitas/{id}": lambda n: ("PUT", f"{API}/visitas/{visita()}", {"json": {"usuarioVisitado": email()}}),
+        "DELETE /visitas/{id}": lambda n: ("DELETE", f"{API}/visitas/{next(spare['visitas'])}", {}),
+        # Usuarios
+        "GET /users": lambda n: ("GET", f"{API}/users", {"params": {"limit": 20}}),
+        "GET /users?userName": lambda n: ("GET", f"{API}/users", {"params": {"userName": f"user{rng.randrange(args.users)}"}}),
+        "GET /users/export": lambda n: ("GET", f"{API}/users/export", {}),
+        "POST /users/batch": lambda n: ("POST", f"{API}/users/batch", {"json": {"ids": [user() for _ in range(20)]}}),
+        "GET /users/{id}": lambda n: ("GET", f"{API}/users/{user()}", {}),
+        "POST /users/{id}/review": lambda n: ("POST", f"{API}/users/{user()}/review",
+                                              {"json": {"user": user(), "rating": rng.randint(1, 5)}}),
+        "GET /users/{id}/review-average": lambda n: ("GET", f"{API}/users/{user()}/review-average", {}),
+        "GET /users/{id}/profile": lambda n: ("GET", f"{API}/users/{user()}/profile", {}),
+        "GET /users/oauth/{oauthId}": lambda n: ("GET", f"{API}/users/oauth/oauth{rng.randrange(args.users)}",
+                                                 {"params": {"oauthProvider": "google"}}),
+        "POST /users": lambda n: ("POST", f"{API}/users", {"json": new_user(n)}),
+        "PUT /users/{id}": lambda n: ("PUT", f"{API}/users/{user()}", {"json": user_update(n)}),
+        "DELETE /users/{id}": lambda n: ("DELETE", f"{API}/users/{next(spare['users'])}", {}),
+        "OPTIONS /users": lambda n: ("OPTIONS", f"{API}/users", {}),
+        # Multimedia
+        "GET /media": lambda n: ("GET", f"{API}/media", {"params": {"limit": 20}}),
+        "GET /media/export": lambda n: ("GET", f"{API}/media/export", {}),
+        "POST /media/batch": lambda n: ("POST", f"{API}/media/batch", {"json": {"ids": [image() for _ in range(20)]}}),
+        "GET /media/{id}": lambda n: ("GET", f"{API}/media/{image()}", {}),
+        "GET /media/{id}?variant": lambda n: ("GET", f"{API}/media/{image()}", {"params": {"variant": "thumb"}}),
+        "POST /media": lambda n: ("POST", f"{API}/media", {"files": {"file": (f"bench{n}.png", make_png(n), "image/png")}}),
+        "OPTIONS /media": lambda n: ("OPTIONS", f"{API}/media", {}),
+    }, json_headers
+
+# Medición
+
+async def run_route(client: httpx.AsyncClient, request, args, headers: dict, numbers) -> dict:
+    """Lanzar las peticiones de una ruta con la concurrencia indicada y resumir el resultado."""
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, statuses = [], Counter()
+
+    async def one(n, measure):
+        async with semaphore:
+            method, url, kwargs = request(n)
+            kwargs.setdefault("headers", {}).update(headers)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                await response.aread()
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if measure:
+                latencies.append(time.perf_counter() - start)
+                statuses[status] += 1
+
+    await asyncio.gather(*(one(next(numbers), False) for _ in range(args.warmup)))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(next(numbers), True) for _ in range(args.requests)))
+    seconds = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": sum(n for status, n in statuses.items() if not status.startswith(("2", "3"))),
+        "status": dict(statuses),
+        "rps": round(len(latencies) / seconds, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2)
+    }
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    """Mostrar la variación de p95 y del rendimiento frente a un resultado anterior; devuelve las regresiones."""
+    regressions = []
+    for name, route in result["routes"].items():
+        previous = baseline.get("routes", {}).get(name)
+        if previous is None:
+            continue
+        p95 = 100 * (route["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] if previous["p95_ms"] else 0
+        rps = 100 * (route["rps"] - previous["rps"]) / previous["rps"] if previous["rps"] else 0
+        flag = "  REGRESIÓN" if p95 > threshold else ""
+        print(f"{name:40} p95 {previous['p95_ms']:>9.2f} -> {route['p95_ms']:>9.2f} ms ({p95:+6.1f}%)"
+              f"  rps {rps:+6.1f}%{flag}", file=sys.stderr)
+        if flag:
+            regressions.append(name)
+    return regressions
+
+async def wait_for_server(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("El servidor ha terminado al arrancar")
+        try:
+            await client.get("/openapi.json")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("El servidor no ha arrancado a tiempo")
+
+async def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    media_root = tempfile.mkdtemp(prefix="bench-media-")
+    env = {**os.environ, "URI": args.uri, "DB_NAME": args.db, "STORAGE_BACKEND": "local", "MEDIA_ROOT": media_root}
+    # El propio benchmark siembra la base de datos con la misma configuración que el servidor
+    os.environ.update(env)
+
+    ids = await seed(args)
+    routes, headers = build_routes(args, rng, ids)
+    if args.routes:
+        routes = {name: request for name, request in routes.items() if args.routes in name}
+
+    port = free_port()
+    log = open(Path(media_root) / "server.log", "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    result = {
+        "config": {key: getattr(args, key) for key in ("db", "users", "marcadores", "visitas", "images",
+                                                       "requests", "concurrency", "warmup", "seed")},
+        "routes": {}
+    }
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            await wait_for_server(client, process)
+            numbers = count()
+            for name, request in routes.items():
+                result["routes"][name] = await run_route(client, request, args, headers, numbers)
+                route = result["routes"][name]
+                print(f"{name:40} {route['rps']:>8.1f} req/s  p50 {route['p50_ms']:>8.2f}  p95 {route['p95_ms']:>8.2f}"
+                      f"  p99 {route['p99_ms']:>8.2f} ms  errores {route['errors']}", file=sys.stderr)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        log.close()
+        if not args.keep:
+            from db_connection import DatabaseConnection
+            await drop_database(args.db)
+            await DatabaseConnection.close_connection()
+    print(f"Registro del servidor: {log.name}", file=sys.stderr)
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+    if args.baseline:
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark de la serialización de las respuestas de listas.
+
+Compara, sobre documentos con la forma que devuelve MongoDB (ObjectId y datetime),
+el camino anterior (copiar cada documento convirtiendo '_id' y 'timestamp' y serializar
+con JSONResponse, que usa json de la biblioteca estándar) con FastJSONResponse, que
+serializa los documentos tal cual con orjson.
+
+Uso (desde server/): python -m benchmarks.bench_serialization [--rows 10000] [--repeat 20]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from json_response import FastJSONResponse
+
+def make_visitas(rows: int) -> list:
+    """Generar visitas con los tipos que devuelve pymongo."""
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "usuarioVisitado": f"user{random.randint(0, 999)}@example.com",
+            "usuarioVisitante": f"user{random.randint(0, 999)}@example.com",
+            "oauthToken": None,
+            "timestamp": start + timedelta(seconds=random.randint(0, 10 ** 7), microseconds=random.randint(0, 999999))
+        }
+        for _ in range(rows)
+    ]
+
+def old_path(documents: list) -> bytes:
+    """Conversión por fila (copia del documento) + json de la biblioteca estándar."""
+    converted = [
+        {
+            **d,
+            '_id': d['_id'].binary.hex(),
+            'timestamp': d['timestamp'].isoformat() if isinstance(d.get('timestamp'), datetime) else d.get('timestamp')
+        }
+        for d in documents
+    ]
+    return JSONResponse(content=converted).body
+
+def new_path(documents: list) -> bytes:
+    """Serialización nativa con orjson, sin copiar los documentos."""
+    return FastJSONResponse(content=documents).body
+
+def measure(function, documents: list, repeat: int) -> float:
+    """Devolver el mejor tiempo (en segundos) de 'repeat' ejecuciones."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(documents)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="Documentos por respuesta")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones por medida")
+    args = parser.parse_args()
+
+    random.seed(0)
+    documents = make_visitas(args.rows)
+
+    # Ambos caminos deben producir el mismo JSON
+    assert json.loads(old_path(documents)) == json.loads(new_path(documents))
+
+    results = {}
+    for name, function in (("old", old_path), ("new", new_path)):
+        seconds = measure(function, documents, args.repeat)
+        results[name] = {"total_ms": round(seconds * 1000, 3), "per_row_us": round(seconds / args.rows * 10 ** 6, 3)}
+    results["speedup"] = round(results["old"]["total_ms"] / results["new"]["total_ms"], 2)
+    results["rows"] = args.rows
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
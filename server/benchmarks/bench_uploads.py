@@ -0,0 +1,106 @@
+"""
+Benchmark de subidas concurrentes de imágenes con el backend de almacenamiento local.
+
+Lanza 'uploads' subidas de 'size' KiB con 'concurrency' subidas a la vez a través de
+UploadUtils (executor acotado) y, como referencia, llamando al backend directamente desde
+el bucle de eventos, como se hacía antes. Mide el rendimiento, la latencia de cada subida y
+el retraso máximo del bucle de eventos (lo que tardaría en atenderse cualquier otra petición).
+Con --delay-ms se añade a cada subida una espera bloqueante que simula la latencia de red de un
+backend remoto como Cloudinary.
+
+Uso (desde server/): python -m benchmarks.bench_uploads [--uploads 500] [--size 512] [--concurrency 32] [--delay-ms 0]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import LocalStorage
+from upload_utils import UploadUtils
+
+# Cada cuánto (en segundos) se mide el retraso del bucle de eventos
+LAG_INTERVAL = 0.005
+
+class DelayedStorage(LocalStorage):
+    """Almacenamiento local con una espera bloqueante por subida, como la de un backend remoto."""
+
+    def __init__(self, root: str, base_url: str, delay: float):
+        super().__init__(root, base_url)
+        self.delay = delay
+
+    def save(self, file, filename, content_type=None):
+        time.sleep(self.delay)
+        return super().save(file, filename, content_type)
+
+async def measure_lag(stop: asyncio.Event, lags: list):
+    """Medir cuánto se retrasa un sleep corto mientras se hacen las subidas."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(loop.time() - start - LAG_INTERVAL)
+
+async def run(upload, payload: bytes, uploads: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, lags = [], []
+    stop = asyncio.Event()
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await upload(io.BytesIO(payload), f"bench_{i}.jpg")
+            latencies.append(time.perf_counter() - start)
+
+    lag_task = asyncio.create_task(measure_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(uploads)))
+    seconds = time.perf_counter() - start
+    stop.set()
+    await lag_task
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "uploads_per_s": round(uploads / seconds, 1),
+        "mb_per_s": round(uploads * len(payload) / seconds / 2 ** 20, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+        "max_loop_lag_ms": round(max(lags, default=0) * 1000, 2)
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=500, help="Número de subidas por modo")
+    parser.add_argument("--size", type=int, default=512, help="Tamaño de cada fichero en KiB")
+    parser.add_argument("--concurrency", type=int, default=32, help="Subidas lanzadas a la vez")
+    parser.add_argument("--delay-ms", type=float, default=0, help="Latencia simulada del backend por subida")
+    args = parser.parse_args()
+
+    payload = os.urandom(args.size * 1024)
+    with tempfile.TemporaryDirectory() as root:
+        storage = DelayedStorage(root, "/media-files", args.delay_ms / 1000)
+
+        async def blocking(file, filename):
+            storage.save(file, filename)
+
+        async def offloaded(file, filename):
+            await UploadUtils.upload(file, filename, None, storage)
+
+        results = {
+            "blocking": await run(blocking, payload, args.uploads, args.concurrency),
+            "executor": await run(offloaded, payload, args.uploads, args.concurrency)
+        }
+        await UploadUtils.shutdown()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Benchmark de la escritura de visitas: un insert_one por petición frente al búfer de
+escritura diferida (WriteBuffer) con insert_many por lotes.
+
+Simula 'requests' peticiones de creación de visita con 'concurrency' peticiones a la vez
+contra la base de datos configurada en URI (.env), en una colección temporal que se borra
+al terminar. Para cada modo muestra las visitas por segundo (hasta que todas están escritas)
+y la latencia con la que se responde a cada petición.
+
+Uso (desde server/): python -m benchmarks.bench_visit_writes [--requests 20000] [--concurrency 200]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from bson import ObjectId
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db_connection import DatabaseConnection
+from write_buffer import WriteBuffer
+
+COLLECTION = "bench_visita"
+
+def make_visita() -> dict:
+    return {
+        "usuarioVisitado": f"user{random.randint(0, 999)}@example.com",
+        "usuarioVisitante": f"user{random.randint(0, 999)}@example.com",
+        "oauthToken": None,
+        "timestamp": datetime.now()
+    }
+
+async def run(handler, requests: int, concurrency: int) -> list:
+    """Lanzar las peticiones con la concurrencia indicada y devolver la latencia de cada una."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await handler(make_visita())
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+def summary(latencies: list, seconds: float) -> dict:
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "visits_per_s": round(len(latencies) / seconds, 1),
+        "total_s": round(seconds, 3),
+        "ack_p50_ms": round(quantiles[49] * 1000, 3),
+        "ack_p99_ms": round(quantiles[98] * 1000, 3)
+    }
+
+async def bench_direct(requests: int, concurrency: int) -> dict:
+    async def handler(visita):
+        await DatabaseConnection.create_document(COLLECTION, visita)
+
+    start = time.perf_counter()
+    latencies = await run(handler, requests, concurrency)
+    return summary(latencies, time.perf_counter() - start)
+
+async def bench_buffered(requests: int, concurrency: int, batch_size: int, interval: float) -> dict:
+    buffer = WriteBuffer(COLLECTION, max_size=max(batch_size * 4, concurrency), batch_size=batch_size,
+                         flush_interval=interval, put_timeout=30)
+
+    async def handler(visita):
+        visita["_id"] = ObjectId()
+        if not await buffer.put(visita):
+            raise RuntimeError("Visita rechazada por el búfer")
+
+    start = time.perf_counter()
+    latencies = await run(handler, requests, concurrency)
+    # El tiempo total incluye escribir lo que queda en la cola
+    await buffer.stop()
+    result = summary(latencies, time.perf_counter() - start)
+    result.update(flushes=buffer.flushes, failed=buffer.failed)
+    return result
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000, help="Visitas a crear en cada modo")
+    parser.add_argument("--concurrency", type=int, default=200, help="Peticiones simultáneas")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documentos por insert_many del búfer")
+    parser.add_argument("--interval", type=float, default=1.0, help="Segundos máximos de espera del búfer")
+    args = parser.parse_args()
+
+    random.seed(0)
+    collection = DatabaseConnection.get_collection(COLLECTION)
+    try:
+        await collection.drop()
+        results = {"direct": await bench_direct(args.requests, args.concurrency)}
+        await collection.drop()
+        results["buffered"] = await bench_buffered(args.requests, args.concurrency, args.batch_size, args.interval)
+        results["written"] = await collection.count_documents({})
+        results["speedup"] = round(results["buffered"]["visits_per_s"] / results["direct"]["visits_per_s"], 2)
+        print(json.dumps(results, indent=2))
+    finally:
+        await collection.drop()
+        await DatabaseConnection.close_connection()
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+import json
+from typing import Callable, Optional
+from fastapi import Request, HTTPException
+from pydantic import BaseModel, ValidationError
+
+from db_connection import DatabaseConnection
+
+# Documentos que se envían a MongoDB en cada insert_many
+BULK_BATCH_SIZE = 500
+
+class BulkUtils:
+
+    @classmethod
+    async def read_rows(cls, request: Request):
+        """
+        Leer las filas del cuerpo de una petición de carga masiva.
+
+        Acepta un array JSON (application/json) o NDJSON (application/x-ndjson), que se
+        procesa según llega, línea a línea, sin cargar el cuerpo completo en memoria.
+        Devuelve cada fila como texto NDJSON o, en el caso del array, ya decodificada.
+        """
+        content_type = request.headers.get("Content-Type", "")
+
+        if "application/x-ndjson" in content_type or "application/jsonl" in content_type:
+            pending = b""
+            async for chunk in request.stream():
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        yield line
+            if pending.strip():
+                yield pending
+
+        elif "application/json" in content_type:
+            try:
+                rows = json.loads(await request.body())
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"El cuerpo no es un JSON válido: {str(e)}")
+            if not isinstance(rows, list):
+                raise HTTPException(status_code=400, detail="El cuerpo debe ser un array JSON")
+            for row in rows:
+                yield row
+
+        else:
+            raise HTTPException(status_code=415, detail="La cabecera Content-Type debe ser 'application/json' o 'application/x-ndjson'")
+
+    @classmethod
+    def validate_row(cls, row, model: type[BaseModel]) -> BaseModel:
+        """Validar una fila (texto NDJSON o valor ya decodificado) contra el modelo."""
+        if isinstance(row, (bytes, str)):
+            return model.model_validate_json(row)
+        return model.model_validate(row)
+
+    @classmethod
+    async def bulk_create(cls, request: Request, collection_name: str, model: type[BaseModel],
+                          prepare: Optional[Callable[[dict], None]] = None,
+                          on_created: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        Validar cada fila contra el modelo e insertar las válidas en lotes de BULK_BATCH_SIZE.
+
+        'prepare' completa cada documento antes de insertarlo y 'on_created' se llama con
+        cada documento insertado. Devuelve el resumen con el resultado de cada fila.
+        """
+        results = []
+        batch = []
+
+        async def flush():
+            failed = await DatabaseConnection.create_documents(collection_name, [document for _, document in batch])
+            for position, (index, document) in enumerate(batch):
+                if position in failed:
+                    results[index] = {"index": index, "status": "error", "detail": failed[position]}
+                else:
+                    results[index] = {"index": index, "status": "created", "_id": document["_id"].binary.hex()}
+                    if on_created:
+                        on_created(document)
+            batch.clear()
+
+        async for row in cls.read_rows(request):
+            index = len(results)
+            try:
+                document = cls.validate_row(row, model).model_dump()
+            except ValidationError as e:
+                results.append({"index": index, "status": "error",
+                                "detail": [{"loc": list(error["loc"]), "msg": error["msg"]} for error in e.errors()]})
+                continue
+
+            if prepare:
+                prepare(document)
+            results.append(None)
+            batch.append((index, document))
+            if len(batch) >= BULK_BATCH_SIZE:
+                await flush()
+
+        if batch:
+            await flush()
+
+        created = sum(1 for result in results if result["status"] == "created")
+        return {"created": created, "failed": len(results) - created, "results": results}
@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+class TTLCache:
+    """
+    Caché en memoria acotada, con expulsión LRU y caducidad por tiempo.
+
+    Attributes
+    ----------
+    maxsize : int
+        Número máximo de entradas; al superarlo se expulsa la menos usada recientemente
+    ttl : float
+        Segundos que una entrada sigue siendo válida desde que se guardó
+    hits, misses : int
+        Contadores de aciertos y fallos de get()
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """Devolver el valor guardado para la clave, o default si no existe o ha caducado."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Guardar un valor, expulsando la entrada más antigua si se supera el tamaño máximo."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Eliminar una clave si existe."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Vaciar la caché."""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Devolver el tamaño y los contadores de aciertos y fallos."""
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+class VersionTable:
+    """
+    Versión de cada clave, que cambia cada vez que se invalida con bump().
+
+    Las versiones salen de un contador común, así que 'current' sirve para saber si una clave
+    se ha invalidado después de un momento dado. Se recuerdan las maxsize claves invalidadas
+    más recientemente; las olvidadas toman la mayor versión expulsada, de modo que la versión de
+    una clave nunca vuelve atrás (como mucho cambia sin que la clave se haya invalidado).
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.current = 0
+        self._evicted = 0
+        self._versions = OrderedDict()
+        self._lock = Lock()
+
+    def bump(self, key):
+        """Dar a la clave una versión nueva."""
+        with self._lock:
+            self.current += 1
+            self._versions[key] = self.current
+            self._versions.move_to_end(key)
+            while len(self._versions) > self.maxsize:
+                _, evicted = self._versions.popitem(last=False)
+                self._evicted = max(self._evicted, evicted)
+
+    def get(self, key) -> int:
+        """Versión actual de la clave."""
+        with self._lock:
+            return self._versions.get(key, self._evicted)
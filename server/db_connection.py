@@ -1,19 +1,54 @@
-from datetime import datetime
-from pymongo import MongoClient, errors
+from collections import OrderedDict
+from pymongo import AsyncMongoClient, UpdateOne, errors
 from pymongo.server_api import ServerApi
 from bson.objectid import ObjectId
+from bson import json_util
+import asyncio
 import logging
 import os
 from dotenv import load_dotenv
 
-# Configuración del registro de errores
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from cache import TTLCache
+from logging_config import setup_logging, query_logger as sampled_query_logger
+from metrics import event_listeners as metrics_listeners
+from slow_queries import event_listeners as slow_query_listeners
+
+# Configuración del registro: JSON escrito desde un hilo en segundo plano
+setup_logging()
 logger = logging.getLogger(__name__)
+# Registro de cada consulta, muestreado y limitado (LOG_QUERY_SAMPLE_RATE, LOG_QUERY_MAX_PER_SECOND)
+query_logger = sampled_query_logger()
 load_dotenv()
 
+# Documentos por lote que devuelve el cursor del servidor al recorrer colecciones completas
+DEFAULT_BATCH_SIZE = 500
+# Documentos (por colección e ID) que se guardan en la caché de read_document_id
+DOCUMENT_CACHE_SIZE = int(os.getenv('DOCUMENT_CACHE_SIZE', 10000))
+# Segundos que un documento en caché se considera válido; acota lo que puede quedar
+# desactualizado cuando otro proceso modifica el documento
+DOCUMENT_CACHE_TTL = float(os.getenv('DOCUMENT_CACHE_TTL', 30))
+# Segundos que se reutiliza el total de una query filtrada en query_page (0 para no cachear)
+COUNT_CACHE_TTL = float(os.getenv('COUNT_CACHE_TTL', 5))
+COUNT_CACHE_SIZE = 10000
+# Base de datos de la aplicación (otra distinta para benchmarks y pruebas)
+DB_NAME = os.getenv('DB_NAME', 'mi-mapa')
+
 class DatabaseConnection:
     _client = None
     _db = None
+    # Caché de read_document_id: (colección, ID) -> {(proyección, hasDate): documento}
+    _document_cache = TTLCache(DOCUMENT_CACHE_SIZE, DOCUMENT_CACHE_TTL)
+    # Aciertos y fallos por (documento, proyección); los de la TTLCache cuentan solo por documento
+    _cache_hits = 0
+    _cache_misses = 0
+    # Generación de la última invalidación de cada documento: una lectura que empezó antes no
+    # guarda su resultado en la caché. Se recuerdan las DOCUMENT_CACHE_SIZE más recientes; para
+    # las olvidadas vale la mayor generación expulsada, que es más conservadora
+    _generations = OrderedDict()
+    _generation = 0
+    _evicted_generation = 0
+    # Totales de query_page por (colección, query)
+    _count_cache = TTLCache(COUNT_CACHE_SIZE, COUNT_CACHE_TTL)
 
     @classmethod
     def connect(cls):
@@ -32,8 +67,9 @@ class DatabaseConnection:
         if cls._client is None:
             try:
                 uri = os.getenv('URI')
-                cls._client = MongoClient(uri,server_api=ServerApi('1'))
-                cls._db = cls._client['mi-mapa']
+                cls._client = AsyncMongoClient(uri,server_api=ServerApi('1'),
+                                              event_listeners=metrics_listeners() + slow_query_listeners())
+                cls._db = cls._client[DB_NAME]
                 logger.info("Conexión establecida a la base de datos.")
             except errors.ConnectionFailure as e:
                 logger.error(f"Error de conexión a la base de datos: {e}")
@@ -46,12 +82,12 @@ class DatabaseConnection:
         return cls._db[collection_name]
     
     @classmethod
-    def count_documents(cls, collection_name, query):
+    async def count_documents(cls, collection_name, query):
         collection = cls.get_collection(collection_name)
-        return float(collection.count_documents(query))
+        return await collection.count_documents(query)
     
     @classmethod
-    def get_collection_fields(cls, collection_name, projection = None, hasDate = False):
+    async def get_collection_fields(cls, collection_name, projection = None, hasDate = False):
         """Obtener una colección específica de la base de datos y mostrar los campos elegidos."""
         collection = cls.get_collection(collection_name)
         try:
@@ -61,43 +97,67 @@ class DatabaseConnection:
                 return []
             
             if hasDate:
-                return [{**d, '_id': d['_id'].binary.hex(),'timestamp': d['timestamp'].strftime('%Y-%m-%d %H:%M:%S') if 'timestamp' in d else None} for d in documents]
+                return [{**d, '_id': d['_id'].binary.hex(),'timestamp': d['timestamp'].strftime('%Y-%m-%d %H:%M:%S') if 'timestamp' in d else None} async for d in documents]
             
-            return [{**d, '_id': d['_id'].binary.hex()} for d in documents]
+            return [{**d, '_id': d['_id'].binary.hex()} async for d in documents]
 
         except Exception as e:
             logger.error(f"ID de documento no válido: {e}")
             raise
     
     @classmethod
-    def create_document(cls, collection_name, document, hasDate = False):
+    async def create_document(cls, collection_name, document, hasDate = False):
         """Crear un nuevo documento en la colección."""
         collection = cls.get_collection(collection_name)
         try:
-            result = collection.insert_one(document)
+            result = await collection.insert_one(document)
             document['_id'] = document['_id'].binary.hex()
             if hasDate:
                 document['timestamp'] = document['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-            logger.info(f"Documento creado con ID: {result.inserted_id}")
+            logger.info("Documento creado con ID: %s", result.inserted_id)
             return document['_id']
         except errors.PyMongoError as e:
             logger.error(f"Error al crear el documento: {e}")
             raise
 
     @classmethod
-    def create_array_element_id(cls, collection_name, document_id, array_field, element):
+    async def create_documents(cls, collection_name, documents, ordered=False):
+        """
+        Insertar varios documentos con un solo insert_many.
+
+        Con ordered=False un documento erróneo no impide insertar los demás. Los documentos
+        reciben su '_id' en el propio diccionario.
+
+        Returns:
+            Un diccionario {posición en documents: mensaje de error} con los que no se insertaron.
+        """
+        collection = cls.get_collection(collection_name)
+        try:
+            await collection.insert_many(documents, ordered=ordered)
+            failed = {}
+        except errors.BulkWriteError as e:
+            failed = {error["index"]: error.get("errmsg", "Error de escritura") for error in e.details.get("writeErrors", [])}
+        except errors.PyMongoError as e:
+            logger.error(f"Error al crear los documentos: {e}")
+            raise
+        logger.info("%d documentos creados en la colección '%s'.", len(documents) - len(failed), collection_name)
+        return failed
+
+    @classmethod
+    async def create_array_element_id(cls, collection_name, document_id, array_field, element):
         """Crear un nuevo elemento en un arreglo de un documento existente, a partir de un ID."""
         collection = cls.get_collection(collection_name)
         try:
-            result = collection.update_one(
+            result = await collection.update_one(
                 {"_id": ObjectId(document_id)},
                 {"$push": {array_field: element}}
             )
+            cls.invalidate_document(collection_name, document_id)
             if result.modified_count == 0:
                 logger.warning(f"No se encontró el documento con ID {document_id} para agregar un elemento.")
                 raise ValueError("Documento no encontrado para el ID proporcionado.")
             
-            logger.info(f"Elemento agregado al documento con ID {document_id}.")
+            logger.info("Elemento agregado al documento con ID %s.", document_id)
             return True
         except ValueError as e:
             raise e
@@ -106,19 +166,20 @@ class DatabaseConnection:
             raise RuntimeError("Error de base de datos al agregar el elemento.")
 
     @classmethod
-    def update_array_element_id(cls, collection_name, document_id, array_field, element_query, updated_fields):
+    async def update_array_element_id(cls, collection_name, document_id, array_field, element_query, updated_fields):
         """Actualizar un elemento de un arreglo en un documento existente, a partir de un ID."""
         collection = cls.get_collection(collection_name)
         try:
-            result = collection.update_one(
+            result = await collection.update_one(
                 {"_id": ObjectId(document_id), array_field: element_query},
                 {"$set": {f"{array_field}.$": updated_fields}}
             )
+            cls.invalidate_document(collection_name, document_id)
             if result.modified_count == 0:
                 logger.warning(f"No se encontró el documento con ID {document_id} para actualizar un elemento.")
                 raise ValueError("Documento no encontrado para el ID proporcionado.")
             
-            logger.info(f"Elemento actualizado en el documento con ID {document_id}.")
+            logger.info("Elemento actualizado en el documento con ID %s.", document_id)
             return True
         except ValueError as e:
             raise e
@@ -128,19 +189,20 @@ class DatabaseConnection:
         
 
     @classmethod
-    def delete_array_element_id(cls, collection_name, document_id, array_field, element_query):
+    async def delete_array_element_id(cls, collection_name, document_id, array_field, element_query):
         """Eliminar un elemento de un arreglo en un documento existente, a partir de un ID."""
         collection = cls.get_collection(collection_name)
         try:
-            result = collection.update_one(
+            result = await collection.update_one(
                 {"_id": ObjectId(document_id)},
                 {"$pull": {array_field: element_query}}
             )
+            cls.invalidate_document(collection_name, document_id)
             if result.modified_count == 0:
                 logger.warning(f"No se encontró el documento con ID {document_id} para eliminar un elemento.")
                 raise ValueError("Documento no encontrado para el ID proporcionado.")
             
-            logger.info(f"Elemento eliminado del documento con ID {document_id}.")
+            logger.info("Elemento eliminado del documento con ID %s.", document_id)
             return True
         except ValueError as e:
             raise e
@@ -149,74 +211,277 @@ class DatabaseConnection:
             raise RuntimeError("Error de base de datos al eliminar el elemento.")
 
     @classmethod
-    def read_document_id(cls, collection_name, document_id : str, projection = None, hasDate = False): # CAMBIO
+    async def read_document_id(cls, collection_name, document_id : str, projection = None, hasDate = False): # CAMBIO
         """Leer un documento por su ID."""
+        key = (collection_name, str(document_id).lower())
+        variant = (cls._projection_key(projection), hasDate)
+        cached = cls._document_cache.get(key)
+        if cached is not None and variant in cached:
+            cls._cache_hits += 1
+            # Copia para que el llamador pueda modificar el documento sin alterar la caché
+            return dict(cached[variant])
+        cls._cache_misses += 1
+        generation = cls._generation
+
         collection = cls.get_collection(collection_name)
         try:
-            document = collection.find_one({"_id": ObjectId(document_id)}, projection)
+            document = await collection.find_one({"_id": ObjectId(document_id)}, projection)
             if document is None:
                 logger.warning(f"Documento con ID {document_id} no encontrado.")
             else:
                 document['_id'] = document_id
                 if hasDate:
                     document['timestamp'] = document['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+                # Solo si el documento no se ha invalidado mientras se leía: la copia leída podría ser
+                # anterior a esa escritura. Se conservan las otras proyecciones ya guardadas
+                if cls._generations.get(key, cls._evicted_generation) <= generation:
+                    cls._document_cache.set(key, {**(cached or {}), variant: dict(document)})
             return document
         except Exception as e:
             logger.error(f"ID de documento no válido: {e}")
             raise
     
     @classmethod
-    def query_document(cls, collection_name, document_query, projection=None, sort_criteria=None, skip=0, limit=0, id_list=None, hasDate=False): # CAMBIO
-        """Realizar query según los parámetros."""
+    def _projection_key(cls, projection):
+        """Convertir una proyección en una clave hashable e independiente del orden de sus campos."""
+        if not projection:
+            return None
+        if isinstance(projection, dict):
+            return tuple(sorted(projection.items()))
+        return tuple(sorted(projection))
+
+    @classmethod
+    def invalidate_document(cls, collection_name, document_id):
+        """Eliminar de la caché todas las proyecciones de un documento."""
+        key = (collection_name, str(document_id).lower())
+        cls._generation += 1
+        cls._generations[key] = cls._generation
+        cls._generations.move_to_end(key)
+        while len(cls._generations) > DOCUMENT_CACHE_SIZE:
+            _, evicted = cls._generations.popitem(last=False)
+            cls._evicted_generation = max(cls._evicted_generation, evicted)
+        cls._document_cache.delete(key)
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """Devolver el tamaño y los contadores de aciertos y fallos de la caché de documentos."""
+        stats = cls._document_cache.stats()
+        stats.update(hits=cls._cache_hits, misses=cls._cache_misses)
+        return stats
+
+    @classmethod
+    def count_cache_stats(cls) -> dict:
+        """Devolver el tamaño y los contadores de aciertos y fallos de la caché de totales de query_page."""
+        return cls._count_cache.stats()
+
+    @classmethod
+    async def read_documents_ids(cls, collection_name, document_ids, projection=None, document_query=None):
+        """
+        Leer varios documentos por sus IDs con una sola consulta $in.
+
+        Returns:
+            Una tupla (documentos en el orden de document_ids, IDs no encontrados).
+        """
+        if not document_ids:
+            return [], []
+        documents = await cls.query_document(
+            collection_name, dict(document_query or {}), projection,
+            id_list=[ObjectId(document_id) for document_id in document_ids]
+        )
+        by_id = {str(d['_id']): d for d in documents}
+        found = [by_id[document_id] for document_id in document_ids if document_id in by_id]
+        missing = [document_id for document_id in document_ids if document_id not in by_id]
+        return found, missing
+
+    @classmethod
+    async def query_document(cls, collection_name, document_query, projection=None, sort_criteria=None, skip=0, limit=0, id_list=None): # CAMBIO
+        """
+        Realizar query según los parámetros.
+
+        Los documentos se devuelven tal y como llegan de MongoDB ('_id' como ObjectId y
+        fechas como datetime); FastJSONResponse los serializa sin convertirlos uno a uno.
+        """
         collection = cls.get_collection(collection_name)
         try:
             if id_list:
                 document_query['_id'] = {"$in": id_list}
 
-            logger.warning(f"Query para la colección '{collection_name}': {document_query}")
+            query_logger.info("Query para la colección '%s': %s", collection_name, document_query)
 
             documents = collection.find(document_query, projection)
 
             if sort_criteria:
                 documents = documents.sort(sort_criteria)
-            if limit > 0:
-                documents.limit(limit)
             if skip > 0:
                 documents.skip(skip)
+            if limit > 0:
+                documents.limit(limit)
 
             if documents is None:
                 logger.warning(f"Documento con {document_query} no encontrado.")
                 return []
 
-            if hasDate:
+            return await documents.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Error al realizar la consulta: {e}")
+            raise
 
-            # Convertir documentos a lista y manejar correctamente el campo 'timestamp'
-                return [
-                    {
-                        **d,
-                        '_id': d['_id'].binary.hex(),
-                        'timestamp': d['timestamp'].isoformat() if isinstance(d.get('timestamp'), datetime) else d.get('timestamp')
-                    }
-                    for d in documents
-                ]
-    
-            else:
-                return [{**d, '_id': d['_id'].binary.hex()} for d in documents]
+    @classmethod
+    async def query_document_keyset(cls, collection_name, document_query, projection=None, sort_criteria=None, limit=10, after=None):
+        """
+        Realizar una query paginada por clave (keyset) en lugar de por desplazamiento.
+
+        Los resultados se ordenan por sort_criteria y, como desempate, por '_id'. Si se
+        indica 'after' (los valores de ordenación del último documento de la página
+        anterior, terminando en su '_id'), solo se devuelven los documentos posteriores,
+        de modo que cualquier página cuesta lo mismo que la primera.
+
+        Returns:
+            Una tupla (documentos, clave del último documento o None si no hay más páginas).
+        """
+        collection = cls.get_collection(collection_name)
+        document_query, projection, sort_criteria = cls._keyset_params(document_query, projection, sort_criteria, after)
+        try:
+            query_logger.info("Query keyset para la colección '%s': %s", collection_name, document_query)
+
+            documents = await collection.find(document_query, projection).sort(sort_criteria).limit(limit).to_list(length=None)
+
+            return documents, cls._last_key(documents, sort_criteria, limit)
         except Exception as e:
             logger.error(f"Error al realizar la consulta: {e}")
             raise
 
+    @classmethod
+    def _keyset_params(cls, document_query, projection, sort_criteria, after):
+        """Añadir a una query de keyset el desempate por '_id', el filtro de 'after' y los campos de la clave."""
+        sort_criteria = [(field, direction) for field, direction in (sort_criteria or []) if field != "_id"]
+        sort_criteria.append(("_id", 1))
+        if after is not None:
+            keyset_query = cls._build_keyset_query(sort_criteria, after)
+            document_query = {"$and": [document_query, keyset_query]} if document_query else keyset_query
+        if projection and all(projection.values()):
+            # La clave de la página necesita los campos de ordenación
+            projection = {**projection, **{field: 1 for field, _ in sort_criteria}}
+        return document_query, projection, sort_criteria
+
+    @classmethod
+    def _last_key(cls, documents, sort_criteria, limit):
+        """Clave del último documento de una página completa, o None si no hay más páginas."""
+        if limit > 0 and len(documents) == limit:
+            return [documents[-1].get(field) for field, _ in sort_criteria]
+        return None
+
+    @classmethod
+    async def query_page(cls, collection_name, document_query, projection=None, sort_criteria=None, offset=0, limit=10, after=None, count=True, keyset=None):
+        """
+        Obtener una página de resultados y, si count es True, el total de la query.
+
+        Con offset 0 la página se obtiene por keyset (ver query_document_keyset) y, si no,
+        por desplazamiento; keyset=False fuerza el desplazamiento (p. ej. al ordenar por
+        relevancia, que no sirve como clave de página). El total se calcula según la query:
+          - sin filtros, con estimated_document_count (metadatos de la colección, sin recorrerla);
+          - con filtros, con count_documents a la vez que la página (en paralelo, no en un $facet,
+            cuyas etapas no pueden usar índices para ordenar), salvo que el total de la misma
+            query esté en la caché de totales (COUNT_CACHE_TTL segundos).
+
+        Returns:
+            Una tupla (documentos, clave del último documento o None, total o None si count es False).
+        """
+        if keyset is None:
+            keyset = offset == 0
+
+        async def fetch_page():
+            if keyset:
+                return await cls.query_document_keyset(collection_name, document_query, projection, sort_criteria, limit, after)
+            return await cls.query_document(collection_name, dict(document_query), projection, sort_criteria, offset, limit), None
+
+        if not count:
+            documents, last_key = await fetch_page()
+            return documents, last_key, None
+
+        collection = cls.get_collection(collection_name)
+        if not document_query:
+            (documents, last_key), total = await asyncio.gather(fetch_page(), collection.estimated_document_count())
+            return documents, last_key, total
+
+        count_key = (collection_name, json_util.dumps(document_query))
+        total = cls._count_cache.get(count_key)
+        if total is not None:
+            documents, last_key = await fetch_page()
+            return documents, last_key, total
+
+        query_logger.info("Query de total para la colección '%s': %s", collection_name, document_query)
+        (documents, last_key), total = await asyncio.gather(fetch_page(), collection.count_documents(document_query))
+        cls._count_cache.set(count_key, total)
+        return documents, last_key, total
+
+    @classmethod
+    def _build_keyset_query(cls, sort_criteria, after):
+        """
+        Construir el filtro de los documentos que van detrás de la clave 'after' en el orden dado.
+
+        MongoDB ordena los nulos y los campos ausentes antes que cualquier otro valor, pero las
+        comparaciones $gt y $lt nunca los incluyen ni los superan: detrás de un nulo en orden
+        ascendente van los no nulos y en descendente ninguno (solo desempatan los campos
+        siguientes), y detrás de un valor en orden descendente van también los nulos.
+        """
+        conditions = []
+        for i, (field, direction) in enumerate(sort_criteria):
+            if after[i] is None and direction != 1:
+                continue
+            condition = {prev_field: after[j] for j, (prev_field, _) in enumerate(sort_criteria[:i])}
+            if after[i] is None:
+                condition[field] = {"$ne": None}
+            elif direction == 1:
+                condition[field] = {"$gt": after[i]}
+            else:
+                condition["$or"] = [{field: {"$lt": after[i]}}, {field: None}]
+            conditions.append(condition)
+        return conditions[0] if len(conditions) == 1 else {"$or": conditions}
+
+    @classmethod
+    async def stream_documents(cls, collection_name, document_query=None, projection=None, sort_criteria=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Recorrer los documentos de una query con un cursor del servidor.
+
+        Los documentos se piden a MongoDB de batch_size en batch_size y se entregan uno a
+        uno, de modo que la memoria usada no depende del tamaño de la colección.
+        """
+        collection = cls.get_collection(collection_name)
+        cursor = collection.find(document_query or {}, projection, batch_size=batch_size)
+        if sort_criteria:
+            cursor = cursor.sort(sort_criteria)
+        try:
+            async for d in cursor:
+                yield d
+        except Exception as e:
+            logger.error(f"Error al recorrer la colección '{collection_name}': {e}")
+            raise
+        finally:
+            await cursor.close()
+
+    @classmethod
+    async def aggregate(cls, collection_name, pipeline):
+        """Ejecutar un pipeline de agregación y devolver los resultados como lista."""
+        collection = cls.get_collection(collection_name)
+        try:
+            cursor = await collection.aggregate(pipeline)
+            return await cursor.to_list(length=None)
+        except errors.PyMongoError as e:
+            logger.error(f"Error al ejecutar la agregación: {e}")
+            raise
 
     @classmethod
-    def update_document_id(cls, collection_name, document_id, updated_fields, hasDate = False):
+    async def update_document_id(cls, collection_name, document_id, updated_fields, hasDate = False):
         """Actualizar un documento existente a partir de su ID y devolver el documento actualizado."""
         collection = cls.get_collection(collection_name)
         try:
-            updated_document = collection.find_one_and_update(
+            updated_document = await collection.find_one_and_update(
                 {"_id": ObjectId(document_id)},
                 {"$set": updated_fields},
                 return_document=True 
             )
+            cls.invalidate_document(collection_name, document_id)
             
             if updated_document is None:
                 logger.warning(f"No se encontró el documento con ID {document_id} para actualizar.")
@@ -224,7 +489,7 @@ class DatabaseConnection:
                 updated_document["_id"] = updated_document['_id'].binary.hex()
                 if hasDate:
                     updated_document['timestamp'] = updated_document['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-                logger.info(f"Documento con ID {document_id} actualizado.")
+                logger.info("Documento con ID %s actualizado.", document_id)
 
             return updated_document
 
@@ -233,25 +498,118 @@ class DatabaseConnection:
             raise
 
     @classmethod
-    def delete_document_id(cls, collection_name, document_id):
+    async def update_document_id_pipeline(cls, collection_name, document_id, pipeline, projection=None, return_updated=True):
+        """
+        Aplicar de forma atómica un pipeline de actualización a un documento y devolver el documento
+        actualizado (o el anterior a la actualización con return_updated=False).
+        """
+        collection = cls.get_collection(collection_name)
+        try:
+            updated_document = await collection.find_one_and_update(
+                {"_id": ObjectId(document_id)},
+                pipeline,
+                projection=projection,
+                return_document=return_updated
+            )
+            cls.invalidate_document(collection_name, document_id)
+
+            if updated_document is None:
+                logger.warning(f"No se encontró el documento con ID {document_id} para actualizar.")
+            else:
+                updated_document["_id"] = updated_document['_id'].binary.hex()
+                logger.info("Documento con ID %s actualizado.", document_id)
+
+            return updated_document
+
+        except errors.PyMongoError as e:
+            logger.error(f"Error al actualizar el documento: {e}")
+            raise
+
+    @classmethod
+    async def delete_document_id(cls, collection_name, document_id):
         """Eliminar un documento por su ID."""
         collection = cls.get_collection(collection_name)
         try:
-            result = collection.delete_one({"_id": ObjectId(document_id)})
+            result = await collection.delete_one({"_id": ObjectId(document_id)})
+            cls.invalidate_document(collection_name, document_id)
             if result.deleted_count == 0:
                 logger.warning(f"No se encontró el documento con ID {document_id} para eliminar.")
             else:
-                logger.info(f"Documento con ID {document_id} eliminado.")
+                logger.info("Documento con ID %s eliminado.", document_id)
             return result.deleted_count
         except Exception as e:
             logger.error(f"ID de documento no válido: {e}")
             raise
 
     @classmethod
-    def close_connection(cls):
+    async def update_many(cls, collection_name, document_query, update):
+        """Actualizar todos los documentos que cumplan la query y devolver cuántos se han modificado."""
+        collection = cls.get_collection(collection_name)
+        try:
+            result = await collection.update_many(document_query, update)
+            # Puede afectar a cualquier documento: se descarta la caché completa
+            cls._document_cache.clear()
+            logger.info("%d documentos actualizados en la colección '%s'.", result.modified_count, collection_name)
+            return result.modified_count
+        except errors.PyMongoError as e:
+            logger.error(f"Error al actualizar los documentos: {e}")
+            raise
+
+    @classmethod
+    async def bulk_update(cls, collection_name, operations, upsert=False, ordered=False):
+        """
+        Aplicar varias actualizaciones (filtro, update) con un solo bulk_write.
+
+        No invalida la caché de documentos: está pensado para colecciones que no se leen por ID,
+        como los contadores agregados. Devuelve cuántos documentos se han modificado o creado.
+        """
+        if not operations:
+            return 0
+        collection = cls.get_collection(collection_name)
+        try:
+            result = await collection.bulk_write(
+                [UpdateOne(document_query, update, upsert=upsert) for document_query, update in operations],
+                ordered=ordered
+            )
+            return result.modified_count + result.upserted_count
+        except errors.PyMongoError as e:
+            logger.error(f"Error al actualizar los documentos: {e}")
+            raise
+
+    @classmethod
+    async def create_index(cls, collection_name, keys, **kwargs):
+        """Crear un índice en la colección si no existe todavía y devolver su nombre."""
+        collection = cls.get_collection(collection_name)
+        try:
+            name = await collection.create_index(keys, **kwargs)
+            logger.info(f"Índice '{name}' disponible en la colección '{collection_name}'.")
+            return name
+        except errors.PyMongoError as e:
+            logger.error(f"Error al crear el índice: {e}")
+            raise
+
+    @classmethod
+    async def list_indexes(cls, collection_name):
+        """Devolver la descripción de los índices de una colección (lista vacía si no existe)."""
+        collection = cls.get_collection(collection_name)
+        try:
+            cursor = await collection.list_indexes()
+            return await cursor.to_list(length=None)
+        except errors.PyMongoError as e:
+            logger.error(f"Error al listar los índices: {e}")
+            raise
+
+    @classmethod
+    async def explain(cls, command: dict, verbosity: str = "executionStats") -> dict:
+        """Ejecutar explain de un comando (find, aggregate, update...) sin aplicar sus escrituras."""
+        cls.connect()
+        return await cls._db.command({"explain": command, "verbosity": verbosity})
+
+    @classmethod
+    async def close_connection(cls):
         """Cerrar la conexión a la base de datos."""
         if cls._client is not None:
-            cls._client.close()
+            await cls._client.close()
             cls._client = None
             cls._db = None
             logger.info("Conexión a la base de datos cerrada.")
@@ -268,4 +626,4 @@ class DatabaseConnection:
 
 if __name__ == '__main__':
     DatabaseConnection.connect()
-    DatabaseConnection.close_connection()
\ No newline at end of file
+    asyncio.run(DatabaseConnection.close_connection())
\ No newline at end of file
@@ -0,0 +1,219 @@
+import math
+from typing import Optional, Tuple
+from fastapi import HTTPException
+
+# Radio medio de la Tierra en metros, usado para convertir distancias a radianes
+EARTH_RADIUS_METERS = 6378100
+# Anchura máxima (en grados de longitud) de cada rectángulo enviado a MongoDB
+MAX_BOX_WIDTH = 90
+# Anchura máxima (en grados) para la que grid_query añade el filtro indexable $geoWithin
+GRID_INDEX_MAX_WIDTH = 10
+# Margen en latitud que cubre la curvatura de los lados geodésicos en esos rectángulos
+GRID_INDEX_LAT_MARGIN = 1
+# Latitud máxima de la proyección Web Mercator (borde de las teselas de las filas extremas)
+MAX_MERCATOR_LAT = 85.0511287798066
+
+class GeoUtils:
+
+    @classmethod
+    def is_valid_coordinate(cls, lat, lon) -> bool:
+        """Devuelve True si la latitud y la longitud son números dentro de rango."""
+        if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)):
+            return False
+        return -90 <= lat <= 90 and -180 <= lon <= 180
+
+    @classmethod
+    def point(cls, lat, lon) -> Optional[dict]:
+        """Construir un punto GeoJSON a partir de latitud y longitud (None si no son válidas)."""
+        if not cls.is_valid_coordinate(lat, lon):
+            return None
+        # GeoJSON usa el orden [longitud, latitud]
+        return {"type": "Point", "coordinates": [lon, lat]}
+
+    @classmethod
+    def point_expression(cls, lat_field: str = "$lat", lon_field: str = "$lon") -> dict:
+        """
+        Expresión de agregación equivalente a point() sobre los campos del documento, para
+        calcular el punto en el servidor dentro de una actualización con pipeline.
+        """
+        valid = {"$and": [
+            {"$isNumber": lat_field}, {"$isNumber": lon_field},
+            {"$gte": [lat_field, -90]}, {"$lte": [lat_field, 90]},
+            {"$gte": [lon_field, -180]}, {"$lte": [lon_field, 180]}
+        ]}
+        return {"$cond": [valid, {"type": "Point", "coordinates": [lon_field, lat_field]}, None]}
+
+    @classmethod
+    def parse_floats(cls, value: str, count: int, name: str) -> list:
+        """Convertir una cadena separada por comas en una lista de floats de longitud fija."""
+        try:
+            numbers = [float(part) for part in value.split(',')]
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"El parámetro '{name}' debe contener números separados por comas")
+        if len(numbers) != count:
+            raise HTTPException(status_code=400, detail=f"El parámetro '{name}' debe contener {count} valores")
+        return numbers
+
+    @classmethod
+    def parse_bbox(cls, bbox: str) -> Tuple[float, float, float, float]:
+        """Convertir 'minLon,minLat,maxLon,maxLat' en una tupla validada."""
+        min_lon, min_lat, max_lon, max_lat = cls.parse_floats(bbox, 4, "bbox")
+        if not (cls.is_valid_coordinate(min_lat, min_lon) and cls.is_valid_coordinate(max_lat, max_lon)):
+            raise HTTPException(status_code=400, detail="Las coordenadas de 'bbox' están fuera de rango")
+        if min_lat > max_lat:
+            raise HTTPException(status_code=400, detail="En 'bbox' la latitud mínima no puede ser mayor que la máxima")
+        return min_lon, min_lat, max_lon, max_lat
+
+    @classmethod
+    def parse_near(cls, near: str) -> Tuple[float, float]:
+        """Convertir 'lat,lon' en una tupla validada."""
+        lat, lon = cls.parse_floats(near, 2, "near")
+        if not cls.is_valid_coordinate(lat, lon):
+            raise HTTPException(status_code=400, detail="Las coordenadas de 'near' están fuera de rango")
+        return lat, lon
+
+    @classmethod
+    def box_polygon(cls, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> dict:
+        """Construir un polígono GeoJSON rectangular."""
+        return {
+            "type": "Polygon",
+            "coordinates": [[
+                [min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat],
+                [min_lon, max_lat], [min_lon, min_lat]
+            ]]
+        }
+
+    @classmethod
+    def split_longitudes(cls, min_lon: float, max_lon: float) -> list:
+        """Dividir un rango de longitudes en tramos de como mucho MAX_BOX_WIDTH grados.
+
+        Si el rango cruza el antimeridiano (min_lon > max_lon) se parte en dos. Los tramos
+        anchos se trocean porque los lados de un polígono GeoJSON son geodésicas y un
+        polígono de 180 grados o más resulta ambiguo para MongoDB.
+        """
+        ranges = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180), (-180, max_lon)]
+        segments = []
+        for start, end in ranges:
+            while end - start > MAX_BOX_WIDTH:
+                segments.append((start, start + MAX_BOX_WIDTH))
+                start += MAX_BOX_WIDTH
+            segments.append((start, end))
+        return segments
+
+    @classmethod
+    def bbox_query(cls, bbox: Tuple[float, float, float, float]) -> dict:
+        """
+        Construir el filtro de los marcadores dentro del rectángulo pedido. Es el de grid_query:
+        un $geoWithin solo no basta, porque sus lados son geodésicas que se curvan hacia el polo
+        y dejan fuera puntos cercanos al borde más próximo al ecuador en rectángulos anchos.
+        """
+        return cls.grid_query(bbox)
+
+    @classmethod
+    def polygon_query(cls, bbox: Tuple[float, float, float, float], field: str = "location") -> dict:
+        """Construir un filtro $geoWithin (indexable con 2dsphere) con el polígono de un rectángulo."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        conditions = [
+            {field: {"$geoWithin": {"$geometry": cls.box_polygon(start, min_lat, end, max_lat)}}}
+            for start, end in cls.split_longitudes(min_lon, max_lon)
+        ]
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$or": conditions}
+
+    @classmethod
+    def near_query(cls, lat: float, lon: float, radius: float, field: str = "location") -> dict:
+        """Construir un filtro por radio (en metros) compatible con count_documents."""
+        return {field: {"$geoWithin": {"$centerSphere": [[lon, lat], radius / EARTH_RADIUS_METERS]}}}
+
+    @classmethod
+    def cell_size(cls, zoom: int, cells_per_tile: int) -> float:
+        """Tamaño en grados de una celda de la rejilla de agrupación para un nivel de zoom."""
+        return 360 / (2 ** zoom * cells_per_tile)
+
+    @classmethod
+    def cell_of(cls, lat: float, lon: float, size: float) -> Tuple[int, int]:
+        """Devolver la celda (x, y) de la rejilla que contiene un punto."""
+        x = min(int((lon + 180) // size), math.ceil(360 / size) - 1)
+        y = min(int((lat + 90) // size), math.ceil(180 / size) - 1)
+        return x, y
+
+    @classmethod
+    def cells_in_bbox(cls, bbox: Tuple[float, float, float, float], size: float) -> list:
+        """Listar las celdas (x, y) de la rejilla que intersectan un rectángulo."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        ranges = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180), (-180, max_lon)]
+        _, min_y = cls.cell_of(min_lat, 0, size)
+        _, max_y = cls.cell_of(max_lat, 0, size)
+
+        cells = []
+        for start, end in ranges:
+            min_x, _ = cls.cell_of(0, start, size)
+            max_x, _ = cls.cell_of(0, end, size)
+            cells.extend((x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1))
+        return cells
+
+    @classmethod
+    def align_bbox(cls, bbox: Tuple[float, float, float, float], size: float) -> Tuple[float, float, float, float]:
+        """Ampliar un rectángulo hasta los bordes de las celdas de la rejilla que toca."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        min_x, min_y = cls.cell_of(min_lat, min_lon, size)
+        max_x, max_y = cls.cell_of(max_lat, max_lon, size)
+        return (
+            max(-180, min_x * size - 180), max(-90, min_y * size - 90),
+            min(180, (max_x + 1) * size - 180), min(90, (max_y + 1) * size - 90)
+        )
+
+    @classmethod
+    def grid_query(cls, bbox: Tuple[float, float, float, float]) -> dict:
+        """
+        Construir un filtro exacto por rangos de 'lat' y 'lon', coherente con la rejilla.
+
+        En rectángulos estrechos se añade además un $geoWithin con margen para que MongoDB
+        pueda usar el índice 2dsphere; en rectángulos anchos los lados geodésicos del polígono
+        se separan demasiado de los paralelos y solo se usan los rangos.
+        """
+        min_lon, min_lat, max_lon, max_lat = bbox
+        query = {"lat": {"$gte": min_lat, "$lte": max_lat}}
+        if min_lon <= max_lon:
+            query["lon"] = {"$gte": min_lon, "$lte": max_lon}
+        else:
+            query["$or"] = [{"lon": {"$gte": min_lon}}, {"lon": {"$lte": max_lon}}]
+
+        width = max_lon - min_lon if min_lon <= max_lon else max_lon - min_lon + 360
+        if width > GRID_INDEX_MAX_WIDTH:
+            return query
+
+        padded = (
+            min_lon, max(-90, min_lat - GRID_INDEX_LAT_MARGIN),
+            max_lon, min(90, max_lat + GRID_INDEX_LAT_MARGIN)
+        )
+        return {"$and": [cls.polygon_query(padded), query]}
+
+    @classmethod
+    def tiles_of(cls, lat: float, lon: float, z: int) -> list:
+        """
+        Teselas Web Mercator z/x/y cuyo rectángulo contiene el punto. Un punto sobre el borde
+        de dos teselas está en ambas, porque grid_query incluye los bordes.
+        """
+        n = 2 ** z
+        fx = (lon + 180) / 360 * n
+        lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+        fy = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+        columns = {min(n - 1, math.floor(fx))}
+        if fx == math.floor(fx) and fx > 0:
+            columns.add(int(fx) - 1)
+        rows = {min(n - 1, max(0, math.floor(fy)))}
+        if fy == math.floor(fy) and 0 < fy <= n:
+            rows.add(int(fy) - 1)
+        return [(z, x, y) for x in columns for y in rows]
+
+    @classmethod
+    def tile_bbox(cls, z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+        """Calcular el rectángulo (minLon, minLat, maxLon, maxLat) de una tesela Web Mercator z/x/y."""
+        n = 2 ** z
+        min_lon = x / n * 360 - 180
+        max_lon = (x + 1) / n * 360 - 180
+        max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+        min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+        return min_lon, min_lat, max_lon, max_lat
@@ -0,0 +1,104 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Optional
+
+from PIL import Image as PILImage, ImageOps, UnidentifiedImageError
+
+# Derivadas que se generan al subir una imagen: lado mayor máximo en píxeles (None = tamaño
+# original), formato y calidad de compresión
+IMAGE_VARIANTS = {
+    "thumb": {"max_size": 200, "format": "WEBP", "quality": 75},
+    "medium": {"max_size": 800, "format": "WEBP", "quality": 80},
+    "webp": {"max_size": None, "format": "WEBP", "quality": 85}
+}
+# Procesos dedicados a generar derivadas (por defecto, uno por CPU)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", os.cpu_count() or 1))
+# Los procesos no se crean con fork: el servidor tiene hilos (monitores de pymongo, escritura de
+# logs) y un hijo copiado mientras uno de ellos tiene un lock tomado puede quedarse bloqueado
+IMAGE_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg", "PNG": ".png"}
+CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+def render_variants(data: bytes, variants: dict) -> dict:
+    """
+    Generar las derivadas de una imagen. Se ejecuta en un proceso del pool: recibe y devuelve
+    solo bytes y diccionarios para que el paso entre procesos sea barato.
+
+    Devuelve {nombre: {"data", "width", "height", "format"}}; lanza ValueError si los bytes no
+    son una imagen que Pillow sepa leer.
+    """
+    try:
+        original = PILImage.open(io.BytesIO(data))
+        original.load()
+    except PILImage.DecompressionBombError:
+        raise ValueError("La imagen es demasiado grande")
+    except (UnidentifiedImageError, OSError):
+        raise ValueError("El fichero no es una imagen válida")
+
+    # Aplicar la orientación EXIF antes de redimensionar (las derivadas no conservan los metadatos)
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "A" in original.getbands() or "transparency" in original.info else "RGB")
+
+    results = {}
+    for name, config in variants.items():
+        image = original
+        max_size = config.get("max_size")
+        if max_size and max(image.size) > max_size:
+            image = image.copy()
+            image.thumbnail((max_size, max_size), PILImage.LANCZOS)
+
+        image_format = config["format"]
+        if image_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=config.get("quality", 80), optimize=True)
+        results[name] = {"data": buffer.getvalue(), "width": image.width, "height": image.height,
+                         "format": image_format.lower()}
+    return results
+
+class ImageUtils:
+    """
+    Generación de derivadas de imágenes (miniaturas, WebP) fuera del bucle de eventos.
+
+    Decodificar y recomprimir imágenes es trabajo de CPU: se hace en un ProcessPoolExecutor de
+    IMAGE_WORKERS procesos para no bloquear el bucle ni competir por el GIL con las peticiones.
+    """
+    _executor = None
+
+    @classmethod
+    def get_executor(cls) -> ProcessPoolExecutor:
+        if cls._executor is None:
+            cls._executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS,
+                                                mp_context=multiprocessing.get_context(IMAGE_START_METHOD))
+        return cls._executor
+
+    @classmethod
+    async def render(cls, data: bytes, variants: Optional[dict] = None) -> dict:
+        """Generar las derivadas configuradas (o las indicadas) de una imagen en el pool de procesos."""
+        return await asyncio.get_running_loop().run_in_executor(
+            cls.get_executor(), partial(render_variants, data, variants or IMAGE_VARIANTS)
+        )
+
+    @classmethod
+    def filename(cls, filename: Optional[str], variant: str, image_format: str) -> str:
+        """Nombre del fichero de una derivada: 'foto.png' -> 'foto_thumb.webp'."""
+        stem = os.path.splitext(os.path.basename(filename or "image"))[0]
+        return f"{stem}_{variant}{EXTENSIONS.get(image_format.upper(), '')}"
+
+    @classmethod
+    def content_type(cls, image_format: str) -> Optional[str]:
+        return CONTENT_TYPES.get(image_format.upper())
+
+    @classmethod
+    async def shutdown(cls):
+        """Esperar a que terminen las derivadas en curso y cerrar el pool de procesos."""
+        if cls._executor is not None:
+            executor, cls._executor = cls._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, partial(executor.shutdown, wait=True))
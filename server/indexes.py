@@ -0,0 +1,187 @@
+"""
+Registro declarativo de los índices de cada colección.
+
+Al arrancar la aplicación se crean en segundo plano los índices que falten (create_index es
+idempotente); si MongoDB no responde, se registra el error y la aplicación arranca igualmente.
+También se puede comprobar o aplicar desde la línea de comandos:
+
+Uso: python indexes.py            # informe de índices que faltan, sobran o no coinciden
+     python indexes.py --apply    # crear los que faltan y mostrar el informe
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from db_connection import DatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+# Índices de cada colección: (claves, opciones de create_index). Los nombres son los que
+# genera MongoDB a partir de las claves (p. ej. 'creador_1__id_1').
+INDEXES = {
+    "user": [
+        # Unicidad del nombre de usuario; los usuarios sin userName no cuentan
+        ([("userName", 1)], {"unique": True, "partialFilterExpression": {"userName": {"$type": "string"}}}),
+        ([("oauthId", 1), ("oauthProvider", 1)], {}),
+        ([("email", 1)], {})
+    ],
+    "marcador": [
+        ([("location", "2dsphere")], {}),
+        # Filtro por creador con la paginación por '_id'
+        ([("creador", 1), ("_id", 1)], {}),
+        # Rangos de latitud y longitud de las agrupaciones y las teselas
+        ([("lat", 1), ("lon", 1)], {}),
+        # Búsqueda por relevancia (?q=) y por prefijo (autocompletado)
+        ([("lugar", "text")], {"default_language": "spanish"}),
+        ([("lugar_search", 1)], {})
+    ],
+    "visita": [
+        ([("usuarioVisitado", 1), ("_id", 1)], {}),
+        ([("usuarioVisitante", 1), ("_id", 1)], {})
+    ],
+    "visita_rollup": [
+        ([("usuarioVisitado", 1), ("granularity", 1), ("bucket", 1)], {"unique": True})
+    ],
+    "image": [
+        ([("ownerId", 1), ("_id", 1)], {}),
+        # Deduplicación de subidas por contenido; las imágenes anteriores no tienen hash
+        ([("contentHash", 1)], {"unique": True, "partialFilterExpression": {"contentHash": {"$type": "string"}}})
+    ]
+}
+
+# Opciones que deben coincidir para considerar que un índice existente es el declarado
+COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "default_language")
+
+class IndexUtils:
+    # Tarea de ensure_indexes lanzada al arrancar la aplicación
+    _task = None
+    # Índices declarados que se han comprobado o creado con sus opciones: (colección, claves)
+    _confirmed = set()
+
+    @classmethod
+    def index_name(cls, keys: list) -> str:
+        """Nombre por defecto que MongoDB da a un índice con esas claves."""
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+    @classmethod
+    def index_keys(cls, index: dict) -> tuple:
+        """Claves de un índice existente tal y como se declaran (los de texto se describen con sus pesos)."""
+        if "_fts" in index["key"]:
+            return tuple((field, "text") for field in index.get("weights", {}))
+        return tuple(index["key"].items())
+
+    @classmethod
+    def options_match(cls, declared: dict, existing: dict) -> bool:
+        """Comprobar que las opciones relevantes del índice existente son las declaradas."""
+        return all(
+            (declared.get(option) or None) == (existing.get(option) or None)
+            for option in COMPARED_OPTIONS
+        )
+
+    @classmethod
+    async def check_collection(cls, collection_name: str) -> dict:
+        """Comparar los índices declarados de una colección con los existentes."""
+        existing = {
+            cls.index_keys(index): index
+            for index in await DatabaseConnection.list_indexes(collection_name)
+            if index["name"] != "_id_"
+        }
+        declared = {tuple(keys): options for keys, options in INDEXES.get(collection_name, [])}
+
+        report = {"present": [], "missing": [], "conflicts": [], "extra": []}
+        for keys, options in declared.items():
+            index = existing.get(keys)
+            if index is None:
+                report["missing"].append(cls.index_name(keys))
+            elif not cls.options_match(options, index):
+                report["conflicts"].append(index["name"])
+            else:
+                report["present"].append(index["name"])
+                cls._confirmed.add((collection_name, keys))
+        report["extra"] = [index["name"] for keys, index in existing.items() if keys not in declared]
+        return report
+
+    @classmethod
+    async def check_indexes(cls, collections=None) -> dict:
+        """Informe de índices presentes, que faltan, que no coinciden y que sobran, por colección."""
+        return {name: await cls.check_collection(name) for name in (collections or INDEXES)}
+
+    @classmethod
+    def is_confirmed(cls, collection_name: str, keys: list) -> bool:
+        """
+        Indicar si un índice declarado existe con sus opciones según la última comprobación. Hasta
+        entonces (o si no se pudo crear) las rutas no deben contar con él, p. ej. con su unicidad.
+        """
+        return (collection_name, tuple(keys)) in cls._confirmed
+
+    @classmethod
+    def start_background(cls):
+        """Lanzar ensure_indexes sin esperarlo, para que el arranque no dependa de MongoDB."""
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.create_task(cls._ensure_indexes_logged())
+
+    @classmethod
+    async def _ensure_indexes_logged(cls):
+        try:
+            await cls.ensure_indexes()
+        except Exception as e:
+            logger.error(f"No se han podido comprobar los índices al arrancar: {e}")
+
+    @classmethod
+    async def stop_background(cls):
+        """Cancelar la creación de índices si sigue en curso al apagar."""
+        if cls._task is not None and not cls._task.done():
+            cls._task.cancel()
+            try:
+                await cls._task
+            except asyncio.CancelledError:
+                pass
+        cls._task = None
+
+    @classmethod
+    async def ensure_indexes(cls, collections=None) -> dict:
+        """
+        Crear los índices declarados que falten y devolver el informe resultante.
+
+        Un índice que no se puede crear (p. ej. un índice único sobre datos duplicados o un
+        índice existente con otras opciones) se registra como error sin detener el resto.
+        """
+        reports = {}
+        for collection_name in collections or INDEXES:
+            report = await cls.check_collection(collection_name)
+            report["created"], report["errors"] = [], {}
+            for keys, options in INDEXES.get(collection_name, []):
+                name = cls.index_name(keys)
+                if name not in report["missing"]:
+                    continue
+                try:
+                    await DatabaseConnection.create_index(collection_name, keys, **options)
+                    report["created"].append(name)
+                    cls._confirmed.add((collection_name, tuple(keys)))
+                except Exception as e:
+                    logger.error(f"No se ha podido crear el índice '{name}' en '{collection_name}': {e}")
+                    report["errors"][name] = str(e)
+            report["missing"] = [name for name in report["missing"] if name not in report["created"]]
+            for name in report["conflicts"]:
+                logger.warning(f"El índice '{name}' de '{collection_name}' no tiene las opciones declaradas.")
+            reports[collection_name] = report
+        return reports
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="Crear los índices que falten")
+    parser.add_argument("collections", nargs="*", help="Colecciones a revisar (por defecto, todas las del registro)")
+    args = parser.parse_args()
+
+    try:
+        if args.apply:
+            report = await IndexUtils.ensure_indexes(args.collections)
+        else:
+            report = await IndexUtils.check_indexes(args.collections)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    finally:
+        await DatabaseConnection.close_connection()
+
+if __name__ == '__main__':
+    asyncio.run(main())
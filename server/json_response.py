@@ -0,0 +1,25 @@
+from typing import Any
+from fastapi.responses import JSONResponse
+from bson import ObjectId
+import orjson
+
+def bson_default(value):
+    """Serializar los tipos de BSON que orjson no conoce de forma nativa."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"El tipo {type(value).__name__} no es serializable a JSON")
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializar a JSON con orjson.
+
+    Los datetime se escriben en ISO 8601 y los ObjectId como su cadena hexadecimal
+    directamente al serializar, sin copiar ni convertir antes cada documento.
+    """
+    return orjson.dumps(content, default=bson_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(JSONResponse):
+    """Respuesta JSON que serializa con orjson y admite documentos de MongoDB tal cual."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
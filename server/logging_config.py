@@ -0,0 +1,169 @@
+"""
+Configuración de los logs de la aplicación.
+
+Los registros se escriben como JSON (una línea por registro) desde un hilo en segundo plano:
+los loggers solo ponen el registro en una cola (QueueHandler) y un QueueListener lo formatea y
+escribe en la salida de errores, fuera del camino de las peticiones.
+
+Variables de entorno:
+- LOG_LEVEL: nivel general (por defecto INFO).
+- LOG_LEVELS: niveles por logger, p. ej. 'db_connection=WARNING,slow_queries=INFO'.
+- LOG_FORMAT: 'json' (por defecto) o 'text' para leer los logs en local.
+- LOG_QUERY_SAMPLE_RATE y LOG_QUERY_MAX_PER_SECOND: muestreo y límite de los registros de cada
+  consulta (logger 'db_connection.queries', ver SampledLogger); los descartados se cuentan en
+  el siguiente que se escribe.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+import orjson
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Fracción de las consultas que se registran y máximo de registros de consultas por segundo
+LOG_QUERY_SAMPLE_RATE = float(os.getenv("LOG_QUERY_SAMPLE_RATE", 0.01))
+LOG_QUERY_MAX_PER_SECOND = float(os.getenv("LOG_QUERY_MAX_PER_SECOND", 5))
+QUERY_LOGGER = "db_connection.queries"
+
+# Atributos propios de LogRecord: el resto son los campos añadidos con 'extra'
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+    """Formatear cada registro como un objeto JSON con la fecha, el nivel, el logger, el mensaje y los campos extra."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+class RateLimiter:
+    """
+    Dejar pasar una fracción 'sample_rate' de los eventos y, de esos, como mucho
+    'max_per_second' por segundo (cubo de fichas). Cuenta los descartados desde el último que pasó.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, max_per_second: float = 0):
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        self.tokens = max(max_per_second, 1)
+        self.updated = time.monotonic()
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.dropped += 1
+            return False
+        with self._lock:
+            if self.max_per_second > 0:
+                now = time.monotonic()
+                self.tokens = min(max(self.max_per_second, 1), self.tokens + (now - self.updated) * self.max_per_second)
+                self.updated = now
+                if self.tokens < 1:
+                    self.dropped += 1
+                    return False
+                self.tokens -= 1
+            return True
+
+    def take_dropped(self) -> int:
+        """Devolver los eventos descartados desde la última llamada y reiniciar la cuenta."""
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+class SampledLogger:
+    """
+    Logger para eventos muy frecuentes (p. ej. cada consulta). El muestreo se decide antes de
+    crear el LogRecord, así que un evento descartado cuesta una comparación y no un registro.
+    Los registros que pasan llevan en el campo 'dropped' los descartados desde el anterior.
+    """
+
+    def __init__(self, name: str, sample_rate: float, max_per_second: float):
+        self.logger = logging.getLogger(name)
+        self.limiter = RateLimiter(sample_rate, max_per_second)
+
+    def log(self, level: int, msg: str, *args):
+        if self.logger.isEnabledFor(level) and self.limiter.allow():
+            self.logger.log(level, msg, *args, extra={"dropped": self.limiter.take_dropped()})
+
+    def debug(self, msg: str, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args):
+        self.log(logging.INFO, msg, *args)
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que en el hilo que registra solo resuelve el mensaje (y la traza de una
+    excepción). El formato JSON y la escritura los hace el hilo del QueueListener.
+    """
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener = None
+
+def query_logger() -> SampledLogger:
+    """Logger muestreado de las consultas de DatabaseConnection."""
+    return SampledLogger(QUERY_LOGGER, LOG_QUERY_SAMPLE_RATE, LOG_QUERY_MAX_PER_SECOND)
+
+def parse_levels(levels: str) -> dict:
+    """Leer 'logger=NIVEL,otro=NIVEL' como {logger: nivel}."""
+    result = {}
+    for item in filter(None, (part.strip() for part in levels.split(","))):
+        name, _, level = item.partition("=")
+        result[name.strip()] = level.strip().upper()
+    return result
+
+def setup_logging():
+    """Configurar el logger raíz con la cola y el hilo de escritura (solo la primera vez)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json"
+                        else logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    # Escribir los registros pendientes al terminar el proceso
+    atexit.register(stop_logging)
+
+    # Datos del proceso que los registros no usan y que cuesta obtener en cada uno
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.handlers = [BackgroundQueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+
+    for name, level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+def stop_logging():
+    """Parar el hilo de escritura después de vaciar la cola."""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
@@ -1,32 +1,73 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List
 from fastapi import APIRouter, HTTPException, Query, Request, Path
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
 
 from bson.objectid import ObjectId
 from models.marcador_model import Marcador, MarcadorCreate, MarcadorUpdate, MarcadorDeleteResponse
-from db_connection import DatabaseConnection
+from models.batch_model import BatchIds
+from db_connection import DatabaseConnection, DEFAULT_BATCH_SIZE
 from api_utils import APIUtils
+from json_response import FastJSONResponse
+from geo_utils import GeoUtils
+from bulk_utils import BulkUtils
+from stream_utils import StreamUtils
+from search_utils import SearchUtils
+from cache import TTLCache, VersionTable
 
 router = APIRouter()
 
 endpoint_name = "marcadores"
 version = "v1"
 
+# Rejilla de agrupación: celdas por tesela (en cada eje) y límites de la petición
+CLUSTER_CELLS_PER_TILE = 4
+MAX_CLUSTER_ZOOM = 22
+MAX_CLUSTER_CELLS = 4096
+
+# Teselas: zoom máximo, número máximo de marcadores por tesela y política de caché HTTP
+MAX_TILE_ZOOM = 22
+MAX_TILE_FEATURES = 5000
+TILE_CACHE_CONTROL = "public, max-age=60, must-revalidate"
+
+# Sugerencias máximas de la búsqueda por prefijo
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+# Agrupaciones cacheadas por (zoom, x, y); las celdas vacías se guardan como None
+cluster_cache = TTLCache(maxsize=100000, ttl=300)
+# Versión de cada celda (zoom, x, y): una agrupación calculada antes de invalidar su celda no se guarda
+cluster_versions = VersionTable()
+# Versión de cada tesela (z, x, y), que cambia al crear, mover o borrar uno de sus marcadores
+tile_versions = VersionTable()
+_MISSING = object()
+
 @router.get("/" + endpoint_name, tags=["Marcadores CRUD endpoints"], response_model=List[Marcador])
 async def get_marcadores(
     request: Request,
+    ids: str | None = Query(None, description="IDs de los marcadores a devolver, separados por comas"),
     creador: str = Query(None, description="Email del creador"),
-    lugar: str = Query(None, description="Lugar asociado al marcador"),
+    lugar: str = Query(None, description="Texto contenido en el lugar del marcador"),
+    q: str | None = Query(None, description="Búsqueda de texto en el lugar, ordenada por relevancia"),
+    bbox: str | None = Query(None, description="Rectángulo visible 'minLon,minLat,maxLon,maxLat'"),
+    near: str | None = Query(None, description="Punto central 'lat,lon' para buscar por radio"),
+    radius: float = Query(default=1000, gt=0, description="Radio en metros para 'near', por defecto 1000"),
     fields: str | None = Query(None, description="Campos específicos a devolver"),
     sort: str | None = Query(None, description="Campos por los que ordenar, separados por comas"),
     offset: int = Query(default=0, description="Índice de inicio para los resultados de la paginación"),
-    limit: int = Query(default=10, description="Cantidad de marcadores a devolver, por defecto 10")
+    cursor: str | None = Query(None, description="Cursor opaco de la página siguiente (cabecera X-Next-Cursor)"),
+    limit: int = Query(default=10, description="Cantidad de marcadores a devolver, por defecto 10"),
+    count: bool = Query(default=True, description="Calcular el total (X-Total-Count); con count=false no se cuenta")
 ):
     """Obtener todos los marcadores con filtros opcionales."""
 
     APIUtils.check_accept_json(request)
+    after = APIUtils.check_cursor(cursor, sort, offset)
+    id_list = APIUtils.parse_ids(ids)
+    if bbox and near:
+        raise HTTPException(status_code=400, detail="Usa 'bbox' o 'near', pero no ambos a la vez")
+    if q and (sort or cursor):
+        raise HTTPException(status_code=400, detail="Con 'q' los resultados se ordenan por relevancia: usa 'offset' en lugar de 'sort' o 'cursor'")
+    geo_query = build_geo_query(bbox, near, radius)
 
     try:
         # Construir proyección, criterio de orden y paginación
@@ -39,21 +80,170 @@ async def get_marcadores(
             query["creador"] = creador
         if lugar:
             APIUtils.add_regex(query, "lugar", lugar)
+        query.update(geo_query)
+        if q:
+            # Índice de texto sobre 'lugar': sin distinguir mayúsculas ni tildes y con lematización
+            query["$text"] = {"$search": q}
+            sort_criteria = [("score", {"$meta": "textScore"})]
+
+        if id_list:
+            marcadores, missing = await DatabaseConnection.read_documents_ids("marcador", id_list, projection, query)
+            return APIUtils.conditional_response(request, marcadores, APIUtils.batch_headers(marcadores, missing))
+
+        marcadores, last_key, total_count = await DatabaseConnection.query_page(
+            "marcador", query, projection, sort_criteria, offset, limit, after, count, keyset=False if q else None
+        )
 
-        marcadores = DatabaseConnection.query_document(
-            "marcador", query, projection, sort_criteria, offset, limit
+        return APIUtils.conditional_response(
+            request,
+            marcadores,
+            headers={"Accept-Encoding": "gzip", **APIUtils.total_count_headers(total_count),
+                     **APIUtils.next_page_headers(request, sort_criteria, last_key)}
         )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar los marcadores: {str(e)}")
 
-        total_count = DatabaseConnection.count_documents("marcador", query)
+@router.post("/" + endpoint_name + "/batch", tags=["Marcadores CRUD endpoints"], response_model=List[Marcador])
+async def get_marcadores_batch(
+    request: Request,
+    batch: BatchIds,
+    fields: str | None = Query(None, description="Campos específicos a devolver")
+):
+    """Obtener varios marcadores por sus IDs en una sola consulta, en el orden pedido."""
 
-        return JSONResponse(
-            status_code=200,
-            content=marcadores,
-            headers={"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)}
+    APIUtils.check_content_type_json(request)
+    id_list = APIUtils.parse_ids(batch.ids) or []
+
+    try:
+        marcadores, missing = await DatabaseConnection.read_documents_ids(
+            "marcador", id_list, APIUtils.build_projection(fields)
+        )
+
+        return FastJSONResponse(status_code=200, content=marcadores,
+                            headers=APIUtils.batch_headers(marcadores, missing))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener los marcadores: {str(e)}")
+
+@router.get("/" + endpoint_name + "/export", tags=["Marcadores export endpoints"])
+async def export_marcadores(
+    format: str = Query(default="ndjson", description="Formato de la exportación: 'ndjson' o 'json' (array)"),
+    fields: str | None = Query(None, description="Campos específicos a devolver"),
+    batch_size: int = Query(default=DEFAULT_BATCH_SIZE, ge=1, le=10000, description="Documentos por lote leídos de MongoDB")
+):
+    """Exportar todos los marcadores en streaming."""
+    StreamUtils.check_format(format)
+    try:
+        marcadores = DatabaseConnection.stream_documents(
+            "marcador", projection=APIUtils.build_projection(fields), batch_size=batch_size
         )
+        return StreamUtils.response(marcadores, format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al exportar los marcadores: {str(e)}")
+
+@router.get("/" + endpoint_name + "/autocomplete", tags=["Marcadores search endpoints"], response_model=List[Marcador])
+async def autocomplete_marcadores(
+    request: Request,
+    prefix: str = Query(min_length=1, max_length=100, description="Comienzo de alguna palabra del lugar"),
+    limit: int = Query(default=10, ge=1, le=MAX_AUTOCOMPLETE_LIMIT, description="Cantidad de sugerencias, por defecto 10")
+):
+    """Sugerir marcadores cuyo lugar tiene una palabra que empieza por el prefijo (sin distinguir mayúsculas ni tildes)."""
+
+    APIUtils.check_accept_json(request)
+    if not SearchUtils.normalize(prefix):
+        raise HTTPException(status_code=400, detail="El prefijo debe contener alguna letra o número")
+
+    try:
+        # Sin orden explícito: lugar_search es un array y ordenar por él obligaría a leer y ordenar
+        # todas las coincidencias; el recorrido del índice ya las da por término y para en 'limit'
+        marcadores = await DatabaseConnection.query_document(
+            "marcador", SearchUtils.prefix_query("lugar_search", prefix),
+            {"lugar": 1, "lat": 1, "lon": 1}, limit=limit
+        )
+
+        return APIUtils.conditional_response(request, marcadores,
+                            headers={"Content-Type": "application/json", "X-Total-Count": str(len(marcadores))})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al buscar los marcadores: {str(e)}")
 
+@router.get("/" + endpoint_name + "/clusters", tags=["Marcadores map endpoints"])
+async def get_marcador_clusters(
+    request: Request,
+    bbox: str = Query(description="Rectángulo visible 'minLon,minLat,maxLon,maxLat'"),
+    zoom: int = Query(ge=0, le=MAX_CLUSTER_ZOOM, description="Nivel de zoom del mapa")
+):
+    """Obtener los marcadores agrupados en una rejilla según el nivel de zoom."""
+
+    APIUtils.check_accept_json(request)
+    bounds = GeoUtils.parse_bbox(bbox)
+    size = GeoUtils.cell_size(zoom, CLUSTER_CELLS_PER_TILE)
+    cells = GeoUtils.cells_in_bbox(bounds, size)
+    if len(cells) > MAX_CLUSTER_CELLS:
+        raise HTTPException(status_code=400, detail="El área pedida es demasiado grande para este nivel de zoom")
+
+    try:
+        clusters = await get_clusters(bounds, zoom, size, cells)
+
+        return APIUtils.conditional_response(request, clusters,
+                            headers={"Content-Type": "application/json", "X-Total-Count": str(len(clusters))})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al agrupar los marcadores: {str(e)}")
+
+@router.get("/" + endpoint_name + "/tiles/{z}/{x}/{y}", tags=["Marcadores map endpoints"])
+async def get_marcadores_tile(
+    request: Request,
+    z: int = Path(ge=0, le=MAX_TILE_ZOOM, description="Nivel de zoom de la tesela"),
+    x: int = Path(ge=0, description="Columna de la tesela"),
+    y: int = Path(ge=0, description="Fila de la tesela")
+):
+    """Obtener los marcadores de una tesela z/x/y como FeatureCollection GeoJSON."""
+
+    APIUtils.check_accept_json(request)
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=404, detail=f"La tesela {z}/{x}/{y} no existe")
+
+    try:
+        query = GeoUtils.grid_query(GeoUtils.tile_bbox(z, x, y))
+
+        # La versión de la tesela depende de los marcadores que contiene (cuántos hay y cuándo se
+        # modificó el último) y de los cambios que han pasado por ella: un borrado o un marcador que
+        # sale de la tesela no cambian la fecha máxima. Por eso no se envía Last-Modified
+        summary = await DatabaseConnection.aggregate("marcador", [
+            {"$match": query},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "lastModified": {"$max": "$updatedAt"}}}
+        ])
+        count = summary[0]["count"] if summary else 0
+        last_modified = summary[0]["lastModified"] if summary else None
+
+        etag = APIUtils.make_etag("tile", z, x, y, tile_versions.get((z, x, y)), count,
+                                  last_modified.isoformat() if last_modified else "")
+        headers = {"ETag": etag, "Cache-Control": TILE_CACHE_CONTROL, "X-Total-Count": str(count)}
+
+        if APIUtils.is_not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        marcadores = await DatabaseConnection.query_document(
+            "marcador", query, {"lugar": 1, "lat": 1, "lon": 1, "creador": 1, "imagen": 1},
+            limit=MAX_TILE_FEATURES
+        )
+        tile = {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "id": m["_id"],
+                    "geometry": GeoUtils.point(m["lat"], m["lon"]),
+                    "properties": {"lugar": m.get("lugar"), "creador": m.get("creador"), "imagen": m.get("imagen")}
+                }
+                for m in marcadores
+            ],
+            "truncated": count > MAX_TILE_FEATURES
+        }
+
+        return FastJSONResponse(status_code=200, content=tile, headers=headers,
+                            media_type="application/geo+json")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener la tesela: {str(e)}")
+
 @router.get("/" + endpoint_name + "/{id}", tags=["Marcadores CRUD endpoints"], response_model=Marcador)
 async def get_marcador_by_id(request: Request, id: str = Path(description="ID del marcador")):
     """Obtener un marcador por su ID."""
@@ -61,32 +251,36 @@ async def get_marcador_by_id(request: Request, id: str = Path(description="ID de
     APIUtils.check_accept_json(request)
 
     try:
-        marcador = DatabaseConnection.read_document_id("marcador", id)
+        marcador = await DatabaseConnection.read_document_id("marcador", id)
         if marcador is None:
-            return JSONResponse(status_code=404, content={"detail": f"Marcador con ID {id} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"Marcador con ID {id} no encontrado"})
 
-        return JSONResponse(status_code=200, content=marcador,
+        # La versión del marcador es su fecha de modificación; los marcadores anteriores
+        # a 'updatedAt' usan el hash del cuerpo
+        updated_at = marcador.get("updatedAt")
+        etag = APIUtils.make_etag("marcador", id, updated_at.isoformat()) if updated_at else None
+        return APIUtils.conditional_response(request, marcador, etag=etag, last_modified=updated_at,
                             headers={"Content-Type": "application/json", "X-Total-Count": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener el marcador: {str(e)}")
     
 @router.get("/" + endpoint_name + "/email/{email}", tags=["Marcadores CRUD endpoints"], response_model=List[Marcador])
-async def get_marcadores_by_email(email: str = Path(description="Email del creador de los marcadores")):
-    """Obtener marcadores por email del creador."""
+async def get_marcadores_by_email(
+    email: str = Path(description="Email del creador de los marcadores"),
+    format: str = Query(default="json", description="Formato de la respuesta: 'json' (array) o 'ndjson'"),
+    batch_size: int = Query(default=DEFAULT_BATCH_SIZE, ge=1, le=10000, description="Documentos por lote leídos de MongoDB")
+):
+    """Obtener marcadores por email del creador, enviados en streaming."""
+    StreamUtils.check_format(format)
     try:
         query = {"creador": email}
-        marcadores = DatabaseConnection.query_document("marcador", query)
+        total_count = await DatabaseConnection.count_documents("marcador", query)
+        marcadores = DatabaseConnection.stream_documents("marcador", query, batch_size=batch_size)
 
-        # if not marcadores:
-        #     return JSONResponse(status_code=404, content={"detail": f"No se encontraron marcadores para el email {email}"})
-
-        return JSONResponse(status_code=200, content=marcadores,
-                            headers={"Content-Type": "application/json", "X-Total-Count": str(len(marcadores))})
+        return StreamUtils.response(marcadores, format, headers=APIUtils.total_count_headers(total_count))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener los marcadores: {str(e)}")
 
-
-
 @router.post("/" + endpoint_name, tags=["Marcadores CRUD endpoints"], response_model=Marcador)
 async def create_marcador(request: Request, marcador: MarcadorCreate):
     """Crear un nuevo marcador."""
@@ -95,13 +289,39 @@ async def create_marcador(request: Request, marcador: MarcadorCreate):
 
     try:
         marcador_dict = marcador.model_dump()
-        marcador_dict['_id'] = DatabaseConnection.create_document("marcador", marcador_dict)
+        marcador_dict["location"] = GeoUtils.point(marcador_dict["lat"], marcador_dict["lon"])
+        marcador_dict["lugar_search"] = SearchUtils.search_terms(marcador_dict["lugar"])
+        marcador_dict["updatedAt"] = datetime.now(timezone.utc)
+        marcador_dict['_id'] = await DatabaseConnection.create_document("marcador", marcador_dict)
+        invalidate_clusters(marcador_dict["lat"], marcador_dict["lon"])
 
-        return JSONResponse(status_code=201, content=marcador_dict,
+        return FastJSONResponse(status_code=201, content=marcador_dict,
                             headers={"Content-Type": "application/json"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear el marcador: {str(e)}")
 
+@router.post("/" + endpoint_name + ":bulk", tags=["Marcadores CRUD endpoints"])
+async def create_marcadores_bulk(request: Request):
+    """Crear muchos marcadores a partir de un array JSON o de un cuerpo NDJSON."""
+
+    def prepare(marcador_dict):
+        marcador_dict["location"] = GeoUtils.point(marcador_dict["lat"], marcador_dict["lon"])
+        marcador_dict["lugar_search"] = SearchUtils.search_terms(marcador_dict["lugar"])
+        marcador_dict["updatedAt"] = datetime.now(timezone.utc)
+
+    def on_created(marcador_dict):
+        invalidate_clusters(marcador_dict["lat"], marcador_dict["lon"])
+
+    try:
+        summary = await BulkUtils.bulk_create(request, "marcador", MarcadorCreate, prepare, on_created)
+
+        return FastJSONResponse(status_code=201 if summary["failed"] == 0 else 207, content=summary,
+                            headers={"Content-Type": "application/json"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear los marcadores: {str(e)}")
+
 @router.put("/" + endpoint_name + "/{id}", tags=["Marcadores CRUD endpoints"], response_model=Marcador)
 async def update_marcador(request: Request, marcador: MarcadorUpdate, id: str = Path(description="ID del marcador")):
     """Actualizar un marcador por su ID."""
@@ -113,19 +333,37 @@ async def update_marcador(request: Request, marcador: MarcadorUpdate, id: str =
 
         non_none_fields = {k: v for k, v in marcador_dict.items() if v is not None}
         if not non_none_fields:
-            return JSONResponse(status_code=422, content={"detail": "No has especificado ningún campo del marcador"})
-
-        updated_document = DatabaseConnection.update_document_id("marcador", id, non_none_fields)
-        if updated_document is None:
-            return JSONResponse(status_code=404, content={"detail": "No se ha encontrado un marcador con ese ID. No se ha editado nada"})
-
-        json_serializable_document = jsonable_encoder(updated_document)
-
-        return JSONResponse(
+            return FastJSONResponse(status_code=422, content={"detail": "No has especificado ningún campo del marcador"})
+
+        if "lugar" in non_none_fields:
+            non_none_fields["lugar_search"] = SearchUtils.search_terms(non_none_fields["lugar"])
+        non_none_fields["updatedAt"] = datetime.now(timezone.utc)
+
+        if "lat" in non_none_fields or "lon" in non_none_fields:
+            # El punto GeoJSON se calcula en el servidor en la misma actualización, con las coordenadas
+            # que quedan guardadas; leerlas antes (de la caché o de otra petición) puede mezclar valores
+            previous = await DatabaseConnection.update_document_id_pipeline("marcador", id, [
+                {"$set": {field: {"$literal": value} for field, value in non_none_fields.items()}},
+                {"$set": {"location": GeoUtils.point_expression()}}
+            ], return_updated=False)
+            if previous is None:
+                return FastJSONResponse(status_code=404, content={"detail": "No se ha encontrado un marcador con ese ID. No se ha editado nada"})
+
+            # El documento anterior sale de la misma operación: sus coordenadas son las que se han reemplazado
+            updated_document = {**previous, **non_none_fields}
+            updated_document["location"] = GeoUtils.point(updated_document.get("lat"), updated_document.get("lon"))
+            invalidate_clusters(previous.get("lat"), previous.get("lon"))
+            invalidate_clusters(updated_document.get("lat"), updated_document.get("lon"))
+        else:
+            updated_document = await DatabaseConnection.update_document_id("marcador", id, non_none_fields)
+            if updated_document is None:
+                return FastJSONResponse(status_code=404, content={"detail": "No se ha encontrado un marcador con ese ID. No se ha editado nada"})
+
+        return FastJSONResponse(
             status_code=200,
             content={
                 "detail": "El marcador se ha editado correctamente",
-                "result": json_serializable_document
+                "result": updated_document
             }
         )
 
@@ -139,11 +377,78 @@ async def delete_marcador(id: str = Path(description="ID del marcador")):
     """Eliminar un marcador por su ID."""
 
     try:
-        count = DatabaseConnection.delete_document_id("marcador", id)
+        current = await DatabaseConnection.read_document_id("marcador", id, {"lat": 1, "lon": 1})
+        count = await DatabaseConnection.delete_document_id("marcador", id)
         if count == 0:
-            return JSONResponse(status_code=404, content={"detail": "No se ha encontrado un marcador con ese ID. No se ha borrado nada."})
+            return FastJSONResponse(status_code=404, content={"detail": "No se ha encontrado un marcador con ese ID. No se ha borrado nada."})
+        if current is not None:
+            invalidate_clusters(current.get("lat"), current.get("lon"))
 
-        return JSONResponse(status_code=200, content={"details": "El marcador se ha eliminado correctamente"},
+        return FastJSONResponse(status_code=200, content={"details": "El marcador se ha eliminado correctamente"},
                             headers={"Content-Type": "application/json"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar el marcador: {str(e)}")
+
+def build_geo_query(bbox: str | None, near: str | None, radius: float) -> dict:
+    """Construir el filtro geoespacial a partir de los parámetros 'bbox' o 'near'."""
+    if bbox:
+        return GeoUtils.bbox_query(GeoUtils.parse_bbox(bbox))
+    if near:
+        lat, lon = GeoUtils.parse_near(near)
+        return GeoUtils.near_query(lat, lon, radius)
+    return {}
+
+async def get_clusters(bounds: tuple, zoom: int, size: float, cells: list) -> list:
+    """Devolver las agrupaciones de las celdas pedidas, calculando en MongoDB solo si falta alguna en caché."""
+    clusters = {cell: cluster_cache.get((zoom, *cell), _MISSING) for cell in cells}
+    missing = [cell for cell, cluster in clusters.items() if cluster is _MISSING]
+
+    if missing:
+        generation = cluster_versions.current
+        columns = round(360 / size)
+        rows = round(180 / size)
+        pipeline = [
+            {"$match": GeoUtils.grid_query(GeoUtils.align_bbox(bounds, size))},
+            {"$group": {
+                "_id": {
+                    "x": {"$min": [{"$floor": {"$divide": [{"$add": ["$lon", 180]}, size]}}, columns - 1]},
+                    "y": {"$min": [{"$floor": {"$divide": [{"$add": ["$lat", 90]}, size]}}, rows - 1]}
+                },
+                "count": {"$sum": 1},
+                "lat": {"$avg": "$lat"},
+                "lon": {"$avg": "$lon"},
+                "sampleId": {"$first": "$_id"}
+            }}
+        ]
+        groups = await DatabaseConnection.aggregate("marcador", pipeline)
+        found = {
+            (int(g["_id"]["x"]), int(g["_id"]["y"])): {
+                "count": g["count"],
+                "lat": g["lat"],
+                "lon": g["lon"],
+                "sampleId": g["sampleId"].binary.hex()
+            }
+            for g in groups
+        }
+        for cell in missing:
+            clusters[cell] = found.get(cell)
+            # Si un marcador de la celda ha cambiado durante la agregación, el resultado puede ser anterior
+            if cluster_versions.get((zoom, *cell)) <= generation:
+                cluster_cache.set((zoom, *cell), clusters[cell])
+
+    return [cluster for cluster in clusters.values() if cluster is not None]
+
+def invalidate_clusters(lat, lon):
+    """
+    Eliminar de la caché las celdas que contienen un punto en todos los niveles de zoom y
+    cambiar la versión de las teselas que lo contienen.
+    """
+    if not GeoUtils.is_valid_coordinate(lat, lon):
+        return
+    for zoom in range(MAX_CLUSTER_ZOOM + 1):
+        cell = GeoUtils.cell_of(lat, lon, GeoUtils.cell_size(zoom, CLUSTER_CELLS_PER_TILE))
+        cluster_versions.bump((zoom, *cell))
+        cluster_cache.delete((zoom, *cell))
+    for z in range(MAX_TILE_ZOOM + 1):
+        for tile in GeoUtils.tiles_of(lat, lon, z):
+            tile_versions.bump(tile)
@@ -0,0 +1,158 @@
+"""
+Métricas de la API en formato de texto de Prometheus (GET /metrics).
+
+- MetricsMiddleware: peticiones y latencia por método, plantilla de ruta y código de estado.
+- MongoMetricsListener: duración de cada comando de MongoDB por comando y colección. Se
+  registra en el cliente de DatabaseConnection, así que cubre también los getMore de los
+  cursores. Los nombres son los del protocolo: count_documents es 'aggregate',
+  insert_one e insert_many son 'insert', find_one_and_update es 'findAndModify', etc.
+- Estado de las cachés de DatabaseConnection y del búfer de visitas, leído al exportar.
+
+Con METRICS_ENABLED=false no se registra nada y /metrics no se expone.
+"""
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+from starlette.responses import Response
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+
+# Intervalos de los histogramas (segundos); las consultas a MongoDB suelen ser más rápidas que las peticiones
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+# Etiqueta de las peticiones que no corresponden a ninguna ruta (así las URL inventadas no crean series)
+UNMATCHED_ROUTE = "unmatched"
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP hasta enviar la respuesta completa",
+    ["method", "route", "status"], buckets=REQUEST_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Peticiones HTTP en curso", ["method"]
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "Duración de los comandos de MongoDB",
+    ["command", "collection"], buckets=MONGO_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "Comandos de MongoDB que han devuelto un error", ["command", "collection"]
+)
+
+def route_template(scope) -> str:
+    """Plantilla de la ruta que ha atendido la petición, con el prefijo del router incluido."""
+    # Las versiones recientes de FastAPI dejan en scope["route"] la ruta sin el prefijo de include_router
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    route = context or scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición HTTP.
+
+    La ruta se etiqueta con su plantilla ('/api/v1/marcadores/{id}'), que el enrutador deja en
+    scope["route"], y no con la URL, para que el número de series no crezca con los IDs. La
+    duración incluye el envío del cuerpo, también en las respuestas en streaming.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.labels(method).inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.labels(method).dec()
+            HTTP_REQUEST_DURATION.labels(method, route_template(scope), status).observe(time.perf_counter() - start)
+
+class MongoMetricsListener(monitoring.CommandListener):
+    """Listener de comandos de pymongo que mide cada comando por nombre y colección."""
+
+    def __init__(self):
+        # Colección de cada comando en curso, hasta que llega su evento de fin
+        self._collections = {}
+
+    @staticmethod
+    def _key(event):
+        return event.connection_id, event.request_id
+
+    def started(self, event):
+        command = event.command
+        # La colección es el valor del propio comando ({'find': 'marcador', ...}), salvo en getMore
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        self._collections[self._key(event)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop(self._key(event), "")
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop(self._key(event), "")
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+
+class StatsCollector:
+    """Colector que exporta las estadísticas de las cachés y del búfer de visitas en cada lectura."""
+
+    def describe(self):
+        # Sin descripción previa el registro no llama a collect() al registrarlo (db_connection
+        # importa este módulo, así que todavía no se puede leer DatabaseConnection)
+        return []
+
+    def collect(self):
+        from db_connection import DatabaseConnection
+        from visitas_v1 import visit_buffer
+
+        caches = {"document": DatabaseConnection.cache_stats(), "count": DatabaseConnection.count_cache_stats()}
+        size = GaugeMetricFamily("app_cache_entries", "Entradas en la caché", labels=["cache"])
+        hits = CounterMetricFamily("app_cache_hits", "Aciertos de la caché", labels=["cache"])
+        misses = CounterMetricFamily("app_cache_misses", "Fallos de la caché", labels=["cache"])
+        for name, stats in caches.items():
+            size.add_metric([name], stats["size"])
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+        yield from (size, hits, misses)
+
+        if visit_buffer is not None:
+            stats = visit_buffer.stats()
+            yield GaugeMetricFamily("visit_buffer_queued", "Visitas pendientes en el búfer de escritura", value=stats["queued"])
+            documents = CounterMetricFamily("visit_buffer_documents", "Visitas que han pasado por el búfer", labels=["result"])
+            for result in ("written", "failed", "rejected"):
+                documents.add_metric([result], stats[result])
+            yield documents
+            yield CounterMetricFamily("visit_buffer_flushes", "Escrituras por lotes del búfer", value=stats["flushes"])
+
+mongo_listener = MongoMetricsListener()
+if METRICS_ENABLED:
+    REGISTRY.register(StatsCollector())
+
+def event_listeners() -> list:
+    """Listeners que se registran en el cliente de MongoDB."""
+    return [mongo_listener] if METRICS_ENABLED else []
+
+def setup_metrics(app):
+    """Añadir el middleware de métricas y la ruta /metrics a la aplicación."""
+    if not METRICS_ENABLED:
+        return
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,5 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+class BatchIds(BaseModel):
+    ids: List[str] = Field(default_factory=list, example=["5f3c3e7d7f43b5a3b1c1e123", "5f3c3e7d7f43b5a3b1c1e124"])
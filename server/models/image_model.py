@@ -14,10 +14,26 @@ class Image(BaseModel):
         ID del propietario de la imagen (obligatorio)
     url : str
         URL de acceso a la imagen (obligatorio)
+    publicId : str
+        Identificador de la imagen en el backend de almacenamiento
+    storage : str
+        Backend de almacenamiento en el que está la imagen ('cloudinary' o 'local')
+    contentHash : str
+        Hash SHA-256 del contenido del original; dos subidas del mismo fichero comparten imagen
+    variants : dict
+        Derivadas generadas al subir la imagen ('thumb', 'medium', 'webp'), cada una con su url,
+        publicId, width, height, format y bytes
     date : str
         Fecha de creación de la imagen en formato ISO (obligatorio)
     """
     name: str = Field(default=None, example="profile_picture.png")
     ownerId: int = Field(default=None, example=1)
     url: str = Field(default=None, example="https://res.cloudinary.com/demo/image/upload/v1234567890/sample.jpg")
+    publicId: str | None = Field(default=None, example="sample")
+    storage: str | None = Field(default=None, example="cloudinary")
+    contentHash: str | None = Field(default=None, example="9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08")
+    variants: dict | None = Field(default=None, example={
+        "thumb": {"url": "https://res.cloudinary.com/demo/image/upload/v1234567890/sample_thumb.webp",
+                  "publicId": "sample_thumb", "width": 200, "height": 150, "format": "webp", "bytes": 6120}
+    })
     timestamp: str = Field(default=datetime.now().isoformat(), example=datetime.now().isoformat())
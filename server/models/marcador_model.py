@@ -7,6 +7,9 @@ class Marcador(BaseModel):
     lon: float = Field(default=None)
     creador: str = Field(default=None)
     imagen: str = Field(default=None)
+    location: dict | None = Field(default=None, description="Punto GeoJSON derivado de lat y lon")
+    updatedAt: str | None = Field(default=None, description="Fecha de la última modificación en formato ISO")
+    lugar_search: list[str] | None = Field(default=None, description="Términos normalizados de 'lugar' para la búsqueda por prefijo")
 
 class MarcadorCreate(BaseModel):
     lugar: str = Field(default=None)
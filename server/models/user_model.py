@@ -20,6 +20,8 @@ class User(BaseModel):
         "user": "5f3c3e7d7f43b5a3b1c1e123",
         "rating": 5
     }])
+    totalRates: int = Field(default=0, example=1)
+    ratingAverage: float = Field(default=0, example=5)
 
 class UserCreate(BaseModel):
     email: str = Field(default=None, example="5f3c3e7d7f43b5a3b1c1e123", validate_default=True)
@@ -19,3 +19,13 @@ class VisitaUpdate(BaseModel):
 
 class VisitaDeleteResponse(BaseModel):
     details: str = "Mensaje de confirmación de la eliminación"
+
+class VisitaStatsBucket(BaseModel):
+    bucket: str = Field(description="Inicio del intervalo (hora o día) en formato ISO")
+    count: int = Field(description="Visitas recibidas en el intervalo")
+
+class VisitaStats(BaseModel):
+    usuarioVisitado: str = Field(description="Email del usuario visitado")
+    granularity: str = Field(description="Tamaño de los intervalos: 'hour' o 'day'")
+    total: int = Field(description="Visitas recibidas en todo el rango")
+    buckets: list[VisitaStatsBucket] = Field(default_factory=list, description="Intervalos con al menos una visita, en orden cronológico")
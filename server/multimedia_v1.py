@@ -1,29 +1,24 @@
 from datetime import datetime
 from bson import ObjectId
 
+import asyncio
+import io
 import random
-import os
 
 from typing import Optional, Dict, List
 from fastapi import APIRouter, HTTPException, Query, Request, Path, UploadFile, File
-from fastapi.responses import JSONResponse
-import cloudinary
-import cloudinary.uploader
+from pymongo.errors import DuplicateKeyError
 
 from models.image_model import Image
-from db_connection import DatabaseConnection
+from models.batch_model import BatchIds
+from db_connection import DatabaseConnection, DEFAULT_BATCH_SIZE
 from api_utils import APIUtils
+from json_response import FastJSONResponse
+from stream_utils import StreamUtils
+from storage import get_storage
+from upload_utils import UploadUtils
+from image_utils import ImageUtils, IMAGE_VARIANTS
 
-from dotenv import load_dotenv
-
-load_dotenv()
-
-cloudinary.config(
-    cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key = os.getenv("CLOUDINARY_API_KEY"),
-    api_secret = os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
 router = APIRouter()
 
 endpoint_name = "media"
@@ -32,50 +27,113 @@ version = "v1"
 @router.get("/" + endpoint_name, tags=["Images CRUD endpoints"], response_model=List[Image])
 async def get_images(
     request: Request,
+    ids: str | None = Query(None, description="IDs de las imágenes a devolver, separados por comas"),
     ownerId: int | None = Query(None, description="ID del autor de la imagen", gt=0),
     name: str | None = Query(None, description="Nombre del archivo"),
     fields: str | None = Query(None, description="Campos específicos a devolver"),
     sort: str | None = Query(None, description="Campos por los que ordenar, separados por comas"),
     offset: int = Query(default=0, description="Índice de inicio para los resultados de la paginación"),
+    cursor: str | None = Query(None, description="Cursor opaco de la página siguiente (cabecera X-Next-Cursor)"),
     limit: int = Query(default=10, description="Cantidad de imagenes a devolver, por defecto 10"),
+    count: bool = Query(default=True, description="Calcular el total (X-Total-Count); con count=false no se cuenta"),
     hateoas: bool | None = Query(None, description="Incluir enlaces HATEOAS")
 ):
     APIUtils.check_accept_json(request)
+    after = APIUtils.check_cursor(cursor, sort, offset)
+    id_list = APIUtils.parse_ids(ids)
 
     try:
         query = build_query(ownerId, name)
         projection = APIUtils.build_projection(fields)
         sort_criteria = APIUtils.build_sort_criteria(sort)
 
-        images = DatabaseConnection.query_document("image", query, projection, sort_criteria, offset, limit)
-        
-        total_count = len(images)
+        if id_list:
+            images, missing = await DatabaseConnection.read_documents_ids("image", id_list, projection, query)
+            if hateoas:
+                for image in images:
+                    image["href"] = f"/api/{version}/{endpoint_name}/{image['_id']}"
+            return APIUtils.conditional_response(request, images, APIUtils.batch_headers(images, missing))
+
+        images, last_key, total_count = await DatabaseConnection.query_page(
+            "image", query, projection, sort_criteria, offset, limit, after, count
+        )
 
         if hateoas:
             for image in images:
                 image["href"] = f"/api/{version}/{endpoint_name}/{image['_id']}"
 
-        return JSONResponse(status_code=200, content=images, 
-                            headers={"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)})
+        return APIUtils.conditional_response(request, images,
+                            headers={"Accept-Encoding": "gzip", **APIUtils.total_count_headers(total_count),
+                                     **APIUtils.next_page_headers(request, sort_criteria, last_key)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al buscar la imagen: {str(e)}")
 
+@router.get("/" + endpoint_name + "/export", tags=["Images export endpoints"])
+async def export_images(
+    format: str = Query(default="ndjson", description="Formato de la exportación: 'ndjson' o 'json' (array)"),
+    fields: str | None = Query(None, description="Campos específicos a devolver"),
+    batch_size: int = Query(default=DEFAULT_BATCH_SIZE, ge=1, le=10000, description="Documentos por lote leídos de MongoDB")
+):
+    StreamUtils.check_format(format)
+    try:
+        images = DatabaseConnection.stream_documents(
+            "image", projection=APIUtils.build_projection(fields), batch_size=batch_size
+        )
+        return StreamUtils.response(images, format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al exportar las imágenes: {str(e)}")
+
+@router.post("/" + endpoint_name + "/batch", tags=["Images CRUD endpoints"], response_model=List[Image])
+async def get_images_batch(request: Request,
+    batch: BatchIds,
+    fields: str | None = Query(None, description="Campos específicos a devolver")
+):
+    APIUtils.check_content_type_json(request)
+    id_list = APIUtils.parse_ids(batch.ids) or []
+
+    try:
+        images, missing = await DatabaseConnection.read_documents_ids(
+            "image", id_list, APIUtils.build_projection(fields)
+        )
+
+        return FastJSONResponse(status_code=200, content=images, headers=APIUtils.batch_headers(images, missing))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener las imágenes: {str(e)}")
+
 @router.get("/" + endpoint_name + "/{id}", tags=["Images CRUD endpoints"], response_model=Image)
 async def get_image_by_id(request: Request, 
     id: str = Path(description="ID de la imagen", min_length=24, max_length=24),
-    fields: str | None = Query(None, description="Campos específicos a devolver")
+    fields: str | None = Query(None, description="Campos específicos a devolver"),
+    variant: str | None = Query(None, description="Derivada cuya URL devolver en 'url': " + ", ".join(["original", *IMAGE_VARIANTS]))
 ):
     APIUtils.check_id(id)
     APIUtils.check_accept_json(request)
+    if variant is not None and variant != "original" and variant not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"Variante desconocida: '{variant}'. Valores permitidos: "
+                            + ", ".join(["original", *IMAGE_VARIANTS]))
     
     try:
         projection = APIUtils.build_projection(fields)
+        derived = variant is not None and variant != "original"
+        # Con 'fields' se lee solo la derivada pedida, y se devuelve únicamente si se ha pedido 'variants'
+        keep_variants = projection is None or "variants" in projection
+        if derived and not keep_variants:
+            projection[f"variants.{variant}"] = 1
 
-        image = DatabaseConnection.read_document("image", id, projection)
+        image = await DatabaseConnection.read_document_id("image", id, projection)
         if image is None:
-            return JSONResponse(status_code=404, content={"detail": f"Imagen con ID {id} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"Imagen con ID {id} no encontrado"})
+
+        if derived:
+            # Las imágenes subidas antes de generar derivadas solo tienen el original
+            derivative = (image.get("variants") or {}).get(variant)
+            if derivative is not None:
+                image["url"] = derivative["url"]
+            image["variant"] = variant if derivative is not None else "original"
+            if not keep_variants:
+                image.pop("variants", None)
         
-        return JSONResponse(status_code=200, content=image,
+        return APIUtils.conditional_response(request, image,
                             headers={"Content-Type": "application/json", "X-Total-Count": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener la imagen: {str(e)}")
@@ -83,28 +141,68 @@ async def get_image_by_id(request: Request,
 @router.post("/" + endpoint_name, tags=["Images CRUD endpoints"])
 async def test_upload(file: UploadFile = File(...)):
     try:
-        upload_result = cloudinary.uploader.upload(file.file)
-        thumbnail_url = upload_result['secure_url']
-        public_id = upload_result['public_id']
+        # El contenido se hashea mientras se lee: si ya se subió, se devuelve la imagen existente
+        # sin volver a generar derivadas ni a subir nada
+        data, content_hash = await UploadUtils.read(file)
+        existing = await find_image_by_hash(content_hash)
+        if existing is not None:
+            return existing_image_response(existing)
+
+        # Las derivadas (miniaturas, WebP) se generan en el pool de procesos, no en el bucle de eventos
+        try:
+            rendered = await ImageUtils.render(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Las subidas son bloqueantes: se hacen en el executor de subidas, el original y las derivadas a la vez
+        storage = get_storage()
+        names = list(rendered)
+        results = await asyncio.gather(
+            UploadUtils.upload(io.BytesIO(data), file.filename, file.content_type, storage),
+            *[
+                UploadUtils.upload(io.BytesIO(rendered[name]["data"]),
+                                   ImageUtils.filename(file.filename, name, rendered[name]["format"]),
+                                   ImageUtils.content_type(rendered[name]["format"]), storage)
+                for name in names
+            ]
+        )
+        upload_result = results[0]
 
         new_image = Image()
         new_image.name = file.filename
         new_image.ownerId = 1 + (int)(10 * random.random())
-        new_image.url = thumbnail_url
+        new_image.url = upload_result["url"]
 
         body_dict = new_image.model_dump()
+        body_dict["publicId"] = upload_result["publicId"]
+        body_dict["storage"] = storage.name
+        body_dict["contentHash"] = content_hash
+        body_dict["variants"] = {
+            name: {"url": result["url"], "publicId": result["publicId"], "width": rendered[name]["width"],
+                   "height": rendered[name]["height"], "format": rendered[name]["format"],
+                   "bytes": len(rendered[name]["data"])}
+            for name, result in zip(names, results[1:])
+        }
         body_dict["timestamp"] = datetime.now()
 
-        DatabaseConnection.create_document("image", body_dict, hasDate=True)
+        try:
+            await DatabaseConnection.create_document("image", body_dict, hasDate=True)
+        except DuplicateKeyError:
+            # Otra subida del mismo contenido ha terminado antes (índice único de contentHash):
+            # se eliminan los ficheros recién subidos y se devuelve la imagen que ya existe
+            await UploadUtils.discard([result["publicId"] for result in results], storage)
+            return existing_image_response(await find_image_by_hash(content_hash))
 
-        return JSONResponse(status_code=201, content={"detail": "La imagen se ha subido correctamente", "result": body_dict},
+        return FastJSONResponse(status_code=201, content={"detail": "La imagen se ha subido correctamente", "result": body_dict},
                             headers={"Location": f"/api/{version}/{endpoint_name}/{body_dict['_id']}"} )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al subir la imagen {str(e)}")
 
 @router.options("/" + endpoint_name, tags=["Images OPTIONS endpoints"])
 async def options_images():
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=200,
         content={"methods": ["GET", "POST", "OPTIONS"]},
         headers={"Allow": "GET, POST, OPTIONS"}
@@ -112,12 +210,22 @@ async def options_images():
 
 @router.options("/" + endpoint_name + "/{id}", tags=["Images OPTIONS endpoints"])
 async def options_image_by_id():
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=200,
         content={"methods": ["GET", "OPTIONS"]},
         headers={"Allow": "GET, OPTIONS"}
     )
 
+async def find_image_by_hash(content_hash: str) -> Optional[dict]:
+    """Buscar la imagen cuyo original tiene ese hash de contenido."""
+    images = await DatabaseConnection.query_document("image", {"contentHash": content_hash}, limit=1)
+    return images[0] if images else None
+
+def existing_image_response(image: dict) -> FastJSONResponse:
+    """Respuesta de una subida cuyo contenido ya existía: 200 con la imagen existente."""
+    return FastJSONResponse(status_code=200, content={"detail": "La imagen ya existía", "result": image},
+                            headers={"Location": f"/api/{version}/{endpoint_name}/{image['_id']}"})
+
 def build_query(ownerId: Optional[int], name: Optional[str]) -> Dict[str, Dict]:
     """Construir una consulta a partir de los parámetros proporcionados."""
     query = {}
@@ -0,0 +1,61 @@
+"""
+Recalcular desde cero los contadores de visitas por hora y por día (colección 'visita_rollup')
+a partir de las visitas guardadas, p. ej. al desplegar los contadores sobre datos existentes.
+Conviene ejecutarlo sin tráfico de escritura de visitas, ya que las visitas creadas mientras
+tanto pueden contarse dos veces o ninguna.
+
+Uso: python rebuild_visit_rollups.py
+"""
+import asyncio
+
+from db_connection import DatabaseConnection
+from indexes import IndexUtils
+from visitas_v1 import ROLLUP_COLLECTION, GRANULARITIES
+
+def rollup_pipeline(granularity: str) -> list:
+    """Pipeline que agrupa las visitas por usuario e intervalo y reemplaza cada contador con $merge."""
+    return [
+        {"$match": {"timestamp": {"$type": "date"}}},
+        {"$group": {
+            "_id": {
+                "usuarioVisitado": "$usuarioVisitado",
+                "bucket": {"$dateTrunc": {"date": "$timestamp", "unit": granularity}}
+            },
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "usuarioVisitado": "$_id.usuarioVisitado",
+            "granularity": granularity,
+            "bucket": "$_id.bucket",
+            "count": 1
+        }},
+        {"$merge": {
+            "into": ROLLUP_COLLECTION,
+            "on": ["usuarioVisitado", "granularity", "bucket"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+async def rebuild_rollups():
+    # $merge necesita el índice único sobre los campos de 'on'
+    report = await IndexUtils.ensure_indexes([ROLLUP_COLLECTION])
+    print(f"Índices de los contadores: {report[ROLLUP_COLLECTION]}")
+
+    # Los intervalos que ya no tengan visitas quedan a 0 y no se devuelven en las estadísticas
+    await DatabaseConnection.update_many(ROLLUP_COLLECTION, {}, {"$set": {"count": 0}})
+
+    for granularity in GRANULARITIES:
+        # La agrupación y la escritura se hacen en el servidor
+        await DatabaseConnection.aggregate("visita", rollup_pipeline(granularity))
+        print(f"Contadores por '{granularity}' recalculados")
+
+async def rebuild_visit_rollups():
+    try:
+        await rebuild_rollups()
+    finally:
+        await DatabaseConnection.close_connection()
+
+if __name__ == '__main__':
+    asyncio.run(rebuild_visit_rollups())
@@ -0,0 +1,32 @@
+import re
+import unicodedata
+from typing import Optional
+
+# Palabras de 'lugar' a partir de las que se puede buscar por prefijo
+MAX_SEARCH_WORDS = 10
+
+class SearchUtils:
+
+    @classmethod
+    def normalize(cls, text: Optional[str]) -> str:
+        """Pasar un texto a minúsculas, sin tildes ni signos de puntuación y con un espacio entre palabras."""
+        if not text:
+            return ""
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+        return " ".join(re.findall(r"\w+", text))
+
+    @classmethod
+    def search_terms(cls, text: Optional[str]) -> list:
+        """
+        Construir los términos de búsqueda por prefijo de un texto: el texto normalizado a partir
+        de cada una de sus palabras ('plaza de españa' -> ['plaza de espana', 'de espana', 'espana']),
+        de modo que un prefijo encuentra el texto empiece por la palabra que empiece.
+        """
+        words = cls.normalize(text).split(" ")
+        return [" ".join(words[i:]) for i in range(min(len(words), MAX_SEARCH_WORDS)) if words[i]]
+
+    @classmethod
+    def prefix_query(cls, field: str, prefix: str) -> dict:
+        """Construir un filtro por prefijo anclado (^), que MongoDB resuelve con un rango del índice."""
+        return {field: {"$regex": "^" + re.escape(cls.normalize(prefix))}}
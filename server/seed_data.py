@@ -0,0 +1,234 @@
+"""
+Generar datos sintéticos en las colecciones 'user', 'marcador', 'visita' e 'image' para
+probar índices, paginación y cachés con volúmenes como los de producción.
+
+- Los usuarios llevan reviews de otros usuarios (con totalRates, ratingSum y ratingAverage).
+- Los marcadores se concentran alrededor de ciudades (lat/lon con distribución normal).
+- La popularidad sigue una ley de potencias (Zipf): unos pocos usuarios reciben la mayoría de
+  las visitas y crean la mayoría de los marcadores.
+
+Los documentos se insertan con insert_many por lotes, con varios lotes en curso a la vez. El
+resultado depende solo de la semilla: cada lote se genera con su propio generador aleatorio y
+los '_id' se derivan de la posición del documento, así que dos ejecuciones con la misma
+semilla producen los mismos datos. Al terminar se crean los índices del registro y se
+recalculan los contadores de visitas.
+
+Uso: python seed_data.py --db mi-mapa-test [--users 100000] [--marcadores 1000000] [--visitas 10000000]
+                         [--images 100000] [--seed 42] [--batch-size 5000] [--workers 8] [--drop]
+"""
+import argparse
+import asyncio
+import bisect
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from bson import ObjectId
+
+# Ciudades alrededor de las que se agrupan los marcadores: (lat, lon, peso)
+CITIES = [
+    (40.4168, -3.7038, 30), (41.3874, 2.1686, 25), (39.4699, -0.3763, 10), (37.3891, -5.9845, 10),
+    (36.7213, -4.4214, 8), (43.2630, -2.9350, 6), (41.6488, -0.8891, 5), (37.9922, -1.1307, 4),
+    (39.5696, 2.6502, 4), (28.1235, -15.4363, 3), (43.3623, -8.4115, 3), (37.1773, -3.5986, 3),
+    (42.8782, -8.5448, 2), (43.5322, -5.6611, 2), (41.6523, -4.7245, 2)
+]
+# Desviación típica (en grados) de los marcadores alrededor de su ciudad
+CITY_SPREAD = 0.15
+PLACES = ["Plaza Mayor", "Catedral", "Parque", "Mercado Central", "Museo", "Playa", "Castillo",
+          "Puerto", "Estación", "Mirador", "Jardín Botánico", "Teatro", "Puente", "Iglesia", "Barrio"]
+# Exponente de la ley de potencias de la popularidad de los usuarios
+ZIPF_EXPONENT = 1.1
+MAX_REVIEWS_PER_USER = 50
+# Días hacia atrás en los que se reparten las visitas
+VISIT_DAYS = 90
+# Fecha fija de referencia, para que los datos no dependan del día en que se generan (las
+# estadísticas de visitas se consultan con 'from' y 'to' anteriores a esta fecha)
+REFERENCE_DATE = datetime(2025, 1, 1)
+
+# Byte que distingue los '_id' de cada colección: '_id' = marca de tiempo + colección + posición
+COLLECTION_CODES = {"user": 1, "marcador": 2, "visita": 3, "image": 4}
+
+def object_id(collection_name: str, position: int) -> ObjectId:
+    """'_id' determinista del documento en esa posición de la colección."""
+    timestamp = int(REFERENCE_DATE.replace(tzinfo=timezone.utc).timestamp()).to_bytes(4, "big")
+    return ObjectId(timestamp + bytes([COLLECTION_CODES[collection_name]]) + position.to_bytes(7, "big"))
+
+def email(position: int) -> str:
+    return f"user{position}@example.com"
+
+class Popularity:
+    """Muestreo de usuarios con probabilidad proporcional a 1 / rango^ZIPF_EXPONENT."""
+
+    def __init__(self, users: int):
+        self.cum_weights = list(accumulate(1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(users)))
+
+    def sample(self, rng: random.Random) -> int:
+        return bisect.bisect(self.cum_weights, rng.random() * self.cum_weights[-1])
+
+def make_users(rng: random.Random, start: int, stop: int, users: int, popularity: Popularity) -> list:
+    documents = []
+    for i in range(start, stop):
+        # El número de reviews de cada usuario sigue una distribución de Pareto y sus autores, la popularidad
+        reviewers = {popularity.sample(rng) for _ in range(min(int(rng.paretovariate(1.5)) - 1, MAX_REVIEWS_PER_USER))}
+        reviews = [{"user": object_id("user", reviewer), "rating": rng.randint(1, 5)} for reviewer in reviewers if reviewer != i]
+        rating_sum = sum(review["rating"] for review in reviews)
+        documents.append({
+            "_id": object_id("user", i),
+            "email": email(i),
+            "name": f"Nombre{i}",
+            "surname": f"Apellido{i}",
+            "description": f"Usuario sintético {i}",
+            "userName": f"user{i}",
+            "oauthId": f"oauth{i}",
+            "oauthProvider": "google",
+            "oauthToken": f"token{i}",
+            "profilePicture": "https://example.com/profile.jpg",
+            "reviews": reviews,
+            "ratingSum": rating_sum,
+            "totalRates": len(reviews),
+            "ratingAverage": round(rating_sum / len(reviews), 2) if reviews else 0
+        })
+    return documents
+
+def make_marcadores(rng: random.Random, start: int, stop: int, users: int, popularity: Popularity) -> list:
+    from geo_utils import GeoUtils
+    from search_utils import SearchUtils
+
+    city_weights = list(accumulate(weight for _, _, weight in CITIES))
+    documents = []
+    for i in range(start, stop):
+        city_lat, city_lon, _ = CITIES[bisect.bisect(city_weights, rng.random() * city_weights[-1])]
+        lat = max(-90.0, min(90.0, rng.gauss(city_lat, CITY_SPREAD)))
+        lon = max(-180.0, min(180.0, rng.gauss(city_lon, CITY_SPREAD)))
+        lugar = f"{rng.choice(PLACES)} {i}"
+        documents.append({
+            "_id": object_id("marcador", i),
+            "lugar": lugar,
+            "lat": lat,
+            "lon": lon,
+            "creador": email(popularity.sample(rng)),
+            "imagen": f"https://example.com/marcador{i}.jpg",
+            "location": GeoUtils.point(lat, lon),
+            "lugar_search": SearchUtils.search_terms(lugar),
+            "updatedAt": REFERENCE_DATE - timedelta(seconds=rng.randrange(VISIT_DAYS * 86400))
+        })
+    return documents
+
+def make_visitas(rng: random.Random, start: int, stop: int, users: int, popularity: Popularity) -> list:
+    return [{
+        "_id": object_id("visita", i),
+        "usuarioVisitado": email(popularity.sample(rng)),
+        "usuarioVisitante": email(rng.randrange(users)),
+        "oauthToken": f"token{i}",
+        "timestamp": REFERENCE_DATE - timedelta(seconds=rng.randrange(VISIT_DAYS * 86400))
+    } for i in range(start, stop)]
+
+def make_images(rng: random.Random, start: int, stop: int, users: int, popularity: Popularity) -> list:
+    return [{
+        "_id": object_id("image", i),
+        "name": f"foto{i}.jpg",
+        "ownerId": popularity.sample(rng) + 1,
+        "url": f"https://example.com/foto{i}.jpg",
+        "publicId": f"foto{i}",
+        "storage": "local",
+        "contentHash": f"{i:064x}",
+        "variants": {},
+        "timestamp": REFERENCE_DATE - timedelta(seconds=rng.randrange(VISIT_DAYS * 86400))
+    } for i in range(start, stop)]
+
+GENERATORS = {"user": make_users, "marcador": make_marcadores, "visita": make_visitas, "image": make_images}
+
+async def generate_collection(collection_name: str, total: int, users: int, popularity: Popularity,
+                              seed: int, batch_size: int, workers: int) -> int:
+    """Generar e insertar 'total' documentos con como mucho 'workers' lotes en curso a la vez."""
+    from db_connection import DatabaseConnection
+
+    semaphore = asyncio.Semaphore(workers)
+    tasks = []
+    failed = 0
+
+    async def insert(documents):
+        nonlocal failed
+        try:
+            failed += len(await DatabaseConnection.create_documents(collection_name, documents))
+        finally:
+            semaphore.release()
+
+    for start in range(0, total, batch_size):
+        await semaphore.acquire()
+        # Un generador por lote: el resultado no depende del orden en que terminan las inserciones
+        rng = random.Random(f"{seed}-{collection_name}-{start}")
+        documents = GENERATORS[collection_name](rng, start, min(start + batch_size, total), users, popularity)
+        tasks.append(asyncio.create_task(insert(documents)))
+    await asyncio.gather(*tasks)
+    return total - failed
+
+async def seed_database(counts: dict, seed: int = 42, batch_size: int = 5000, workers: int = 8,
+                        drop: bool = False, rollups: bool = True) -> dict:
+    """
+    Generar los documentos de cada colección ({"user": n, "marcador": n, ...}) y devolver
+    cuántos se han insertado. Las referencias a usuarios usan los 'counts["user"]' primeros.
+    """
+    from db_connection import DatabaseConnection
+    from indexes import IndexUtils
+
+    users = counts.get("user", 0)
+    if users == 0:
+        raise ValueError("Hace falta al menos un usuario")
+    popularity = Popularity(users)
+    inserted = {}
+
+    if drop:
+        from visitas_v1 import ROLLUP_COLLECTION
+        for collection_name in [*COLLECTION_CODES, ROLLUP_COLLECTION]:
+            await DatabaseConnection.get_collection(collection_name).drop()
+
+    for collection_name, total in counts.items():
+        start = time.perf_counter()
+        inserted[collection_name] = await generate_collection(collection_name, total, users, popularity,
+                                                              seed, batch_size, workers)
+        seconds = time.perf_counter() - start
+        print(f"{collection_name}: {inserted[collection_name]} documentos en {seconds:.1f} s "
+              f"({inserted[collection_name] / max(seconds, 1e-9):.0f}/s)", file=sys.stderr)
+
+    # Los índices se crean después de la carga, que así es más rápida
+    await IndexUtils.ensure_indexes()
+    if rollups and counts.get("visita"):
+        from rebuild_visit_rollups import rebuild_rollups
+        await rebuild_rollups()
+    return inserted
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="Base de datos en la que generar los datos (no puede ser 'mi-mapa')")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--marcadores", type=int, default=1000000)
+    parser.add_argument("--visitas", type=int, default=10000000)
+    parser.add_argument("--images", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42, help="Semilla: la misma semilla produce los mismos datos")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documentos por insert_many")
+    parser.add_argument("--workers", type=int, default=8, help="Lotes que se insertan a la vez")
+    parser.add_argument("--drop", action="store_true", help="Borrar antes las colecciones")
+    parser.add_argument("--no-rollups", action="store_true", help="No recalcular los contadores de visitas")
+    args = parser.parse_args()
+    if args.db == "mi-mapa":
+        parser.error("Los datos sintéticos no se generan en la base de datos de la aplicación")
+    return args
+
+async def main():
+    args = parse_args()
+    # DB_NAME se lee al importar db_connection
+    os.environ["DB_NAME"] = args.db
+    from db_connection import DatabaseConnection
+
+    try:
+        counts = {"user": args.users, "marcador": args.marcadores, "visita": args.visitas, "image": args.images}
+        await seed_database(counts, args.seed, args.batch_size, args.workers, args.drop, not args.no_rollups)
+    finally:
+        await DatabaseConnection.close_connection()
+
+if __name__ == '__main__':
+    asyncio.run(main())
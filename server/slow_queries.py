@@ -0,0 +1,180 @@
+"""
+Registro de consultas lentas de MongoDB.
+
+SlowQueryListener es un listener de comandos de pymongo (como el de las métricas): las
+consultas que tardan más de SLOW_QUERY_MS se registran una sola vez por forma de consulta
+(filtro, orden y proyección con los valores sustituidos por su tipo) durante
+SLOW_QUERY_REPEAT_SECONDS. La primera vez que aparece una forma se lanza explain() en segundo
+plano y se registran la duración, los documentos y claves examinados frente a los devueltos y
+el plan ganador, marcando los COLLSCAN (consultas que recorren la colección sin índice).
+
+Con SLOW_QUERY_MS=0 el registro se desactiva.
+"""
+import asyncio
+import json
+import logging
+import os
+
+from pymongo import monitoring
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Milisegundos a partir de los que una consulta se considera lenta (0 para desactivar)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+# Segundos durante los que una forma ya registrada no se vuelve a registrar
+SLOW_QUERY_REPEAT_SECONDS = float(os.getenv("SLOW_QUERY_REPEAT_SECONDS", 3600))
+# Formas distintas que se recuerdan a la vez
+SLOW_QUERY_MAX_SHAPES = 1000
+# Lanzar explain() de las consultas lentas (vuelve a ejecutar la consulta en el servidor)
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() not in ("0", "false", "no")
+
+# Comandos que admiten explain y las partes que definen su forma
+EXPLAINABLE_COMMANDS = {
+    "find": ("filter", "sort", "projection"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort", "fields"),
+    "update": ("updates",),
+    "delete": ("deletes",)
+}
+# Campos que el driver añade a cada comando y que no forman parte de la consulta
+DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "apiVersion", "apiStrict",
+                 "apiDeprecationErrors", "$db", "$clusterTime", "$readPreference"}
+
+# Partes que se conservan tal cual: sus valores (sentido del orden, campos incluidos) son parte de la forma
+LITERAL_PARTS = {"sort", "projection", "fields", "key", "$sort", "$project"}
+
+def query_shape(value):
+    """Sustituir los valores de una consulta por su tipo, conservando operadores, campos y órdenes."""
+    if isinstance(value, dict):
+        return {key: item if key in LITERAL_PARTS else query_shape(item) for key, item in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        # Un $in con 3 o con 300 valores tiene la misma forma
+        shapes = []
+        for item in value:
+            shape = query_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return type(value).__name__
+
+def plan_stages(plan) -> list:
+    """Etapas de un plan de ejecución, de fuera a dentro ('FETCH', 'IXSCAN', 'COLLSCAN', ...)."""
+    stages = []
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            stages.append(plan["stage"])
+        for key, item in plan.items():
+            if key != "stage":
+                stages.extend(plan_stages(item))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+def find_key(document, key):
+    """Primer valor de una clave en un documento anidado (el formato de explain cambia según el comando)."""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        items = document.values()
+    elif isinstance(document, list):
+        items = document
+    else:
+        return None
+    for item in items:
+        found = find_key(item, key)
+        if found is not None:
+            return found
+    return None
+
+def summarize_explain(explain: dict) -> dict:
+    """Extraer de la salida de explain el plan ganador y los documentos examinados y devueltos."""
+    stages = plan_stages(find_key(explain, "winningPlan"))
+    stats = find_key(explain, "executionStats") or {}
+    return {
+        "plan": " <- ".join(stages) or "desconocido",
+        "collscan": "COLLSCAN" in stages,
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned")
+    }
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Listener que detecta las consultas lentas y registra su plan de ejecución."""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, explain: bool = SLOW_QUERY_EXPLAIN):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        # Comandos en curso que admiten explain, hasta que llega su evento de fin
+        self._commands = {}
+        # Formas ya registradas; caducan para volver a avisar si la consulta sigue siendo lenta
+        self._seen = TTLCache(SLOW_QUERY_MAX_SHAPES, SLOW_QUERY_REPEAT_SECONDS)
+        # Referencias a las tareas de explain en curso (asyncio solo guarda referencias débiles)
+        self._tasks = set()
+
+    @staticmethod
+    def _key(event):
+        return event.connection_id, event.request_id
+
+    def started(self, event):
+        if event.command_name in EXPLAINABLE_COMMANDS:
+            self._commands[self._key(event)] = event.command
+
+    def succeeded(self, event):
+        command = self._commands.pop(self._key(event), None)
+        if command is None or event.duration_micros / 1000 < self.threshold_ms:
+            return
+
+        collection = command.get(event.command_name)
+        shape = json.dumps({
+            "collection": collection, "command": event.command_name,
+            **query_shape({part: command[part] for part in EXPLAINABLE_COMMANDS[event.command_name] if part in command})
+        }, default=str)
+        if shape in self._seen:
+            return
+        self._seen.set(shape, True)
+
+        duration_ms = event.duration_micros / 1000
+        if not self.explain:
+            logger.warning(f"Consulta lenta ({duration_ms:.1f} ms): {shape}")
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self.log_with_explain(command, shape, duration_ms))
+        except RuntimeError:
+            # Sin bucle de eventos (cliente síncrono) no se puede lanzar explain en segundo plano
+            logger.warning(f"Consulta lenta ({duration_ms:.1f} ms): {shape}")
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def failed(self, event):
+        self._commands.pop(self._key(event), None)
+
+    async def log_with_explain(self, command, shape: str, duration_ms: float):
+        from db_connection import DatabaseConnection
+
+        try:
+            explain = await DatabaseConnection.explain(
+                {key: value for key, value in command.items() if key not in DRIVER_FIELDS}
+            )
+        except Exception as e:
+            logger.warning(f"Consulta lenta ({duration_ms:.1f} ms): {shape}; explain ha fallado: {e}")
+            return
+
+        summary = summarize_explain(explain)
+        warning = " COLLSCAN: la consulta recorre toda la colección, falta un índice." if summary["collscan"] else ""
+        logger.warning(
+            f"Consulta lenta ({duration_ms:.1f} ms): {shape}; documentos examinados {summary['docs_examined']}, "
+            f"claves examinadas {summary['keys_examined']}, devueltos {summary['returned']}; "
+            f"plan: {summary['plan']}.{warning}"
+        )
+
+slow_query_listener = SlowQueryListener()
+
+def event_listeners() -> list:
+    """Listeners que se registran en el cliente de MongoDB."""
+    return [slow_query_listener] if SLOW_QUERY_MS > 0 else []
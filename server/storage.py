@@ -0,0 +1,87 @@
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import cloudinary
+import cloudinary.uploader
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Backend de almacenamiento de las imágenes: 'cloudinary' o 'local'
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")
+# Directorio y prefijo de URL del almacenamiento local
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", str(Path(__file__).resolve().parent / "media"))
+MEDIA_URL = os.getenv("MEDIA_URL", "/media-files")
+# Bytes que se copian en cada lectura al guardar en disco
+COPY_CHUNK_SIZE = 1024 * 1024
+
+class StorageBackend:
+    """
+    Interfaz de los backends de almacenamiento de imágenes.
+
+    Los métodos son bloqueantes (E/S de red o de disco): se llaman desde un executor,
+    nunca directamente desde el bucle de eventos.
+    """
+    name = None
+
+    def save(self, file: BinaryIO, filename: str, content_type: Optional[str] = None) -> dict:
+        """Guardar el contenido de un fichero y devolver {"url", "publicId"}."""
+        raise NotImplementedError
+
+    def delete(self, public_id: str):
+        """Eliminar un fichero guardado a partir de su identificador."""
+        raise NotImplementedError
+
+class CloudinaryStorage(StorageBackend):
+    name = "cloudinary"
+
+    def __init__(self):
+        cloudinary.config(
+            cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key = os.getenv("CLOUDINARY_API_KEY"),
+            api_secret = os.getenv("CLOUDINARY_API_SECRET"),
+            secure=True
+        )
+
+    def save(self, file: BinaryIO, filename: str, content_type: Optional[str] = None) -> dict:
+        result = cloudinary.uploader.upload(file)
+        return {"url": result["secure_url"], "publicId": result["public_id"]}
+
+    def delete(self, public_id: str):
+        cloudinary.uploader.destroy(public_id)
+
+class LocalStorage(StorageBackend):
+    """Almacenamiento en el sistema de ficheros, para pruebas e instalaciones propias."""
+    name = "local"
+
+    def __init__(self, root: str = MEDIA_ROOT, base_url: str = MEDIA_URL):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def save(self, file: BinaryIO, filename: str, content_type: Optional[str] = None) -> dict:
+        # Nombre aleatorio: el nombre original no se usa como ruta
+        public_id = uuid.uuid4().hex + Path(filename or "").suffix.lower()
+        with open(self.root / public_id, "wb") as destination:
+            shutil.copyfileobj(file, destination, COPY_CHUNK_SIZE)
+        return {"url": f"{self.base_url}/{public_id}", "publicId": public_id}
+
+    def delete(self, public_id: str):
+        (self.root / Path(public_id).name).unlink(missing_ok=True)
+
+_storage = None
+
+def get_storage() -> StorageBackend:
+    """Devolver el backend configurado en STORAGE_BACKEND (se crea la primera vez)."""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "local":
+            _storage = LocalStorage()
+        elif STORAGE_BACKEND == "cloudinary":
+            _storage = CloudinaryStorage()
+        else:
+            raise ValueError(f"Backend de almacenamiento desconocido: {STORAGE_BACKEND}")
+    return _storage
@@ -0,0 +1,61 @@
+from typing import AsyncIterator, Dict, Optional
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from json_response import dumps
+
+# Bytes que se acumulan antes de enviar un fragmento de la respuesta
+CHUNK_SIZE = 64 * 1024
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json"
+}
+
+class StreamUtils:
+
+    @classmethod
+    async def ndjson(cls, documents: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+        """Convertir un iterador de documentos en fragmentos NDJSON (un documento por línea)."""
+        buffer = []
+        size = 0
+        async for document in documents:
+            line = dumps(document) + b"\n"
+            buffer.append(line)
+            size += len(line)
+            if size >= CHUNK_SIZE:
+                yield b"".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield b"".join(buffer)
+
+    @classmethod
+    async def json_array(cls, documents: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+        """Convertir un iterador de documentos en fragmentos de un único array JSON."""
+        buffer = [b"["]
+        size = 1
+        first = True
+        async for document in documents:
+            item = dumps(document) if first else b"," + dumps(document)
+            first = False
+            buffer.append(item)
+            size += len(item)
+            if size >= CHUNK_SIZE:
+                yield b"".join(buffer)
+                buffer, size = [], 0
+        buffer.append(b"]")
+        yield b"".join(buffer)
+
+    @classmethod
+    def check_format(cls, format: str) -> str:
+        """Verificar que el formato de la respuesta en streaming es conocido."""
+        if format not in STREAM_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Formato no soportado. Usa uno de: {', '.join(STREAM_FORMATS)}")
+        return format
+
+    @classmethod
+    def response(cls, documents: AsyncIterator[dict], format: str = "json",
+                 headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+        """Construir una respuesta en streaming (NDJSON o array JSON) a partir de los documentos."""
+        body = cls.ndjson(documents) if format == "ndjson" else cls.json_array(documents)
+        return StreamingResponse(body, status_code=200, media_type=STREAM_FORMATS[format], headers=headers)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Los módulos del servidor se importan por su nombre, como en app.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from bson.objectid import ObjectId
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+import marcadores_v1
+from api_utils import APIUtils, MAX_BATCH_IDS
+from db_connection import DatabaseConnection
+
+IDS = ["6ad4bb1773e5e0ad5950e993", "6ad4bb1773e5e0ad5950e991", "6ad4bb1773e5e0ad5950e994", "6ad4bb1773e5e0ad5950e992"]
+STORED = {IDS[1], IDS[3]}
+
+@pytest.fixture
+def client(monkeypatch):
+    """Cliente de la API de marcadores con una colección que solo tiene STORED, devueltos en otro orden."""
+    async def query_document(collection_name, document_query, projection=None, sort_criteria=None, skip=0, limit=0, id_list=None):
+        found = [{"_id": id, "lugar": str(id)} for id in id_list if str(id) in STORED]
+        return list(reversed(found))
+
+    monkeypatch.setattr(DatabaseConnection, "query_document", query_document)
+    app = FastAPI()
+    app.include_router(marcadores_v1.router, prefix="/api/v1")
+    return TestClient(app)
+
+def test_documents_and_missing_ids_follow_the_requested_order(monkeypatch):
+    async def query_document(collection_name, document_query, projection=None, sort_criteria=None, skip=0, limit=0, id_list=None):
+        return [{"_id": ObjectId(id)} for id in reversed(IDS) if id in STORED]
+
+    monkeypatch.setattr(DatabaseConnection, "query_document", query_document)
+    found, missing = asyncio.run(DatabaseConnection.read_documents_ids("marcador", IDS))
+    assert [str(document["_id"]) for document in found] == [IDS[1], IDS[3]]
+    assert missing == [IDS[0], IDS[2]]
+
+def test_get_by_ids_reports_missing_ids_in_order(client):
+    response = client.get("/api/v1/marcadores", params={"ids": ",".join(IDS)}, headers={"Accept": "application/json"})
+    assert response.status_code == 200
+    assert [marcador["_id"] for marcador in response.json()] == [IDS[1], IDS[3]]
+    assert response.headers["X-Missing-Ids"] == f"{IDS[0]},{IDS[2]}"
+    assert response.headers["X-Total-Count"] == "2"
+
+def test_batch_post_reports_missing_ids_in_order(client):
+    response = client.post("/api/v1/marcadores/batch", json={"ids": [IDS[2], IDS[3], IDS[0]]})
+    assert response.status_code == 200
+    assert [marcador["_id"] for marcador in response.json()] == [IDS[3]]
+    assert response.headers["X-Missing-Ids"] == f"{IDS[2]},{IDS[0]}"
+
+def test_no_missing_header_when_all_ids_exist(client):
+    response = client.post("/api/v1/marcadores/batch", json={"ids": [IDS[3], IDS[1]]})
+    assert [marcador["_id"] for marcador in response.json()] == [IDS[3], IDS[1]]
+    assert "X-Missing-Ids" not in response.headers
+
+def test_parse_ids_normalizes_and_deduplicates_in_order():
+    assert APIUtils.parse_ids(f" {IDS[1].upper()} ,{IDS[0]},,{IDS[1]}") == [IDS[1], IDS[0]]
+
+def test_parse_ids_rejects_invalid_and_too_many_ids():
+    with pytest.raises(HTTPException) as error:
+        APIUtils.parse_ids([IDS[0], "no-es-un-id"])
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        APIUtils.parse_ids([IDS[0]] * (MAX_BATCH_IDS + 1))
+    assert error.value.status_code == 400
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+from bson.objectid import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import bulk_utils
+import marcadores_v1
+from db_connection import DatabaseConnection
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+def marcador(lugar, lat=36.72):
+    return {"lugar": lugar, "lat": lat, "lon": -4.42, "creador": "ana@example.com", "imagen": "https://example.com/a.jpg"}
+
+@pytest.fixture
+def inserted(monkeypatch):
+    """Documentos insertados por lote; los de lugar 'duplicado' fallan como lo haría MongoDB."""
+    batches = []
+
+    async def create_documents(collection_name, documents, ordered=False):
+        failed = {}
+        for position, document in enumerate(documents):
+            document["_id"] = ObjectId()
+            if document["lugar"] == "duplicado":
+                failed[position] = "E11000 duplicate key error"
+        batches.append([document["lugar"] for document in documents])
+        return failed
+
+    monkeypatch.setattr(DatabaseConnection, "create_documents", create_documents)
+    return batches
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(marcadores_v1.router, prefix="/api/v1")
+    return TestClient(app)
+
+def test_ndjson_rows_report_their_own_errors(client, inserted, monkeypatch):
+    monkeypatch.setattr(bulk_utils, "BULK_BATCH_SIZE", 2)
+    rows = [
+        json.dumps(marcador("Málaga")),
+        "{no es json",
+        json.dumps(marcador("Sevilla", lat="norte")),
+        json.dumps(marcador("duplicado")),
+        json.dumps(marcador("Cádiz")),
+    ]
+
+    response = client.post("/api/v1/marcadores:bulk", content="\n".join(rows) + "\n", headers=NDJSON)
+
+    assert response.status_code == 207
+    summary = response.json()
+    assert summary["created"] == 2 and summary["failed"] == 3
+    assert [result["index"] for result in summary["results"]] == [0, 1, 2, 3, 4]
+    assert [result["status"] for result in summary["results"]] == ["created", "error", "error", "error", "created"]
+    assert summary["results"][2]["detail"][0]["loc"] == ["lat"]
+    assert "duplicate key" in summary["results"][3]["detail"]
+    assert all(len(summary["results"][index]["_id"]) == 24 for index in (0, 4))
+    # Solo las filas válidas llegan a MongoDB, en lotes de BULK_BATCH_SIZE
+    assert inserted == [["Málaga", "duplicado"], ["Cádiz"]]
+
+def test_json_array_without_errors_returns_201(client, inserted):
+    response = client.post("/api/v1/marcadores:bulk", json=[marcador("Málaga"), marcador("Cádiz")])
+
+    assert response.status_code == 201
+    assert response.json()["created"] == 2
+    assert inserted == [["Málaga", "Cádiz"]]
+
+def test_unsupported_content_type_is_rejected(client, inserted):
+    response = client.post("/api/v1/marcadores:bulk", content="lugar,lat", headers={"Content-Type": "text/csv"})
+
+    assert response.status_code == 415
+    assert inserted == []
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import marcadores_v1
+from api_utils import APIUtils
+from db_connection import DatabaseConnection
+
+# Las fechas llegan de MongoDB sin zona horaria (en UTC), como las devuelve el driver
+LAST_KEY = ["Málaga", datetime(2025, 3, 1, 12, 30), ObjectId("6ad4bb1773e5e0ad5950e996")]
+HEADERS = {"Accept": "application/json"}
+
+def make_client(monkeypatch):
+    """Cliente de la API de marcadores cuyo query_page guarda el 'after' recibido."""
+    calls = []
+
+    async def query_page(collection_name, query, projection, sort_criteria, offset, limit, after, count, keyset=None):
+        calls.append(after)
+        return [{"_id": LAST_KEY[-1], "lugar": LAST_KEY[0]}], (LAST_KEY if after is None else None), None
+
+    monkeypatch.setattr(DatabaseConnection, "query_page", query_page)
+    app = FastAPI()
+    app.include_router(marcadores_v1.router, prefix="/api/v1")
+    return TestClient(app), calls
+
+def test_cursor_round_trip_keeps_key_types():
+    sort_criteria = [("lugar", 1), ("updatedAt", 1)]
+    cursor = APIUtils.encode_cursor(sort_criteria, LAST_KEY)
+    assert APIUtils.decode_cursor(cursor, sort_criteria) == LAST_KEY
+
+def test_next_cursor_is_accepted_by_the_next_request(monkeypatch):
+    client, calls = make_client(monkeypatch)
+
+    first = client.get("/api/v1/marcadores", params={"sort": "lugar,updatedAt", "count": "false"}, headers=HEADERS)
+    assert first.status_code == 200
+    cursor = first.headers["X-Next-Cursor"]
+    assert f"cursor={cursor}" in first.headers["Link"]
+
+    second = client.get("/api/v1/marcadores", params={"sort": "lugar,updatedAt", "count": "false", "cursor": cursor},
+                        headers=HEADERS)
+    assert second.status_code == 200
+    assert calls == [None, LAST_KEY]
+    # Última página: sin cursor siguiente
+    assert "X-Next-Cursor" not in second.headers
+
+def test_invalid_cursors_are_rejected(monkeypatch):
+    client, calls = make_client(monkeypatch)
+    cursor = APIUtils.encode_cursor([("lugar", 1)], LAST_KEY[:1])
+
+    for params in (
+        {"cursor": "no-es-un-cursor"},
+        {"cursor": APIUtils.encode_cursor(None, LAST_KEY)[:-4]},
+        # Cursor de otra ordenación
+        {"cursor": cursor, "sort": "creador"},
+        {"cursor": cursor},
+        # Cursor y desplazamiento a la vez
+        {"cursor": cursor, "sort": "lugar", "offset": 10},
+    ):
+        response = client.get("/api/v1/marcadores", params=params, headers=HEADERS)
+        assert response.status_code == 400, params
+    assert calls == []
@@ -0,0 +1,55 @@
+import asyncio
+
+from bson.objectid import ObjectId
+
+from db_connection import DatabaseConnection
+
+DOCUMENT_ID = "6ad4bb1773e5e0ad5950e996"
+
+class SlowCollection:
+    """Colección cuyo find_one devuelve el documento leído al empezar, cuando se libera 'release'."""
+
+    def __init__(self, document):
+        self.document = document
+        self.release = asyncio.Event()
+
+    async def find_one(self, query, projection=None):
+        snapshot = dict(self.document)
+        await self.release.wait()
+        return snapshot
+
+def use_collection(monkeypatch, collection):
+    monkeypatch.setattr(DatabaseConnection, "get_collection", classmethod(lambda cls, name: collection))
+    DatabaseConnection._document_cache.clear()
+
+def test_read_during_invalidation_is_not_cached(monkeypatch):
+    collection = SlowCollection({"_id": ObjectId(DOCUMENT_ID), "name": "antes"})
+    use_collection(monkeypatch, collection)
+
+    async def scenario():
+        read = asyncio.create_task(DatabaseConnection.read_document_id("user", DOCUMENT_ID))
+        await asyncio.sleep(0)
+        # La escritura termina mientras la lectura sigue pendiente
+        collection.document["name"] = "después"
+        DatabaseConnection.invalidate_document("user", DOCUMENT_ID)
+        collection.release.set()
+        stale = await read
+
+        fresh = await DatabaseConnection.read_document_id("user", DOCUMENT_ID)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale["name"] == "antes"
+    assert fresh["name"] == "después"
+
+def test_read_without_invalidation_is_cached(monkeypatch):
+    collection = SlowCollection({"_id": ObjectId(DOCUMENT_ID), "name": "antes"})
+    collection.release.set()
+    use_collection(monkeypatch, collection)
+
+    async def scenario():
+        await DatabaseConnection.read_document_id("user", DOCUMENT_ID)
+        collection.document["name"] = "después"
+        return await DatabaseConnection.read_document_id("user", DOCUMENT_ID)
+
+    assert asyncio.run(scenario())["name"] == "antes"
@@ -0,0 +1,38 @@
+from db_connection import DatabaseConnection
+
+def test_single_field():
+    assert DatabaseConnection._build_keyset_query([("_id", 1)], ["a"]) == {"_id": {"$gt": "a"}}
+
+def test_ties_are_broken_by_the_following_fields():
+    query = DatabaseConnection._build_keyset_query([("lugar", 1), ("_id", 1)], ["Madrid", "a"])
+    assert query == {"$or": [
+        {"lugar": {"$gt": "Madrid"}},
+        {"lugar": "Madrid", "_id": {"$gt": "a"}}
+    ]}
+
+def test_descending_value_continues_with_null_values():
+    query = DatabaseConnection._build_keyset_query([("lugar", -1), ("_id", 1)], ["Madrid", "a"])
+    assert query == {"$or": [
+        {"$or": [{"lugar": {"$lt": "Madrid"}}, {"lugar": None}]},
+        {"lugar": "Madrid", "_id": {"$gt": "a"}}
+    ]}
+
+def test_null_key_ascending_continues_with_non_null_values():
+    query = DatabaseConnection._build_keyset_query([("imagen", 1), ("_id", 1)], [None, "a"])
+    assert query == {"$or": [
+        {"imagen": {"$ne": None}},
+        {"imagen": None, "_id": {"$gt": "a"}}
+    ]}
+
+def test_null_key_descending_only_continues_with_ties():
+    query = DatabaseConnection._build_keyset_query([("imagen", -1), ("_id", 1)], [None, "a"])
+    assert query == {"imagen": None, "_id": {"$gt": "a"}}
+
+def test_null_key_in_the_middle_of_the_sort():
+    query = DatabaseConnection._build_keyset_query(
+        [("lugar", 1), ("imagen", 1), ("_id", 1)], ["Madrid", None, "a"])
+    assert query == {"$or": [
+        {"lugar": {"$gt": "Madrid"}},
+        {"lugar": "Madrid", "imagen": {"$ne": None}},
+        {"lugar": "Madrid", "imagen": None, "_id": {"$gt": "a"}}
+    ]}
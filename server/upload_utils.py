@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import BinaryIO, Optional
+from fastapi import HTTPException, UploadFile
+
+from storage import StorageBackend, get_storage
+
+# Subidas simultáneas al backend de almacenamiento (hilos del executor)
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 8))
+# Segundos que una subida puede esperar a que quede un hilo libre antes de responder 503
+UPLOAD_QUEUE_TIMEOUT = float(os.getenv("UPLOAD_QUEUE_TIMEOUT", 10))
+# Bytes que se leen de cada subida en cada paso (y se añaden al hash del contenido)
+READ_CHUNK_SIZE = 1024 * 1024
+# Tamaño máximo de un fichero subido; el contenido se guarda entero en memoria para hashearlo y
+# generar las derivadas, así que sin límite una sola subida podría agotar la memoria del proceso
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+
+class UploadUtils:
+    """
+    Subida de ficheros fuera del bucle de eventos.
+
+    Las llamadas bloqueantes del backend se ejecutan en un ThreadPoolExecutor de UPLOAD_WORKERS
+    hilos. Un semáforo del mismo tamaño limita las subidas en curso, de modo que las demás
+    esperan en el bucle de eventos (como mucho UPLOAD_QUEUE_TIMEOUT segundos) y no en la cola
+    sin límite del executor.
+    """
+    _executor = None
+    _semaphore = None
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+            cls._semaphore = asyncio.Semaphore(UPLOAD_WORKERS)
+        return cls._executor
+
+    @classmethod
+    async def run(cls, function, *args):
+        """Ejecutar una función bloqueante en el executor de subidas, respetando el límite de concurrencia."""
+        executor = cls.get_executor()
+        try:
+            await asyncio.wait_for(cls._semaphore.acquire(), UPLOAD_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Hay demasiadas subidas en curso. Inténtalo de nuevo",
+                                headers={"Retry-After": "5"})
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, partial(function, *args))
+        finally:
+            cls._semaphore.release()
+
+    @classmethod
+    async def read(cls, file: UploadFile, chunk_size: int = READ_CHUNK_SIZE, max_bytes: int = MAX_UPLOAD_BYTES) -> tuple:
+        """
+        Leer un fichero subido por bloques, calculando a la vez su hash SHA-256. Devuelve (bytes, hash).
+        Responde 413 en cuanto el fichero supera max_bytes, sin leer el resto.
+        """
+        content_hash = hashlib.sha256()
+        chunks = []
+        size = 0
+        while chunk := await file.read(chunk_size):
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"El fichero supera el tamaño máximo de {max_bytes // (1024 * 1024)} MB")
+            content_hash.update(chunk)
+            chunks.append(chunk)
+        return b"".join(chunks), content_hash.hexdigest()
+
+    @classmethod
+    async def upload(cls, file: BinaryIO, filename: str, content_type: Optional[str] = None,
+                     storage: Optional[StorageBackend] = None) -> dict:
+        """Guardar un fichero en el backend (por defecto, el configurado) y devolver {"url", "publicId"}."""
+        storage = storage or get_storage()
+        return await cls.run(storage.save, file, filename, content_type)
+
+    @classmethod
+    async def discard(cls, public_ids: list, storage: Optional[StorageBackend] = None):
+        """Eliminar del backend ficheros ya subidos (p. ej. los de una subida que resulta duplicada)."""
+        storage = storage or get_storage()
+        await asyncio.gather(*[cls.run(storage.delete, public_id) for public_id in public_ids])
+
+    @classmethod
+    async def shutdown(cls):
+        """Esperar a que terminen las subidas en curso y cerrar el executor."""
+        if cls._executor is not None:
+            executor, cls._executor = cls._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, partial(executor.shutdown, wait=True))
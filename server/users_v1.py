@@ -1,23 +1,29 @@
 from typing import List
 from fastapi import APIRouter, HTTPException, Query, Request, Path
-from fastapi.responses import JSONResponse
 import json
 from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 from models.user_model import User, Review, UserCreate, UserUpdate, UserDeleteResponse
-from db_connection import DatabaseConnection
+from models.batch_model import BatchIds
+from db_connection import DatabaseConnection, DEFAULT_BATCH_SIZE
 from api_utils import APIUtils
+from indexes import IndexUtils
+from json_response import FastJSONResponse
+from stream_utils import StreamUtils
 from fastapi import Path, HTTPException
-from fastapi.responses import JSONResponse
 
 router = APIRouter()
 
 endpoint_name = "users"
 version = "v1"
+# Índice único declarado en indexes.py para los nombres de usuario
+USERNAME_INDEX = [("userName", 1)]
 
 @router.get("/" + endpoint_name, tags=["user CRUD endpoints"], response_model=List[User])
 async def get_users(
     request: Request,
+    ids: str | None = Query(None, description="IDs de los usuarios a devolver, separados por comas"),
     email: str | None = Query(None, description="Email del usuario"),
     name: str | None = Query(None, description="Nombre del usuario"),
     surname: str | None = Query(None, description="Apellido del usuario"),
@@ -30,10 +36,14 @@ async def get_users(
     fields: str | None = Query(None, description="Campos específicos a devolver"),
     sort: str | None = Query(None, description="Campos por los que ordenar, separados por comas"),
     offset: int = Query(default=0, description="Índice de inicio para los resultados de la paginación"),
+    cursor: str | None = Query(None, description="Cursor opaco de la página siguiente (cabecera X-Next-Cursor)"),
     limit: int = Query(default=10, description="Cantidad de usuarios a devolver, por defecto 10"),
+    count: bool = Query(default=True, description="Calcular el total (X-Total-Count); con count=false no se cuenta"),
     hateoas: bool | None = Query(None, description="Incluir enlaces HATEOAS")
 ):
     APIUtils.check_accept_json(request)
+    after = APIUtils.check_cursor(cursor, sort, offset)
+    id_list = APIUtils.parse_ids(ids)
 
     try:
         projection = APIUtils.build_projection(fields)
@@ -57,20 +67,57 @@ async def get_users(
         if userName is not None:
             query["userName"] = userName
 
+        if id_list:
+            users, missing = await DatabaseConnection.read_documents_ids("user", id_list, projection, query)
+            if hateoas:
+                for user in users:
+                    user["href"] = f"/api/{version}/{endpoint_name}/{user['_id']}"
+            return APIUtils.conditional_response(request, users, APIUtils.batch_headers(users, missing))
 
-        users = DatabaseConnection.query_document("user", query, projection, sort_criteria, offset, limit)
-
-        total_count = len(users)
+        users, last_key, total_count = await DatabaseConnection.query_page(
+            "user", query, projection, sort_criteria, offset, limit, after, count
+        )
 
         if hateoas:
             for user in users:
                 user["href"] = f"/api/{version}/{endpoint_name}/{user['_id']}"
 
-        return JSONResponse(status_code=200, content=users, 
-                            headers={"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)})
+        return APIUtils.conditional_response(request, users,
+                            headers={"Accept-Encoding": "gzip", **APIUtils.total_count_headers(total_count),
+                                     **APIUtils.next_page_headers(request, sort_criteria, last_key)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al buscar el usuario: {str(e)}")
 
+@router.get("/" + endpoint_name + "/export", tags=["user export endpoints"])
+async def export_users(
+    format: str = Query(default="ndjson", description="Formato de la exportación: 'ndjson' o 'json' (array)"),
+    fields: str | None = Query(None, description="Campos específicos a devolver"),
+    batch_size: int = Query(default=DEFAULT_BATCH_SIZE, ge=1, le=10000, description="Documentos por lote leídos de MongoDB")
+):
+    StreamUtils.check_format(format)
+    try:
+        # Los tokens de autenticación no se exportan salvo que se pidan explícitamente en 'fields'
+        projection = APIUtils.build_projection(fields) or {"oauthToken": 0}
+        users = DatabaseConnection.stream_documents("user", projection=projection, batch_size=batch_size)
+        return StreamUtils.response(users, format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al exportar los usuarios: {str(e)}")
+
+@router.post("/" + endpoint_name + "/batch", tags=["user CRUD endpoints"], response_model=List[User])
+async def get_users_batch(request: Request,
+                        batch: BatchIds,
+                        fields: str | None = Query(None, description="Campos específicos a devolver")):
+    APIUtils.check_content_type_json(request)
+    id_list = APIUtils.parse_ids(batch.ids) or []
+
+    try:
+        users, missing = await DatabaseConnection.read_documents_ids("user", id_list, APIUtils.build_projection(fields))
+
+        return FastJSONResponse(status_code=200, content=users,
+                            headers=APIUtils.batch_headers(users, missing))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener los usuarios: {str(e)}")
+
 @router.get("/" + endpoint_name + "/{id}", tags=["user CRUD endpoints"], response_model=User)
 async def get_users_by_id(request: Request,
                         id: str = Path(description="ID del usuario", min_length=24, max_length=24),
@@ -85,11 +132,11 @@ async def get_users_by_id(request: Request,
             projection["oauthId"] = 1
             projection["oauthProvider"] = 1      
         
-        user = DatabaseConnection.read_document_id("user", id, projection)
+        user = await DatabaseConnection.read_document_id("user", id, projection)
         if user is None:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
 
-        return JSONResponse(status_code=200, content=user,
+        return APIUtils.conditional_response(request, user,
                             headers={"Content-Type": "application/json", "X-Total-Count": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener el usuario: {str(e)}")
@@ -100,52 +147,28 @@ async def add_review_to_user(review: Review, id: str = Path(description="ID del
     APIUtils.check_id(id)
 
     try:
-        review_dict = review.model_dump()
         if review.user is None or review.rating is None:
-            return JSONResponse(status_code=400, content={"detail": "El usuario y la valoración son obligatorios"}) 
+            return FastJSONResponse(status_code=400, content={"detail": "El usuario y la valoración son obligatorios"}) 
         if review.rating < 1 or review.rating > 5:
-            return JSONResponse(status_code=400, content={"detail": "La valoración debe estar entre 1 y 5"})
-        
-        user = DatabaseConnection.read_document_id("user", id)
-        if user is None:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
-        reviwer = DatabaseConnection.read_document_id("user", review_dict["user"])
+            return FastJSONResponse(status_code=400, content={"detail": "La valoración debe estar entre 1 y 5"})
+        if not APIUtils.is_valid_objectid(review.user):
+            return FastJSONResponse(status_code=400, content={"detail": "El ID del usuario de la review no es válido"})
+
+        reviwer = await DatabaseConnection.read_document_id("user", review.user, {"_id": 1})
         if reviwer is None:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con ID {review_dict['user']} no encontrado"})
-
-        if not user["reviews"]:  # Si user["reviews"] está vacío
-            user["reviews"].append(review_dict)
-        else:
-            review_found = False
-            for i in range(len(user["reviews"])):
-                if user["reviews"][i]["user"] == review_dict["user"]:
-                    user["reviews"][i] = review_dict  
-                    review_found = True
-                    break  
-            if not review_found:
-                user["reviews"].append(review_dict)  
-
-
-        #convertir a obejct id todos los usuarios de las reviews
-        for i in range(len(user["reviews"])):
-            user["reviews"][i]["user"] = ObjectId(user["reviews"][i]["user"])
-
-        changes = {"reviews": user["reviews"]}
-        upadatedUser = DatabaseConnection.update_document("user", id, changes)
-        reviews = upadatedUser["reviews"]
-        if len(reviews) == 0:
-            return JSONResponse(status_code=200, content={"detail": "El usuario no tiene reviews", "average": 0})
-        
-        total = 0
-        for review in reviews:
-            total += review["rating"]
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con ID {review.user} no encontrado"})
 
-        average = total / len(reviews)
-        average = round(average, 2)
-        newReview = {"totalRates": len(reviews), "ratingAverage": average}
-        
-    
-        return JSONResponse(status_code=200, content=newReview,
+        # Insertar o reemplazar la review y actualizar los agregados en una sola operación atómica
+        updated_user = await DatabaseConnection.update_document_id_pipeline(
+            "user", id, build_review_upsert_pipeline(ObjectId(review.user), review.rating),
+            {"totalRates": 1, "ratingAverage": 1}
+        )
+        if updated_user is None:
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
+
+        newReview = {"totalRates": updated_user["totalRates"], "ratingAverage": updated_user["ratingAverage"]}
+
+        return FastJSONResponse(status_code=200, content=newReview,
                             headers={"Content-Type": "application/json", "X-Total-Count": "1"})
 
        
@@ -154,25 +177,22 @@ async def add_review_to_user(review: Review, id: str = Path(description="ID del
 
 #obtener media de las reviews de un usuario
 @router.get("/" + endpoint_name + "/{id}/review-average", tags=["user CRUD endpoints"], response_model=User)
-async def get_review_average(id: str = Path(description="ID del usuario", min_length=24, max_length=24)):
+async def get_review_average(request: Request, id: str = Path(description="ID del usuario", min_length=24, max_length=24)):
     APIUtils.check_id(id)
 
     try:
-        user = DatabaseConnection.read_document_id("user", id)
+        user = await DatabaseConnection.read_document_id("user", id, {"totalRates": 1, "ratingAverage": 1})
         if user is None:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
+        if "totalRates" not in user:
+            # Usuario anterior a los agregados: calcularlos a partir de sus reviews
+            user = await DatabaseConnection.read_document_id("user", id, {"reviews": 1})
 
-        reviews = user["reviews"]
-        if len(reviews) == 0:
-            return JSONResponse(status_code=200, content={"detail": "El usuario no tiene reviews", "average": 0})
-        
-        total = 0
-        for review in reviews:
-            total += review["rating"]
-        
-        average = total / len(reviews)
-        average = round(average, 2)
-        return JSONResponse(status_code=200, content={"detail": f"La media de las reviews del usuario {id} es {average}", "average": average})
+        total_rates, average = review_summary(user)
+        if total_rates == 0:
+            return APIUtils.conditional_response(request, {"detail": "El usuario no tiene reviews", "average": 0})
+
+        return APIUtils.conditional_response(request, {"detail": f"La media de las reviews del usuario {id} es {average}", "average": average})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener la media de las reviews: {str(e)}")
 
@@ -182,14 +202,23 @@ async def create_users(user: UserCreate, request: Request):
 
     try:
         body_dict = user.model_dump()
-        if not check_unique_username(body_dict["userName"]):
-            return JSONResponse(status_code=400, content={"detail": "El nombre de usuario ya existe"})
         body_dict["wantEmails"] = True
         body_dict["reviews"] = []
+        body_dict["ratingSum"] = 0
+        body_dict["totalRates"] = 0
+        body_dict["ratingAverage"] = 0
+
+        # Mientras no conste el índice único de userName (se crea en segundo plano y puede fallar,
+        # p. ej. si ya hay nombres repetidos) se comprueba antes de insertar
+        if not IndexUtils.is_confirmed("user", USERNAME_INDEX) and await username_exists(body_dict["userName"]):
+            return FastJSONResponse(status_code=400, content={"detail": "El nombre de usuario ya existe"})
 
-        DatabaseConnection.create_document("user", body_dict)
-        return JSONResponse(status_code=201, content={"detail": "El usuario se ha creado correctamente", "result": body_dict},
+        await DatabaseConnection.create_document("user", body_dict)
+        return FastJSONResponse(status_code=201, content={"detail": "El usuario se ha creado correctamente", "result": body_dict},
                             headers={"Location": f"/api/{version}/{endpoint_name}/{body_dict['_id']}"} )
+    except DuplicateKeyError:
+        # Con el índice único confirmado, la unicidad de userName la garantiza la base de datos
+        return FastJSONResponse(status_code=400, content={"detail": "El nombre de usuario ya existe"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear el usuario: {str(e)}")
 
@@ -198,11 +227,31 @@ async def update_users(user: UserUpdate, id: str = Path(description="ID del usua
     APIUtils.check_id(id)
 
     try:
-        updated_fields = user.model_dump()
-        if "userName" in updated_fields and not check_unique_username(updated_fields["userName"]):
-            return JSONResponse(status_code=400, content={"detail": "El nombre de usuario ya existe"})
-        DatabaseConnection.update_document("user", id, updated_fields)
-        return JSONResponse(status_code=200, content={"detail": f"El usuario ({id}) se ha actualizado correctamente."})
+        # Solo los campos enviados: 'reviews' tiene valor por defecto y no debe pisar las existentes
+        updated_fields = user.model_dump(exclude_unset=True)
+        if not updated_fields:
+            # MongoDB rechaza un $set vacío
+            return FastJSONResponse(status_code=400, content={"detail": "No has especificado ningún campo del usuario"})
+        if "reviews" in updated_fields:
+            for review in updated_fields["reviews"]:
+                if review["user"] is None or review["rating"] is None:
+                    return FastJSONResponse(status_code=400, content={"detail": "El usuario y la valoración son obligatorios"})
+                if review["rating"] < 1 or review["rating"] > 5:
+                    return FastJSONResponse(status_code=400, content={"detail": "La valoración debe estar entre 1 y 5"})
+                if not APIUtils.is_valid_objectid(review["user"]):
+                    return FastJSONResponse(status_code=400, content={"detail": "El ID del usuario de la review no es válido"})
+                # Mismo tipo que guarda POST /review, que identifica al autor por ObjectId
+                review["user"] = ObjectId(review["user"])
+
+            # Reemplazar las reviews obliga a recalcular sus agregados
+            ratings = [review["rating"] for review in updated_fields["reviews"]]
+            updated_fields["ratingSum"] = sum(ratings)
+            updated_fields["totalRates"] = len(ratings)
+            updated_fields["ratingAverage"] = round(sum(ratings) / len(ratings), 2) if ratings else 0
+        await DatabaseConnection.update_document_id("user", id, updated_fields)
+        return FastJSONResponse(status_code=200, content={"detail": f"El usuario ({id}) se ha actualizado correctamente."})
+    except DuplicateKeyError:
+        return FastJSONResponse(status_code=400, content={"detail": "El nombre de usuario ya existe"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar el usuario: {str(e)}")
 
@@ -222,11 +271,11 @@ async def get_users_by_oauthId(request: Request,
         if oauthProvider is not None:
             query["oauthProvider"] = oauthProvider
         
-        user = DatabaseConnection.query_document("user", query, projection)
+        user = await DatabaseConnection.query_document("user", query, projection)
         if user is None or len(user) == 0:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con oauthId {oauthId} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con oauthId {oauthId} no encontrado"})
 
-        return JSONResponse(status_code=200, content=user,
+        return APIUtils.conditional_response(request, user,
                             headers={"Content-Type": "application/json", "X-Total-Count": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener el usuario: {str(e)}")
@@ -236,52 +285,44 @@ async def delete_users(id: str = Path(description="ID del usuario", min_length=2
     APIUtils.check_id(id)
 
     try:
-        count = DatabaseConnection.delete_document("user", id)
+        count = await DatabaseConnection.delete_document_id("user", id)
         if count == 0:
-            return JSONResponse(status_code=404, content={"detail": "No se ha encontrado un usuario con ese ID. No se ha borrado nada."})
+            return FastJSONResponse(status_code=404, content={"detail": "No se ha encontrado un usuario con ese ID. No se ha borrado nada."})
 
-        return JSONResponse(status_code=200, content={"detail": f"El usuario ({id}) se ha eliminado correctamente."})
+        return FastJSONResponse(status_code=200, content={"detail": f"El usuario ({id}) se ha eliminado correctamente."})
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar el usuario: {str(e)}")
 
 #obtrenr perfil completo con reviews totales y media
 @router.get("/" + endpoint_name + "/{id}/profile", tags=["user CRUD endpoints"], response_model=User)
-async def get_user_profile(id: str = Path(description="ID del usuario", min_length=24, max_length=24)):
+async def get_user_profile(request: Request, id: str = Path(description="ID del usuario", min_length=24, max_length=24)):
     APIUtils.check_id(id)
     projection = {}
     projection["oauthId"] = 0
-    projection["oauthProvider"] = 0      
-    
-    
+    projection["oauthProvider"] = 0
+    # El resumen de las valoraciones está en los agregados: no se lee el array de reviews, que no tiene límite
+    projection["reviews"] = 0
+
     try:
-        user = DatabaseConnection.read_document_id("user", id, projection)
+        user = await DatabaseConnection.read_document_id("user", id, projection)
         if user is None:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
-
-        reviews = user["reviews"]
-        if len(reviews) == 0:
-            user["ratingAverage"] = 0
-            user["totalRates"] = 0
-            return JSONResponse(status_code=200, content=user,
-                            headers={"Content-Type": "application/json", "X-Total-Count": "1"})        
-        total = 0
-        for review in reviews:
-            total += review["rating"]
-        
-        average = total / len(reviews)
-        average = round(average, 2)
-        user["ratingAverage"] = average
-        user["totalRates"] = len(reviews)
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
+
+        summary_source = user
+        if "totalRates" not in user:
+            # Usuario anterior a los agregados: calcularlos a partir de sus reviews
+            summary_source = await DatabaseConnection.read_document_id("user", id, {"reviews": 1}) or {}
+        user["totalRates"], user["ratingAverage"] = review_summary(summary_source)
 
-        return JSONResponse(status_code=200, content=user,
+        return APIUtils.conditional_response(request, user,
                             headers={"Content-Type": "application/json", "X-Total-Count": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener el perfil completo del usuario: {str(e)}")
 
 @router.options("/" + endpoint_name, tags=["user OPTIONS endpoints"])
 async def options_notifications():
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=200,
         content={"methods": ["GET", "OPTIONS"]},
         headers={"Allow": "GET, POST, OPTIONS"}
@@ -289,16 +330,58 @@ async def options_notifications():
 
 @router.options("/" + endpoint_name + "/{id}", tags=["user OPTIONS endpoints"])
 async def options_notifications_by_id():
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=200,
         content={"methods": ["GET", "PUT", "DELETE", "OPTIONS"]},
         headers={"Allow": "GET, PUT, DELETE, OPTIONS"}
     )
 
-#fun to check if the userName is unique
-def check_unique_username(userName):
-    query = {"userName": userName}
-    user = DatabaseConnection.query_document("user", query)
-    if len(user) > 0:
-        return False
-    return True
+async def username_exists(userName):
+    """Comprobar si ya hay un usuario con ese nombre."""
+    users = await DatabaseConnection.query_document("user", {"userName": userName}, {"_id": 1}, limit=1)
+    return len(users) > 0
+
+def review_summary(user):
+    """Devolver (total de valoraciones, media) usando los agregados guardados o, si faltan, las reviews."""
+    if "totalRates" in user:
+        return user["totalRates"], user.get("ratingAverage", 0)
+
+    ratings = [review["rating"] for review in user.get("reviews", [])]
+    if not ratings:
+        return 0, 0
+    return len(ratings), round(sum(ratings) / len(ratings), 2)
+
+def build_review_upsert_pipeline(reviewer_id, rating):
+    """
+    Construir el pipeline que inserta o reemplaza la review de 'reviewer_id' y mantiene
+    ratingSum, totalRates y ratingAverage de forma incremental.
+
+    Todo se evalúa en el servidor dentro de una única actualización, así que las reviews
+    simultáneas de distintos usuarios no se pisan. Los usuarios sin agregados los obtienen
+    a partir de sus reviews actuales la primera vez.
+    """
+    reviews = {"$ifNull": ["$reviews", []]}
+    new_review = {"user": reviewer_id, "rating": rating}
+    return [
+        {"$set": {
+            "_previous": {"$filter": {"input": reviews, "cond": {"$eq": ["$$this.user", reviewer_id]}}}
+        }},
+        {"$set": {
+            "reviews": {"$cond": [
+                {"$gt": [{"$size": "$_previous"}, 0]},
+                {"$map": {"input": reviews, "in": {"$cond": [{"$eq": ["$$this.user", reviewer_id]}, new_review, "$$this"]}}},
+                {"$concatArrays": [reviews, [new_review]]}
+            ]},
+            "ratingSum": {"$add": [
+                {"$ifNull": ["$ratingSum", {"$sum": "$reviews.rating"}]},
+                {"$multiply": [-1, {"$sum": "$_previous.rating"}]},
+                {"$multiply": [rating, {"$max": [1, {"$size": "$_previous"}]}]}
+            ]},
+            "totalRates": {"$add": [
+                {"$ifNull": ["$totalRates", {"$size": reviews}]},
+                {"$cond": [{"$gt": [{"$size": "$_previous"}, 0]}, 0, 1]}
+            ]}
+        }},
+        {"$set": {"ratingAverage": {"$round": [{"$divide": ["$ratingSum", "$totalRates"]}, 2]}}},
+        {"$unset": "_previous"}
+    ]
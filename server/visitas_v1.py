@@ -1,19 +1,38 @@
-from datetime import datetime
+import os
+from collections import Counter
+from datetime import datetime, timedelta
 from typing import List
 from fastapi import APIRouter, HTTPException, Query, Request, Path
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
 
 from bson.objectid import ObjectId
-from models.visita_model import Visita, VisitaCreate, VisitaUpdate, VisitaDeleteResponse
-from db_connection import DatabaseConnection
+from models.visita_model import Visita, VisitaCreate, VisitaUpdate, VisitaDeleteResponse, VisitaStats
+from db_connection import DatabaseConnection, DEFAULT_BATCH_SIZE
 from api_utils import APIUtils
+from json_response import FastJSONResponse
+from bulk_utils import BulkUtils
+from stream_utils import StreamUtils
+from write_buffer import WriteBuffer
 
 router = APIRouter()
 
 endpoint_name = "visitas"
 version = "v1"
 
+# Colección con el número de visitas de cada usuario por hora y por día
+ROLLUP_COLLECTION = "visita_rollup"
+# Granularidades de los contadores y rango por defecto de las estadísticas de cada una
+GRANULARITIES = {
+    "hour": timedelta(days=2),
+    "day": timedelta(days=30)
+}
+
+# Escritura diferida de las visitas: se activa con VISITAS_WRITE_BEHIND=true y entonces
+# POST /visitas responde 202 y las visitas se insertan por lotes
+WRITE_BEHIND = os.getenv("VISITAS_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_MAX_SIZE = int(os.getenv("VISITAS_BUFFER_SIZE", 10000))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("VISITAS_BUFFER_BATCH_SIZE", 500))
+WRITE_BEHIND_INTERVAL = float(os.getenv("VISITAS_BUFFER_INTERVAL", 1.0))
+
 @router.get("/" + endpoint_name, tags=["Visitas CRUD endpoints"], response_model=List[Visita])
 async def get_visitas(
     request: Request,
@@ -22,11 +41,14 @@ async def get_visitas(
     fields: str | None = Query(None, description="Campos específicos a devolver"),
     sort: str | None = Query(None, description="Campos por los que ordenar, separados por comas"),
     offset: int = Query(default=0, description="Índice de inicio para los resultados de la paginación"),
-    limit: int = Query(default=10, description="Cantidad de visitas a devolver, por defecto 10")
+    cursor: str | None = Query(None, description="Cursor opaco de la página siguiente (cabecera X-Next-Cursor)"),
+    limit: int = Query(default=10, description="Cantidad de visitas a devolver, por defecto 10"),
+    count: bool = Query(default=True, description="Calcular el total (X-Total-Count); con count=false no se cuenta")
 ):
     """Obtener todas las visitas con filtros opcionales."""
 
     APIUtils.check_accept_json(request)
+    after = APIUtils.check_cursor(cursor, sort, offset)
 
     try:
         # Construir proyección, criterio de orden y paginación
@@ -40,32 +62,93 @@ async def get_visitas(
         if usuarioVisitante:
             query["usuarioVisitante"] = usuarioVisitante
 
-        visitas = DatabaseConnection.query_document(
-            "visita", query, projection, sort_criteria, offset, limit, hasDate=True
+        visitas, last_key, total_count = await DatabaseConnection.query_page(
+            "visita", query, projection, sort_criteria, offset, limit, after, count
         )
 
-        total_count = DatabaseConnection.count_documents("visita", query)
-
-        return JSONResponse(
-            status_code=200,
-            content=visitas,
-            headers={"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)}
+        return APIUtils.conditional_response(
+            request,
+            visitas,
+            headers={"Accept-Encoding": "gzip", **APIUtils.total_count_headers(total_count),
+                     **APIUtils.next_page_headers(request, sort_criteria, last_key)}
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al buscar las visitas: {str(e)}")
 
 @router.get("/" + endpoint_name + "/email/{email}", tags=["Visitas CRUD endpoints"], response_model=List[Visita])
-async def get_visitas_by_email(email: str = Path(description="Email del usuario visitado")):
-    """Obtener visitas por el email del usuario visitado."""
+async def get_visitas_by_email(
+    email: str = Path(description="Email del usuario visitado"),
+    format: str = Query(default="json", description="Formato de la respuesta: 'json' (array) o 'ndjson'"),
+    batch_size: int = Query(default=DEFAULT_BATCH_SIZE, ge=1, le=10000, description="Documentos por lote leídos de MongoDB")
+):
+    """Obtener visitas por el email del usuario visitado, enviadas en streaming."""
+    StreamUtils.check_format(format)
     try:
         query = {"usuarioVisitado": email}
-        visitas = DatabaseConnection.query_document("visita", query, hasDate=True)
+        total_count = await DatabaseConnection.count_documents("visita", query)
+        visitas = DatabaseConnection.stream_documents("visita", query, batch_size=batch_size)
 
-        return JSONResponse(status_code=200, content=visitas,
-                            headers={"Content-Type": "application/json", "X-Total-Count": str(len(visitas))})
+        return StreamUtils.response(visitas, format, headers=APIUtils.total_count_headers(total_count))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener las visitas: {str(e)}")
 
+@router.get("/" + endpoint_name + "/stats", tags=["Visitas stats endpoints"], response_model=VisitaStats)
+async def get_visitas_stats(
+    request: Request,
+    usuarioVisitado: str = Query(description="Email del usuario visitado"),
+    granularity: str = Query(default="day", description="Tamaño de los intervalos: 'hour' o 'day'"),
+    from_: datetime | None = Query(None, alias="from", description="Inicio del rango (ISO); por defecto, 2 días ('hour') o 30 días ('day') antes de 'to'"),
+    to: datetime | None = Query(None, description="Fin del rango (ISO); por defecto, ahora")
+):
+    """Obtener el número de visitas recibidas por un usuario por hora o por día, a partir de los contadores agregados."""
+
+    APIUtils.check_accept_json(request)
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Granularidad no soportada. Usa una de: {', '.join(GRANULARITIES)}")
+    # Las visitas se guardan con la hora local sin zona horaria
+    to = to.astimezone().replace(tzinfo=None) if to and to.tzinfo else (to or datetime.now())
+    from_ = from_.astimezone().replace(tzinfo=None) if from_ and from_.tzinfo else (from_ or to - GRANULARITIES[granularity])
+    if from_ > to:
+        raise HTTPException(status_code=400, detail="'from' no puede ser posterior a 'to'")
+
+    try:
+        query = {
+            "usuarioVisitado": usuarioVisitado,
+            "granularity": granularity,
+            "bucket": {"$gte": bucket_start(from_, granularity), "$lte": to},
+            "count": {"$gt": 0}
+        }
+        rollups = await DatabaseConnection.query_document(
+            ROLLUP_COLLECTION, query, {"_id": 0, "bucket": 1, "count": 1}, [("bucket", 1)]
+        )
+        stats = {
+            "usuarioVisitado": usuarioVisitado,
+            "granularity": granularity,
+            "total": sum(r["count"] for r in rollups),
+            "buckets": [{"bucket": r["bucket"].isoformat(), "count": r["count"]} for r in rollups]
+        }
+
+        return APIUtils.conditional_response(request, stats,
+                            headers={"Content-Type": "application/json", "X-Total-Count": str(len(rollups))})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener las estadísticas de visitas: {str(e)}")
+
+@router.get("/" + endpoint_name + "/export", tags=["Visitas export endpoints"])
+async def export_visitas(
+    format: str = Query(default="ndjson", description="Formato de la exportación: 'ndjson' o 'json' (array)"),
+    fields: str | None = Query(None, description="Campos específicos a devolver"),
+    batch_size: int = Query(default=DEFAULT_BATCH_SIZE, ge=1, le=10000, description="Documentos por lote leídos de MongoDB")
+):
+    """Exportar todas las visitas en streaming."""
+    StreamUtils.check_format(format)
+    try:
+        visitas = DatabaseConnection.stream_documents(
+            "visita", projection=APIUtils.build_projection(fields), batch_size=batch_size
+        )
+        return StreamUtils.response(visitas, format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al exportar las visitas: {str(e)}")
+
 @router.post("/" + endpoint_name, tags=["Visitas CRUD endpoints"], response_model=Visita)
 async def create_visita(request: Request, visita: VisitaCreate):
     """Crear una nueva visita."""
@@ -75,13 +158,48 @@ async def create_visita(request: Request, visita: VisitaCreate):
     try:
         visita_dict = visita.model_dump()
         visita_dict["timestamp"] = datetime.now()
-        visita_dict['_id'] = DatabaseConnection.create_document("visita", visita_dict, hasDate=True)
+        timestamp = visita_dict["timestamp"]
 
-        return JSONResponse(status_code=201, content=visita_dict,
+        if visit_buffer is not None:
+            # El ID se genera aquí para poder devolverlo antes de que la visita se escriba
+            visita_dict["_id"] = ObjectId()
+            if not await visit_buffer.put(visita_dict):
+                return FastJSONResponse(status_code=503, content={"detail": "Hay demasiadas visitas pendientes de guardar. Inténtalo de nuevo"},
+                                    headers={"Retry-After": "1"})
+            return FastJSONResponse(status_code=202, content={**visita_dict, "timestamp": timestamp.strftime('%Y-%m-%d %H:%M:%S')},
+                                headers={"Content-Type": "application/json"})
+
+        visita_dict['_id'] = await DatabaseConnection.create_document("visita", visita_dict, hasDate=True)
+        await update_rollups(Counter({(visita_dict["usuarioVisitado"], timestamp): 1}))
+
+        return FastJSONResponse(status_code=201, content=visita_dict,
                             headers={"Content-Type": "application/json"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear la visita: {str(e)}")
 
+@router.post("/" + endpoint_name + ":bulk", tags=["Visitas CRUD endpoints"])
+async def create_visitas_bulk(request: Request):
+    """Crear muchas visitas a partir de un array JSON o de un cuerpo NDJSON."""
+
+    created = Counter()
+
+    def prepare(visita_dict):
+        visita_dict["timestamp"] = datetime.now()
+
+    def on_created(visita_dict):
+        created[(visita_dict["usuarioVisitado"], visita_dict["timestamp"])] += 1
+
+    try:
+        summary = await BulkUtils.bulk_create(request, "visita", VisitaCreate, prepare, on_created)
+        await update_rollups(created)
+
+        return FastJSONResponse(status_code=201 if summary["failed"] == 0 else 207, content=summary,
+                            headers={"Content-Type": "application/json"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear las visitas: {str(e)}")
+
 @router.put("/" + endpoint_name + "/{id}", tags=["Visitas CRUD endpoints"], response_model=Visita)
 async def update_visita(request: Request, visita: VisitaUpdate, id: str = Path(description="ID de la visita")):
     """Actualizar una visita por su ID."""
@@ -93,19 +211,28 @@ async def update_visita(request: Request, visita: VisitaUpdate, id: str = Path(d
 
         non_none_fields = {k: v for k, v in visita_dict.items() if v is not None}
         if not non_none_fields:
-            return JSONResponse(status_code=422, content={"detail": "No has especificado ningún campo de la visita"})
+            return FastJSONResponse(status_code=422, content={"detail": "No has especificado ningún campo de la visita"})
+
+        current = None
+        if "usuarioVisitado" in non_none_fields:
+            current = await DatabaseConnection.read_document_id("visita", id, {"usuarioVisitado": 1, "timestamp": 1})
 
-        updated_document = DatabaseConnection.update_document_id("visita", id, non_none_fields)
+        updated_document = await DatabaseConnection.update_document_id("visita", id, non_none_fields)
         if updated_document is None:
-            return JSONResponse(status_code=404, content={"detail": "No se ha encontrado una visita con ese ID. No se ha editado nada"})
+            return FastJSONResponse(status_code=404, content={"detail": "No se ha encontrado una visita con ese ID. No se ha editado nada"})
 
-        json_serializable_document = jsonable_encoder(updated_document)
+        # La visita pasa a contar para el nuevo usuario visitado
+        if current is not None and current.get("timestamp") and current.get("usuarioVisitado") != non_none_fields["usuarioVisitado"]:
+            await update_rollups(Counter({
+                (current.get("usuarioVisitado"), current["timestamp"]): -1,
+                (non_none_fields["usuarioVisitado"], current["timestamp"]): 1
+            }))
 
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content={
                 "detail": "La visita se ha editado correctamente",
-                "result": json_serializable_document
+                "result": updated_document
             }
         )
 
@@ -119,11 +246,50 @@ async def delete_visita(id: str = Path(description="ID de la visita")):
     """Eliminar una visita por su ID."""
 
     try:
-        count = DatabaseConnection.delete_document_id("visita", id)
+        current = await DatabaseConnection.read_document_id("visita", id, {"usuarioVisitado": 1, "timestamp": 1})
+        count = await DatabaseConnection.delete_document_id("visita", id)
         if count == 0:
-            return JSONResponse(status_code=404, content={"detail": "No se ha encontrado una visita con ese ID. No se ha borrado nada."})
+            return FastJSONResponse(status_code=404, content={"detail": "No se ha encontrado una visita con ese ID. No se ha borrado nada."})
+        if current is not None and current.get("timestamp"):
+            await update_rollups(Counter({(current.get("usuarioVisitado"), current["timestamp"]): -1}))
 
-        return JSONResponse(status_code=200, content={"details": "La visita se ha eliminado correctamente"},
+        return FastJSONResponse(status_code=200, content={"details": "La visita se ha eliminado correctamente"},
                             headers={"Content-Type": "application/json"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar la visita: {str(e)}")
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Inicio de la hora o del día al que pertenece una fecha."""
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+async def update_rollups(visits: Counter):
+    """
+    Sumar visitas a los contadores por hora y por día.
+
+    'visits' asocia (usuarioVisitado, fecha de la visita) al número de visitas a sumar
+    (negativo al borrar). Todas las visitas se aplican con un único bulk_write de $inc.
+    """
+    increments = Counter()
+    for (usuario, timestamp), count in visits.items():
+        for granularity in GRANULARITIES:
+            increments[(usuario, granularity, bucket_start(timestamp, granularity))] += count
+
+    await DatabaseConnection.bulk_update(ROLLUP_COLLECTION, [
+        ({"usuarioVisitado": usuario, "granularity": granularity, "bucket": bucket}, {"$inc": {"count": count}})
+        for (usuario, granularity, bucket), count in increments.items() if count != 0
+    ], upsert=True)
+
+async def on_visits_written(visitas: list):
+    """Sumar a los contadores las visitas escritas por el búfer."""
+    await update_rollups(Counter((visita["usuarioVisitado"], visita["timestamp"]) for visita in visitas))
+
+visit_buffer = WriteBuffer(
+    "visita", WRITE_BEHIND_MAX_SIZE, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_INTERVAL, on_flush=on_visits_written
+) if WRITE_BEHIND else None
+
+async def flush_visit_buffer():
+    """Escribir las visitas pendientes del búfer (al apagar la aplicación)."""
+    if visit_buffer is not None:
+        await visit_buffer.stop()
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from db_connection import DatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+# Marca que se encola al cerrar el búfer: todo lo encolado antes se escribe
+_STOP = object()
+
+class WriteBuffer:
+    """
+    Búfer de escritura diferida (write-behind) para inserciones de mucho volumen.
+
+    Los documentos se encolan en memoria y una tarea en segundo plano los inserta con
+    insert_many cuando hay batch_size documentos o han pasado flush_interval segundos desde
+    el primero. La cola está acotada: si está llena, put() espera como mucho put_timeout
+    segundos y después rechaza el documento para que el cliente reintente.
+
+    Los documentos que todavía están en la cola se pierden si el proceso termina sin
+    llamar a stop().
+
+    Attributes
+    ----------
+    collection_name : str
+        Colección en la que se insertan los documentos
+    max_size : int
+        Número máximo de documentos en la cola
+    batch_size : int
+        Documentos por insert_many
+    flush_interval : float
+        Segundos que puede esperar un documento antes de escribirse
+    put_timeout : float
+        Segundos que put() espera a que haya sitio en la cola
+    on_flush : callable, opcional
+        Corrutina que recibe la lista de documentos insertados en cada escritura
+    """
+
+    def __init__(self, collection_name: str, max_size: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, put_timeout: float = 1.0,
+                 on_flush: Optional[Callable[[list], Awaitable[None]]] = None):
+        self.collection_name = collection_name
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.on_flush = on_flush
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.flushes = 0
+        self._queue = None
+        self._ready = None
+        self._task = None
+        self._closing = False
+
+    def start(self):
+        """Arrancar la tarea que vacía la cola (si no está ya en marcha)."""
+        if self._task is None:
+            self._closing = False
+            self._queue = asyncio.Queue(self.max_size)
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, document: dict) -> bool:
+        """Encolar un documento. Devuelve False si la cola sigue llena tras put_timeout o el búfer se está cerrando."""
+        if self._closing:
+            self.rejected += 1
+            return False
+        self.start()
+        try:
+            await asyncio.wait_for(self._queue.put(document), self.put_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._ready.set()
+        return True
+
+    async def stop(self):
+        """Dejar de aceptar documentos y escribir todos los que quedan en la cola."""
+        if self._task is None:
+            return
+        self._closing = True
+        await self._queue.put(_STOP)
+        self._ready.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        closing = False
+        while not closing:
+            batch = []
+            document = await self._queue.get()
+            if document is _STOP:
+                closing = True
+            else:
+                batch.append(document)
+                if self._queue.qsize() < self.batch_size - 1:
+                    # Esperar a completar el lote, como mucho flush_interval segundos
+                    try:
+                        await asyncio.wait_for(self._ready.wait(), self.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+            self._ready.clear()
+
+            while not closing and len(batch) < self.batch_size and not self._queue.empty():
+                document = self._queue.get_nowait()
+                if document is _STOP:
+                    closing = True
+                else:
+                    batch.append(document)
+
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        """Insertar un lote y avisar a on_flush con los documentos insertados."""
+        try:
+            failed = await DatabaseConnection.create_documents(self.collection_name, batch)
+        except Exception as e:
+            logger.error(f"Error al escribir {len(batch)} documentos en '{self.collection_name}': {e}")
+            failed = dict.fromkeys(range(len(batch)))
+
+        written = [document for position, document in enumerate(batch) if position not in failed]
+        self.flushes += 1
+        self.written += len(written)
+        self.failed += len(failed)
+        if failed:
+            logger.error(f"{len(failed)} documentos no se han podido escribir en '{self.collection_name}'.")
+
+        if self.on_flush and written:
+            try:
+                await self.on_flush(written)
+            except Exception as e:
+                logger.error(f"Error al procesar los documentos escritos en '{self.collection_name}': {e}")
+
+    def stats(self) -> dict:
+        """Devolver el estado de la cola y los contadores de documentos escritos, fallidos y rechazados."""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "written": self.written,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "flushes": self.flushes
+        }